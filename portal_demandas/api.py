@@ -3,16 +3,20 @@ Portal Demandas FastAPI Application
 Comprehensive API for managing demands/tickets with SQLAlchemy + Neon PostgreSQL
 """
 
+import ipaddress
 import logging
 import json
 from contextlib import asynccontextmanager
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
 from typing import List, Optional, Dict, Any
 
-from fastapi import Depends, FastAPI, HTTPException, Query, UploadFile, File
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import asc, desc, or_
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy import asc, desc, func, or_, union_all, update
+from sqlalchemy.orm import Session, aliased
 
 # Import AI and monitoring services
 try:
@@ -25,9 +29,122 @@ try:
 except ImportError:
     from .db import TicketComment as TicketCommentDB
 
+try:
+    from busca_service import busca_tickets_service
+except ImportError:
+    from .busca_service import busca_tickets_service
+
+try:
+    from estatisticas_service import (
+        carregar_snapshots,
+        estatisticas_tickets_service,
+        snapshot_ticket,
+    )
+except ImportError:
+    from .estatisticas_service import (
+        carregar_snapshots,
+        estatisticas_tickets_service,
+        snapshot_ticket,
+    )
+
+try:
+    from rollups_service import rollups_tickets_service
+except ImportError:
+    from .rollups_service import rollups_tickets_service
+
+try:
+    from sla_service import sla_tickets_service
+except ImportError:
+    from .sla_service import sla_tickets_service
+
+try:
+    from tags_service import tags_tickets_service
+except ImportError:
+    from .tags_service import tags_tickets_service
+
+try:
+    from versoes_service import etag_corresponde, etag_recurso, gerar_etag, versoes_tabelas_service
+except ImportError:
+    from .versoes_service import etag_corresponde, etag_recurso, gerar_etag, versoes_tabelas_service
+
+try:
+    from arquivamento_service import arquivamento_tickets_service
+except ImportError:
+    from .arquivamento_service import arquivamento_tickets_service
+
+try:
+    from eventos_service import broadcaster_eventos
+except ImportError:
+    from .eventos_service import broadcaster_eventos
+
+try:
+    from controles_service import controles_mensais_service
+except ImportError:
+    from .controles_service import controles_mensais_service
+
+try:
+    from fila_trabalhos_service import FilaCheiaError, fila_auditoria_folha
+except ImportError:
+    from .fila_trabalhos_service import FilaCheiaError, fila_auditoria_folha
+
+try:
+    from motor_auditoria_service import auditar_funcionarios
+except ImportError:
+    from .motor_auditoria_service import auditar_funcionarios
+
+try:
+    from templates_service import registro_templates
+except ImportError:
+    from .templates_service import registro_templates
+
+try:
+    from uploads_service import UploadMuitoGrandeError, UploadRecebido, receber_upload
+except ImportError:
+    from .uploads_service import UploadMuitoGrandeError, UploadRecebido, receber_upload
+
+try:
+    from cache_controles_service import cache_quadro_controles, chave_quadro
+except ImportError:
+    from .cache_controles_service import cache_quadro_controles, chave_quadro
+
+try:
+    from cache_extracao_service import cache_extracao
+except ImportError:
+    from .cache_extracao_service import cache_extracao
+
+try:
+    from importacao_service import (
+        FORMATOS_SUPORTADOS,
+        detectar_formato,
+        importacao_tickets_service,
+    )
+except ImportError:
+    from .importacao_service import (
+        FORMATOS_SUPORTADOS,
+        detectar_formato,
+        importacao_tickets_service,
+    )
+
+try:
+    from paginacao import (
+        CursorInvalidoError,
+        aplicar_keyset,
+        codificar_cursor,
+        decodificar_cursor,
+    )
+except ImportError:
+    from .paginacao import (
+        CursorInvalidoError,
+        aplicar_keyset,
+        codificar_cursor,
+        decodificar_cursor,
+    )
+
 try:
     from db import (
         TicketDB,
+        TicketArquivadoDB,
+        COLUNAS_TICKET,
         ContabilidadeDB,
         EmpresaDB, 
         SindicatoDB,
@@ -51,10 +168,14 @@ try:
         AtendimentosSuporteInteracoesDB,
         get_db,
         init_portal_db,
+        engine,
+        SessionLocal,
     )
 except ImportError:
     from .db import (
         TicketDB,
+        TicketArquivadoDB,
+        COLUNAS_TICKET,
         ContabilidadeDB,
         EmpresaDB, 
         SindicatoDB,
@@ -78,6 +199,8 @@ except ImportError:
         AtendimentosSuporteInteracoesDB,
         get_db,
         init_portal_db,
+        engine,
+        SessionLocal,
     )
 try:
     from models import (
@@ -90,6 +213,8 @@ try:
         TicketStats,
         TicketStatus,
         TicketUpdate,
+        TicketBulkUpdate,
+        TicketFilter,
         # Controle Mensal models
         ControleMensalDetalhado,
         ControleMensalResponse,
@@ -98,6 +223,7 @@ try:
         TemplateControle,
         TemplateControleCreate,
         TemplateAplicacao,
+        TarefasBulkStatus,
         # Payroll Audit models
         FuncionarioDivergencia,
         ProcessamentoFolhaResponse,
@@ -131,6 +257,8 @@ except ImportError:
         TicketStats,
         TicketStatus,
         TicketUpdate,
+        TicketBulkUpdate,
+        TicketFilter,
         # Controle Mensal models
         ControleMensalDetalhado,
         ControleMensalResponse,
@@ -139,6 +267,7 @@ except ImportError:
         TemplateControle,
         TemplateControleCreate,
         TemplateAplicacao,
+        TarefasBulkStatus,
         # Payroll Audit models
         FuncionarioDivergencia,
         ProcessamentoFolhaResponse,
@@ -166,6 +295,27 @@ except ImportError:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Longest range served by /stats/serie-temporal (a bit over two years)
+MAX_DIAS_SERIE_TEMPORAL = 800
+
+# Rows fetched per server-side cursor round trip (and per streamed chunk) in exports
+EXPORT_BATCH_SIZE = 1000
+
+# Longest range served by /v1/controles/resumo (five years of months)
+MAX_MESES_RESUMO_CONTROLES = 60
+
+# Non-nullable columns that can back a keyset cursor (sort value + id tie-breaker)
+CURSOR_SORT_COLUMNS = {
+    "id",
+    "titulo",
+    "etapa",
+    "prazo",
+    "responsavel",
+    "status",
+    "criado_em",
+    "atualizado_em",
+}
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -174,12 +324,23 @@ async def lifespan(app: FastAPI):
     try:
         init_portal_db()
         logger.info("Portal demandas database initialized")
+        busca_tickets_service.inicializar_indice(engine)
+        with SessionLocal() as db:
+            estatisticas_tickets_service.inicializar(db)
+            tags_tickets_service.inicializar(db)
+            rollups_tickets_service.inicializar(db)
+            controles_mensais_service.inicializar(db)
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
 
+    await broadcaster_eventos.iniciar()
+    fila_auditoria_folha.iniciar()
+
     yield
 
     # Shutdown (if needed)
+    await fila_auditoria_folha.parar()
+    await broadcaster_eventos.parar()
     logger.info("Portal demandas API shutting down")
 
 
@@ -206,6 +367,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 
@@ -244,11 +406,21 @@ def criar_ticket(ticket: TicketCreate, db: Session = Depends(get_db)):
         )
 
         db.add(db_ticket)
+        db.flush()
+        depois = [snapshot_ticket(db_ticket)]
+        estatisticas_tickets_service.registrar_alteracoes(db, [], depois)
+        rollups_tickets_service.registrar_alteracoes(db, [], depois)
+        if db_ticket.tags:
+            tags_tickets_service.sincronizar(db, {db_ticket.id: db_ticket.tags})
+        versoes_tabelas_service.incrementar(db, TicketDB.__tablename__)
         db.commit()
         db.refresh(db_ticket)
 
         # Log creation
         logger.info(f"Ticket created: ID={db_ticket.id}, Titulo='{db_ticket.titulo}'")
+        broadcaster_eventos.publicar(
+            "ticket.criado", {"id": db_ticket.id, "status": db_ticket.status}
+        )
 
         return Ticket.model_validate(db_ticket)
 
@@ -258,20 +430,276 @@ def criar_ticket(ticket: TicketCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Erro ao criar ticket: {str(e)}")
 
 
+def _valores_enum(valores) -> List[str]:
+    """Accept enum members or raw values (TicketFilter uses use_enum_values)"""
+    return [getattr(valor, "value", valor) for valor in valores]
+
+
+def _filtrar_tickets(
+    query,
+    db: Session,
+    status=None,
+    prioridade=None,
+    categoria=None,
+    responsavel: Optional[str] = None,
+    etapa: Optional[str] = None,
+    search: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+    tags_modo: str = "any",
+    modelo=TicketDB,
+):
+    """
+    Apply the ticket listing filters to a query
+
+    Shared by the listing, export and bulk endpoints so they select exactly
+    the same tickets. `modelo` selects the table (TicketDB or
+    TicketArquivadoDB). Returns (query, relevance ORDER BY or None).
+    """
+    if status:
+        query = query.filter(modelo.status.in_(_valores_enum(status)))
+
+    if prioridade:
+        query = query.filter(modelo.prioridade.in_(_valores_enum(prioridade)))
+
+    if categoria:
+        query = query.filter(modelo.categoria.in_(_valores_enum(categoria)))
+
+    if responsavel:
+        query = query.filter(modelo.responsavel.ilike(f"%{responsavel}%"))
+
+    if etapa:
+        query = query.filter(modelo.etapa.ilike(f"%{etapa}%"))
+
+    if tags:
+        criterio = tags_tickets_service.criterio_tags(tags, tags_modo, modelo.id)
+        if criterio is not None:
+            query = query.filter(criterio)
+
+    ordem_relevancia = None
+    if search:
+        # Full-text index (live table only) when available, ILIKE scan otherwise
+        busca = (
+            busca_tickets_service.criterio_busca(db, search)
+            if modelo is TicketDB
+            else None
+        )
+        if busca:
+            search_filter, ordem_relevancia = busca
+        else:
+            search_filter = or_(
+                modelo.titulo.ilike(f"%{search}%"),
+                modelo.descricao.ilike(f"%{search}%"),
+            )
+        query = query.filter(search_filter)
+
+    return query, ordem_relevancia
+
+
+def _consultar_tickets(db: Session, include_archived: bool = False, **filtros):
+    """
+    Filtered ticket query, optionally over live + archived tickets
+
+    With include_archived the two filtered tables are combined with UNION ALL
+    and mapped back to TicketDB through an alias, so sorting, pagination and
+    serialization work unchanged. Returns (query, entity, relevance ORDER BY);
+    relevance ranking is only available for the live table.
+    """
+    if not include_archived:
+        query, ordem_relevancia = _filtrar_tickets(db.query(TicketDB), db, **filtros)
+        return query, TicketDB, ordem_relevancia
+
+    partes = []
+    for modelo in (TicketDB, TicketArquivadoDB):
+        colunas = [getattr(modelo, coluna) for coluna in COLUNAS_TICKET]
+        parte, _ = _filtrar_tickets(db.query(*colunas), db, modelo=modelo, **filtros)
+        partes.append(parte.statement)
+
+    entidade = aliased(TicketDB, union_all(*partes).subquery("tickets_todos"))
+    return db.query(entidade), entidade, None
+
+
+def _filtrar_tickets_por_filtro(query, db: Session, filtro: TicketFilter):
+    """Apply a TicketFilter body (listing filters plus creation period and tags)"""
+    query, _ = _filtrar_tickets(
+        query,
+        db,
+        status=filtro.status,
+        prioridade=filtro.prioridade,
+        categoria=filtro.categoria,
+        responsavel=filtro.responsavel,
+        etapa=filtro.etapa,
+    )
+
+    if filtro.data_inicio:
+        query = query.filter(TicketDB.criado_em >= filtro.data_inicio)
+
+    if filtro.data_fim:
+        query = query.filter(TicketDB.criado_em <= filtro.data_fim)
+
+    if filtro.tags:
+        criterio = tags_tickets_service.criterio_tags(filtro.tags, filtro.tags_modo)
+        if criterio is not None:
+            query = query.filter(criterio)
+
+    return query
+
+
+@app.get("/tickets/export", tags=["tickets"])
+def exportar_tickets(
+    formato: str = Query(
+        "csv", pattern="^(csv|ndjson)$", description="Formato de saída: csv ou ndjson"
+    ),
+    status: Optional[List[TicketStatus]] = Query(
+        None, description="Filtrar por status"
+    ),
+    prioridade: Optional[List[TicketPrioridade]] = Query(
+        None, description="Filtrar por prioridade"
+    ),
+    categoria: Optional[List[TicketCategoria]] = Query(
+        None, description="Filtrar por categoria"
+    ),
+    responsavel: Optional[str] = Query(None, description="Filtrar por responsável"),
+    etapa: Optional[str] = Query(None, description="Filtrar por etapa"),
+    search: Optional[str] = Query(None, description="Buscar no título e descrição"),
+    tags: Optional[List[str]] = Query(
+        None, description="Filtrar por tags (repetido ou separado por vírgula)"
+    ),
+    tags_modo: str = Query(
+        "any", pattern="^(any|all)$", description="any: alguma das tags; all: todas"
+    ),
+):
+    """
+    Exportar tickets em CSV ou NDJSON (streaming)
+
+    Aceita os mesmos filtros da listagem. As linhas são lidas com cursor do
+    lado do servidor (yield_per) e enviadas à medida que são codificadas, com
+    memória constante independentemente do volume exportado.
+    """
+    filtros = dict(
+        status=status,
+        prioridade=prioridade,
+        categoria=categoria,
+        responsavel=responsavel,
+        etapa=etapa,
+        search=search,
+        tags=tags,
+        tags_modo=tags_modo,
+    )
+    nome_arquivo = f"tickets_{datetime.now(timezone.utc):%Y%m%d_%H%M%S}.{formato}"
+    media_type = "text/csv" if formato == "csv" else "application/x-ndjson"
+
+    return StreamingResponse(
+        _gerar_exportacao_tickets(formato, filtros),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}"'},
+    )
+
+
+def _gerar_exportacao_tickets(formato: str, filtros: Dict[str, Any]):
+    """
+    Stream the export body in chunks
+
+    Uses its own session: the request-scoped one is closed before a
+    StreamingResponse body is consumed.
+    """
+    import csv
+    import io
+
+    buffer = io.StringIO()
+    writer = None
+    if formato == "csv":
+        writer = csv.DictWriter(buffer, fieldnames=list(TicketDB().to_dict()))
+        writer.writeheader()
+
+    exportados = 0
+    with SessionLocal() as session:
+        try:
+            query, _ = _filtrar_tickets(session.query(TicketDB), session, **filtros)
+            query = query.order_by(asc(TicketDB.id)).yield_per(EXPORT_BATCH_SIZE)
+
+            for ticket in query:
+                registro = ticket.to_dict()
+                if writer:
+                    writer.writerow(registro)
+                else:
+                    buffer.write(json.dumps(registro, ensure_ascii=False))
+                    buffer.write("\n")
+
+                exportados += 1
+                if exportados % EXPORT_BATCH_SIZE == 0:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate(0)
+
+            yield buffer.getvalue()
+            logger.info(f"Ticket export ({formato}) completed: {exportados} tickets")
+
+        except Exception as e:
+            logger.error(f"Ticket export failed after {exportados} tickets: {e}")
+            raise
+
+
+@app.get("/tickets/eventos", tags=["tickets"])
+async def stream_eventos_tickets(request: Request):
+    """
+    Stream de alterações de tickets (Server-Sent Events)
+
+    Eventos: ticket.criado, ticket.atualizado, ticket.removido,
+    tickets.status_bulk, tickets.atualizados_bulk e tickets.importados. Os
+    dashboards podem recarregar /tickets/ e /stats/ apenas quando recebem um
+    evento. Clientes lentos demais recebem `descartado` e são desconectados.
+    """
+    cliente = broadcaster_eventos.inscrever()
+
+    return StreamingResponse(
+        broadcaster_eventos.stream(cliente, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _cabecalhos_etag(etag: str) -> Dict[str, str]:
+    """Validator headers: clients may cache but must revalidate every time"""
+    return {"ETag": etag, "Cache-Control": "no-cache"}
+
+
 @app.get("/tickets/{ticket_id}", response_model=Ticket, tags=["tickets"])
-def obter_ticket(ticket_id: int, db: Session = Depends(get_db)):
+def obter_ticket(
+    ticket_id: int,
+    response: Response,
+    include_archived: bool = Query(
+        False, description="Procurar também nos tickets arquivados"
+    ),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+):
     """
     Obter um ticket específico por ID
+
+    Suporta GET condicional: envie o ETag recebido em If-None-Match para
+    receber 304 quando o ticket não mudou. Com include_archived=true, tickets
+    movidos para o arquivo também são retornados.
     """
     db_ticket = db.query(TicketDB).filter(TicketDB.id == ticket_id).first()
+    if not db_ticket and include_archived:
+        db_ticket = (
+            db.query(TicketArquivadoDB).filter(TicketArquivadoDB.id == ticket_id).first()
+        )
     if not db_ticket:
         raise HTTPException(status_code=404, detail="Ticket não encontrado")
 
+    etag = etag_recurso(db_ticket.id, db_ticket.atualizado_em)
+    if etag_corresponde(if_none_match, etag):
+        return Response(status_code=304, headers=_cabecalhos_etag(etag))
+
+    response.headers.update(_cabecalhos_etag(etag))
     return Ticket.model_validate(db_ticket)
 
 
 @app.get("/tickets/", response_model=TicketListResponse, tags=["tickets"])
 def listar_tickets(
+    request: Request,
+    http_response: Response,
     page: int = Query(1, ge=1, description="Número da página"),
     per_page: int = Query(
         10, ge=1, le=50, description="Itens por página (máximo 50 para performance)"
@@ -288,55 +716,111 @@ def listar_tickets(
     responsavel: Optional[str] = Query(None, description="Filtrar por responsável"),
     etapa: Optional[str] = Query(None, description="Filtrar por etapa"),
     search: Optional[str] = Query(None, description="Buscar no título e descrição"),
-    sort_by: str = Query("criado_em", description="Campo para ordenação"),
+    tags: Optional[List[str]] = Query(
+        None, description="Filtrar por tags (repetido ou separado por vírgula)"
+    ),
+    tags_modo: str = Query(
+        "any", pattern="^(any|all)$", description="any: alguma das tags; all: todas"
+    ),
+    sort_by: Optional[str] = Query(
+        None,
+        description="Campo para ordenação ou 'relevancia' (padrão: relevancia quando há busca, senão criado_em)",
+    ),
     sort_order: str = Query("desc", description="Ordem: asc ou desc"),
+    pagination: str = Query(
+        "offset",
+        pattern="^(offset|cursor)$",
+        description="Modo de paginação: offset (page) ou cursor (keyset)",
+    ),
+    cursor: Optional[str] = Query(
+        None, description="Cursor opaco retornado em next_cursor (modo cursor)"
+    ),
+    include_total: Optional[bool] = Query(
+        None,
+        description="Calcular o total de registros (padrão: sim no modo offset, não no modo cursor)",
+    ),
+    include_comment_count: bool = Query(
+        False, description="Incluir comment_count de cada ticket (uma consulta agrupada por página)"
+    ),
+    include_archived: bool = Query(
+        False, description="Incluir tickets arquivados (tickets_arquivados)"
+    ),
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
 ):
     """
     Listar tickets com filtros e paginação - PERFORMANCE OPTIMIZED
     Reduced maximum per_page from 100 to 50 for better performance
+
+    pagination=cursor enables keyset pagination over (sort_by, id): no OFFSET
+    scan and no COUNT(*) unless include_total=true.
+
+    The ETag combines the tickets table version with the query string, so an
+    unchanged table answers If-None-Match with 304 before any ticket is read.
     """
     import time
 
     start_time = time.time()
 
     try:
-        # Build query
-        query = db.query(TicketDB)
-
-        # Apply filters
-        if status:
-            query = query.filter(TicketDB.status.in_([s.value for s in status]))
-
-        if prioridade:
-            query = query.filter(TicketDB.prioridade.in_([p.value for p in prioridade]))
-
-        if categoria:
-            query = query.filter(TicketDB.categoria.in_([c.value for c in categoria]))
-
-        if responsavel:
-            query = query.filter(TicketDB.responsavel.ilike(f"%{responsavel}%"))
+        versao = versoes_tabelas_service.obter(db, TicketDB.__tablename__)
+        versao_comentarios = (
+            versoes_tabelas_service.obter(db, TicketCommentDB.__tablename__)
+            if include_comment_count
+            else None
+        )
+        etag = gerar_etag(
+            TicketDB.__tablename__, versao, versao_comentarios, request.url.query
+        )
+        if etag_corresponde(if_none_match, etag):
+            return Response(status_code=304, headers=_cabecalhos_etag(etag))
+        http_response.headers.update(_cabecalhos_etag(etag))
 
-        if etapa:
-            query = query.filter(TicketDB.etapa.ilike(f"%{etapa}%"))
+        # Build query
+        query, entidade, ordem_relevancia = _consultar_tickets(
+            db,
+            include_archived,
+            status=status,
+            prioridade=prioridade,
+            categoria=categoria,
+            responsavel=responsavel,
+            etapa=etapa,
+            search=search,
+            tags=tags,
+            tags_modo=tags_modo,
+        )
 
-        if search:
-            search_filter = or_(
-                TicketDB.titulo.ilike(f"%{search}%"),
-                TicketDB.descricao.ilike(f"%{search}%"),
+        if pagination == "cursor":
+            return _listar_tickets_cursor(
+                query,
+                per_page,
+                sort_by or "criado_em",
+                sort_order,
+                cursor,
+                bool(include_total),
+                start_time,
+                include_comment_count,
+                entidade,
             )
-            query = query.filter(search_filter)
+
+        if sort_by is None:
+            sort_by = "relevancia" if search else "criado_em"
 
         # Apply sorting
-        if hasattr(TicketDB, sort_by):
-            sort_column = getattr(TicketDB, sort_by)
+        if sort_by == "relevancia":
+            if ordem_relevancia is not None:
+                query = query.order_by(ordem_relevancia, desc(entidade.id))
+            else:
+                query = query.order_by(desc(entidade.criado_em))
+        elif hasattr(TicketDB, sort_by):
+            sort_column = getattr(entidade, sort_by)
             if sort_order.lower() == "desc":
                 query = query.order_by(desc(sort_column))
             else:
                 query = query.order_by(asc(sort_column))
 
         # Get total count
-        total = query.count()
+        total = query.count() if include_total is not False else None
 
         # Apply pagination
         offset = (page - 1) * per_page
@@ -344,6 +828,8 @@ def listar_tickets(
 
         # Convert to Pydantic models
         ticket_list = [Ticket.model_validate(ticket) for ticket in tickets]
+        if include_comment_count:
+            _preencher_comment_count(db, ticket_list)
 
         # Calculate processing time
         processing_time = time.time() - start_time
@@ -352,9 +838,14 @@ def listar_tickets(
             f"Ticket listing completed in {processing_time:.3f}s (page {page}, {len(ticket_list)} items)"
         )
 
-        response = TicketListResponse.create(
-            tickets=ticket_list, total=total, page=page, per_page=per_page
-        )
+        if total is None:
+            response = TicketListResponse(
+                tickets=ticket_list, page=page, per_page=per_page
+            )
+        else:
+            response = TicketListResponse.create(
+                tickets=ticket_list, total=total, page=page, per_page=per_page
+            )
 
         # Add performance metadata if available
         if hasattr(response, "__dict__"):
@@ -365,17 +856,104 @@ def listar_tickets(
 
         return response
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to list tickets: {e}")
         raise HTTPException(status_code=500, detail=f"Erro ao listar tickets: {str(e)}")
 
 
+def _listar_tickets_cursor(
+    query,
+    per_page: int,
+    sort_by: str,
+    sort_order: str,
+    cursor: Optional[str],
+    include_total: bool,
+    start_time: float,
+    include_comment_count: bool = False,
+    entidade=TicketDB,
+) -> TicketListResponse:
+    """
+    Keyset pagination for listar_tickets
+
+    Fetches per_page + 1 rows past the cursor position to know whether a next
+    page exists; the total is only counted when explicitly requested.
+    """
+    import time
+
+    if sort_by not in CURSOR_SORT_COLUMNS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"sort_by inválido no modo cursor. Use: {', '.join(sorted(CURSOR_SORT_COLUMNS))}",
+        )
+    sort_order = "desc" if sort_order.lower() == "desc" else "asc"
+
+    try:
+        cursor_valor = (
+            decodificar_cursor(cursor, sort_by, sort_order) if cursor else None
+        )
+    except CursorInvalidoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    total = query.order_by(None).count() if include_total else None
+
+    sort_column = getattr(entidade, sort_by)
+    rows = (
+        aplicar_keyset(query, sort_column, entidade.id, sort_order, cursor_valor)
+        .limit(per_page + 1)
+        .all()
+    )
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        ultimo = rows[-1]
+        next_cursor = codificar_cursor(
+            sort_by, sort_order, getattr(ultimo, sort_by), ultimo.id
+        )
+
+    ticket_list = [Ticket.model_validate(ticket) for ticket in rows]
+    if include_comment_count:
+        _preencher_comment_count(query.session, ticket_list)
+
+    processing_time = time.time() - start_time
+    logger.info(
+        f"Ticket listing (cursor) completed in {processing_time:.3f}s ({len(ticket_list)} items)"
+    )
+
+    return TicketListResponse.create_cursor(
+        tickets=ticket_list, next_cursor=next_cursor, per_page=per_page, total=total
+    )
+
+
+def _preencher_comment_count(db: Session, tickets: List[Ticket]):
+    """Set comment_count for a whole page with a single grouped query"""
+    ids = [ticket.id for ticket in tickets]
+    if not ids:
+        return
+
+    contagens = dict(
+        db.query(TicketCommentDB.ticket_id, func.count(TicketCommentDB.id))
+        .filter(TicketCommentDB.ticket_id.in_(ids))
+        .group_by(TicketCommentDB.ticket_id)
+        .all()
+    )
+    for ticket in tickets:
+        ticket.comment_count = int(contagens.get(ticket.id, 0))
+
+
 @app.patch("/tickets/{ticket_id}", response_model=Ticket, tags=["tickets"])
 def atualizar_ticket(
     ticket_id: int, ticket_update: TicketUpdate, db: Session = Depends(get_db)
 ):
     """
     Atualizar um ticket existente
+
+    Controle de concorrência otimista: o UPDATE só é aplicado se o ticket
+    ainda estiver na versão esperada (`version` do corpo ou, se omitida, a
+    versão lida nesta requisição); caso contrário retorna 409 e o cliente
+    deve recarregar o ticket antes de tentar novamente.
     """
     # Find ticket
     db_ticket = db.query(TicketDB).filter(TicketDB.id == ticket_id).first()
@@ -383,29 +961,58 @@ def atualizar_ticket(
         raise HTTPException(status_code=404, detail="Ticket não encontrado")
 
     try:
+        antes = snapshot_ticket(db_ticket)
+        versao_esperada = ticket_update.version or db_ticket.version
+
         # Update fields
-        update_data = ticket_update.dict(exclude_unset=True)
-
-        for field, value in update_data.items():
-            if hasattr(db_ticket, field) and value is not None:
-                # Handle enum fields
-                if field in ["status", "prioridade", "categoria"] and hasattr(
-                    value, "value"
-                ):
-                    setattr(db_ticket, field, value.value)
-                else:
-                    setattr(db_ticket, field, value)
+        update_data = ticket_update.model_dump(exclude_unset=True, exclude={"version"})
+        valores = {
+            field: getattr(value, "value", value)
+            for field, value in update_data.items()
+            if hasattr(TicketDB, field) and value is not None
+        }
+        valores["atualizado_em"] = datetime.now(timezone.utc)
+
+        # Compare-and-swap instead of SELECT ... FOR UPDATE
+        resultado = db.execute(
+            update(TicketDB)
+            .where(TicketDB.id == ticket_id, TicketDB.version == versao_esperada)
+            .values(**valores, version=TicketDB.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if resultado.rowcount == 0:
+            db.rollback()
+            versao_atual = db.query(TicketDB.version).filter(TicketDB.id == ticket_id).scalar()
+            if versao_atual is None:
+                raise HTTPException(status_code=404, detail="Ticket não encontrado")
+            raise HTTPException(
+                status_code=409,
+                detail=(
+                    f"Conflito de versão: o ticket foi alterado por outra requisição "
+                    f"(versão esperada {versao_esperada}, atual {versao_atual})"
+                ),
+            )
 
-        # Update timestamp
-        db_ticket.atualizado_em = datetime.now(timezone.utc)
+        depois = {**antes, **{k: v for k, v in valores.items() if k in antes}}
+        estatisticas_tickets_service.registrar_alteracoes(db, [antes], [depois])
+        rollups_tickets_service.registrar_alteracoes(db, [antes], [depois])
+        if "tags" in valores:
+            tags_tickets_service.sincronizar(db, {ticket_id: valores["tags"]})
+        versoes_tabelas_service.incrementar(db, TicketDB.__tablename__)
 
         db.commit()
         db.refresh(db_ticket)
 
-        logger.info(f"Ticket updated: ID={ticket_id}")
+        logger.info(f"Ticket updated: ID={ticket_id}, version={db_ticket.version}")
+        broadcaster_eventos.publicar(
+            "ticket.atualizado",
+            {"id": ticket_id, "status": db_ticket.status, "campos": sorted(update_data)},
+        )
 
         return Ticket.model_validate(db_ticket)
 
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         logger.error(f"Failed to update ticket {ticket_id}: {e}")
@@ -429,11 +1036,18 @@ def deletar_ticket(ticket_id: int, db: Session = Depends(get_db)):
             TicketCommentDB.ticket_id == ticket_id
         ).delete()
 
+        antes = [snapshot_ticket(db_ticket)]
+        estatisticas_tickets_service.registrar_alteracoes(db, antes, [])
+        rollups_tickets_service.registrar_alteracoes(db, antes, [])
+        tags_tickets_service.remover(db, [ticket_id])
+        versoes_tabelas_service.incrementar(db, TicketDB.__tablename__)
+
         # Delete ticket
         db.delete(db_ticket)
         db.commit()
 
         logger.info(f"Ticket deleted: ID={ticket_id}")
+        broadcaster_eventos.publicar("ticket.removido", {"id": ticket_id})
 
         return {"message": "Ticket deletado com sucesso"}
 
@@ -468,6 +1082,7 @@ def adicionar_comentario(
         )
 
         db.add(db_comment)
+        versoes_tabelas_service.incrementar(db, TicketCommentDB.__tablename__)
         db.commit()
         db.refresh(db_comment)
 
@@ -486,17 +1101,45 @@ def adicionar_comentario(
     response_model=List[TicketComment],
     tags=["comments"],
 )
-def listar_comentarios(ticket_id: int, db: Session = Depends(get_db)):
+def listar_comentarios(
+    ticket_id: int,
+    response: Response,
+    limit: int = Query(50, ge=1, le=200, description="Comentários por página"),
+    cursor: Optional[str] = Query(
+        None, description="Cursor opaco retornado no cabeçalho X-Next-Cursor"
+    ),
+    db: Session = Depends(get_db),
+):
     """
     Listar comentários de um ticket
+
+    Mais recentes primeiro, paginados por keyset sobre (criado_em, id) usando
+    o índice (ticket_id, criado_em). Quando há mais comentários, o cursor da
+    próxima página é enviado no cabeçalho X-Next-Cursor.
     """
+    try:
+        cursor_valor = (
+            decodificar_cursor(cursor, "criado_em", "desc") if cursor else None
+        )
+    except CursorInvalidoError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    query = db.query(TicketCommentDB).filter(TicketCommentDB.ticket_id == ticket_id)
     comments = (
-        db.query(TicketCommentDB)
-        .filter(TicketCommentDB.ticket_id == ticket_id)
-        .order_by(TicketCommentDB.criado_em.desc())
+        aplicar_keyset(
+            query, TicketCommentDB.criado_em, TicketCommentDB.id, "desc", cursor_valor
+        )
+        .limit(limit + 1)
         .all()
     )
 
+    if len(comments) > limit:
+        comments = comments[:limit]
+        ultimo = comments[-1]
+        response.headers["X-Next-Cursor"] = codificar_cursor(
+            "criado_em", "desc", ultimo.criado_em, ultimo.id
+        )
+
     return [TicketComment.model_validate(comment) for comment in comments]
 
 
@@ -505,102 +1148,19 @@ def listar_comentarios(ticket_id: int, db: Session = Depends(get_db)):
 def obter_estatisticas(db: Session = Depends(get_db)):
     """
     Obter estatísticas dos tickets - PERFORMANCE OPTIMIZED
-    Target: <0.5s response time (was 1.5s)
+    Reads the incrementally maintained counters table (constant cost,
+    independent of the number of tickets)
     """
     import time
 
     start_time = time.time()
 
     try:
-        # Use single query with aggregations for better performance
-        from sqlalchemy import case, func
-
-        # Single query to get all statistics at once
-        stats_query = db.query(
-            func.count(TicketDB.id).label("total"),
-            func.sum(case((TicketDB.status == "pendente", 1), else_=0)).label(
-                "pendentes"
-            ),
-            func.sum(case((TicketDB.status == "em_andamento", 1), else_=0)).label(
-                "em_andamento"
-            ),
-            func.sum(case((TicketDB.status == "concluido", 1), else_=0)).label(
-                "concluidos"
-            ),
-            func.sum(case((TicketDB.status == "cancelado", 1), else_=0)).label(
-                "cancelados"
-            ),
-            # Priority counts
-            func.sum(case((TicketDB.prioridade == "baixa", 1), else_=0)).label(
-                "prioridade_baixa"
-            ),
-            func.sum(case((TicketDB.prioridade == "media", 1), else_=0)).label(
-                "prioridade_media"
-            ),
-            func.sum(case((TicketDB.prioridade == "alta", 1), else_=0)).label(
-                "prioridade_alta"
-            ),
-            func.sum(case((TicketDB.prioridade == "critica", 1), else_=0)).label(
-                "prioridade_critica"
-            ),
-            # Category counts
-            func.sum(case((TicketDB.categoria == "geral", 1), else_=0)).label(
-                "categoria_geral"
-            ),
-            func.sum(case((TicketDB.categoria == "auditoria", 1), else_=0)).label(
-                "categoria_auditoria"
-            ),
-            func.sum(case((TicketDB.categoria == "folha", 1), else_=0)).label(
-                "categoria_folha"
-            ),
-            func.sum(case((TicketDB.categoria == "documentos", 1), else_=0)).label(
-                "categoria_documentos"
-            ),
-            func.sum(case((TicketDB.categoria == "cct", 1), else_=0)).label(
-                "categoria_cct"
-            ),
-            func.sum(case((TicketDB.categoria == "sistema", 1), else_=0)).label(
-                "categoria_sistema"
-            ),
-            # Average completion time for completed tickets
-            func.avg(
-                case((TicketDB.status == "concluido", TicketDB.tempo_gasto), else_=None)
-            ).label("tempo_medio"),
-        ).first()
-
-        # Build response from single query result
-        por_prioridade = {
-            "baixa": int(stats_query.prioridade_baixa or 0),
-            "media": int(stats_query.prioridade_media or 0),
-            "alta": int(stats_query.prioridade_alta or 0),
-            "critica": int(stats_query.prioridade_critica or 0),
-        }
-
-        por_categoria = {
-            "geral": int(stats_query.categoria_geral or 0),
-            "auditoria": int(stats_query.categoria_auditoria or 0),
-            "folha": int(stats_query.categoria_folha or 0),
-            "documentos": int(stats_query.categoria_documentos or 0),
-            "cct": int(stats_query.categoria_cct or 0),
-            "sistema": int(stats_query.categoria_sistema or 0),
-        }
+        result = estatisticas_tickets_service.obter_estatisticas(db)
 
         # Calculate processing time
         processing_time = time.time() - start_time
 
-        result = TicketStats(
-            total=int(stats_query.total or 0),
-            pendentes=int(stats_query.pendentes or 0),
-            em_andamento=int(stats_query.em_andamento or 0),
-            concluidos=int(stats_query.concluidos or 0),
-            cancelados=int(stats_query.cancelados or 0),
-            por_prioridade=por_prioridade,
-            por_categoria=por_categoria,
-            tempo_medio_conclusao=(
-                float(stats_query.tempo_medio) if stats_query.tempo_medio else None
-            ),
-        )
-
         logger.info(f"Portal stats generated in {processing_time:.3f}s")
 
         if processing_time > 0.5:
@@ -615,6 +1175,156 @@ def obter_estatisticas(db: Session = Depends(get_db)):
         )
 
 
+@app.get("/stats/serie-temporal", tags=["stats"])
+def obter_serie_temporal(
+    inicio: Optional[date] = Query(None, description="Primeiro dia (padrão: 30 dias atrás)"),
+    fim: Optional[date] = Query(None, description="Último dia (padrão: hoje)"),
+    granularidade: str = Query("dia", pattern="^(dia|semana|mes)$", description="dia, semana ou mes"),
+    agrupar_por: Optional[str] = Query(
+        None,
+        pattern="^(status|prioridade|categoria|responsavel)$",
+        description="Quebrar a série por status, prioridade, categoria ou responsavel",
+    ),
+    responsavel: Optional[str] = Query(None, description="Filtrar por responsável (exato)"),
+    categoria: Optional[TicketCategoria] = Query(None, description="Filtrar por categoria"),
+    prioridade: Optional[TicketPrioridade] = Query(None, description="Filtrar por prioridade"),
+    db: Session = Depends(get_db),
+):
+    """
+    Série temporal de tickets abertos e fechados
+
+    Lida da tabela de rollups diários (TicketsRollupDiario), mantida a cada
+    escrita de ticket; semanas começam na segunda-feira. Intervalo máximo de
+    cerca de dois anos.
+    """
+    fim = fim or datetime.now(timezone.utc).date()
+    inicio = inicio or fim - timedelta(days=29)
+    if inicio > fim:
+        raise HTTPException(status_code=400, detail="inicio deve ser anterior ou igual a fim")
+    if (fim - inicio).days + 1 > MAX_DIAS_SERIE_TEMPORAL:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Intervalo máximo de {MAX_DIAS_SERIE_TEMPORAL} dias",
+        )
+
+    try:
+        serie = rollups_tickets_service.serie_temporal(
+            db,
+            inicio,
+            fim,
+            granularidade=granularidade,
+            agrupar_por=agrupar_por,
+            filtros={
+                "responsavel": responsavel,
+                "categoria": categoria.value if categoria else None,
+                "prioridade": prioridade.value if prioridade else None,
+            },
+        )
+        return {
+            "inicio": inicio.isoformat(),
+            "fim": fim.isoformat(),
+            "granularidade": granularidade,
+            "agrupar_por": agrupar_por,
+            "serie": serie,
+        }
+
+    except Exception as e:
+        logger.error(f"Failed to build ticket time series: {e}")
+        raise HTTPException(
+            status_code=500, detail=f"Erro ao obter série temporal: {str(e)}"
+        )
+
+
+@app.get("/stats/sla", tags=["stats"])
+def obter_sla_tickets(
+    horas: int = Query(24, ge=1, le=720, description="Janela de risco: prazo nas próximas N horas"),
+    responsavel: Optional[str] = Query(None, description="Filtrar por responsável (exato)"),
+    situacao: str = Query(
+        "todos", pattern="^(todos|atrasados|em_risco)$", description="Tickets a listar"
+    ),
+    incluir_tickets: bool = Query(True, description="Incluir a lista de tickets"),
+    limite: int = Query(50, ge=1, le=500, description="Máximo de tickets listados"),
+    db: Session = Depends(get_db),
+):
+    """
+    Tickets abertos atrasados ou em risco de atraso
+
+    Retorna as contagens, a agregação por responsável e (opcionalmente) os
+    tickets com prazo mais próximo/vencido. Usa o índice (status, prazo):
+    tickets concluídos ou cancelados não são lidos.
+    """
+    try:
+        resultado = {
+            **sla_tickets_service.contar(db, horas, responsavel),
+            "por_responsavel": sla_tickets_service.por_responsavel(db, horas, responsavel),
+        }
+        if incluir_tickets:
+            resultado["tickets"] = [
+                Ticket.model_validate(ticket)
+                for ticket in sla_tickets_service.listar(
+                    db, horas, situacao=situacao, responsavel=responsavel, limite=limite
+                )
+            ]
+        return resultado
+
+    except Exception as e:
+        logger.error(f"Failed to get ticket SLA: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro ao obter SLA: {str(e)}")
+
+
+@app.get("/stats/sla/contagem", tags=["stats"])
+def contar_sla_tickets(
+    horas: int = Query(24, ge=1, le=720, description="Contar prazos nas próximas N horas"),
+    responsavel: Optional[str] = Query(None, description="Filtrar por responsável (exato)"),
+    db: Session = Depends(get_db),
+):
+    """
+    Contador leve para polling: atrasados e vencendo nas próximas N horas
+
+    Duas contagens por faixa no índice (status, prazo), sem varrer a tabela.
+    """
+    try:
+        return sla_tickets_service.contar(db, horas, responsavel)
+
+    except Exception as e:
+        logger.error(f"Failed to count ticket SLA: {e}")
+        raise HTTPException(status_code=500, detail=f"Erro ao contar SLA: {str(e)}")
+
+
+@app.get("/stats/tags", tags=["stats"])
+def obter_cardinalidade_tags(
+    prefixo: Optional[str] = Query(None, description="Apenas tags que começam com o prefixo"),
+    limite: int = Query(100, ge=1, le=1000, description="Máximo de tags retornadas"),
+    db: Session = Depends(get_db),
+):
+    """
+    Quantidade de tickets por tag (mais usadas primeiro)
+    """
+    try:
+        tags = tags_tickets_service.cardinalidade(db, prefixo=prefixo, limite=limite)
+        return {"tags": tags, "total_tags": len(tags)}
+
+    except Exception as e:
+        logger.error(f"Failed to get tag cardinality: {e}")
+        raise HTTPException(
+            status_code=500, detail=f"Erro ao obter estatísticas de tags: {str(e)}"
+        )
+
+
+@app.get("/stats/cache-extracao", tags=["stats"])
+def obter_estatisticas_cache_extracao():
+    """
+    Métricas do cache de extrações por IA
+
+    Hits (PDF já extraído com a mesma instrução e versão do modelo), misses,
+    gravações, remoções por limite de tamanho, entradas e bytes em disco.
+    """
+    return {
+        **cache_extracao.estatisticas(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
+
+
 # Bulk operations
 @app.patch("/tickets/bulk/status", tags=["tickets"])
 def atualizar_status_bulk(
@@ -624,23 +1334,36 @@ def atualizar_status_bulk(
     Atualizar status de múltiplos tickets
     """
     try:
+        # Locked: concurrent writers can't change the rows between snapshot and UPDATE
+        antes = carregar_snapshots(db, TicketDB.id.in_(ticket_ids), bloquear=True)
+        valores = {
+            "status": new_status.value,
+            "atualizado_em": datetime.now(timezone.utc),
+        }
+
         updated_count = (
             db.query(TicketDB)
-            .filter(TicketDB.id.in_(ticket_ids))
+            .filter(TicketDB.id.in_([snapshot["id"] for snapshot in antes]))
             .update(
-                {
-                    "status": new_status.value,
-                    "atualizado_em": datetime.now(timezone.utc),
-                },
+                {**valores, TicketDB.version: TicketDB.version + 1},
                 synchronize_session=False,
             )
         )
 
+        depois = [{**snapshot, **valores} for snapshot in antes]
+        estatisticas_tickets_service.registrar_alteracoes(db, antes, depois)
+        rollups_tickets_service.registrar_alteracoes(db, antes, depois)
+        versoes_tabelas_service.incrementar(db, TicketDB.__tablename__)
+
         db.commit()
 
         logger.info(
             f"Bulk status update: {updated_count} tickets updated to {new_status.value}"
         )
+        broadcaster_eventos.publicar(
+            "tickets.status_bulk",
+            {"ids": [snapshot["id"] for snapshot in antes], "status": new_status.value},
+        )
 
         return {
             "message": f"{updated_count} tickets atualizados para status '{new_status.value}'",
@@ -655,90 +1378,464 @@ def atualizar_status_bulk(
         )
 
 
-# ===== CONTROLE MENSAL ENDPOINTS =====
+def _registrar_log_operacao(
+    db: Session,
+    request: Request,
+    contabilidade_id: int,
+    operacao: str,
+    tabela_afetada: str,
+    registro_id: Optional[str],
+    detalhes: Dict[str, Any],
+):
+    """Add an audit trail entry (LOGOPERACOES) to the caller's transaction"""
+    ip_origem = request.client.host if request.client else None
+    try:
+        ipaddress.ip_address(ip_origem)
+    except (TypeError, ValueError):
+        ip_origem = None
 
-@app.get("/v1/controles/{ano}/{mes}", response_model=ControleMensalResponse, tags=["controle-mensal"])
-def obter_controles_do_mes(
-    ano: int, mes: int, db: Session = Depends(get_db)
+    db.add(
+        LogOperacoesDB(
+            contabilidade_id=contabilidade_id,
+            operacao=operacao,
+            tabela_afetada=tabela_afetada,
+            registro_id=registro_id,
+            detalhes_operacao=jsonable_encoder(detalhes),
+            timestamp_operacao=datetime.utcnow(),
+            ip_origem=ip_origem,
+            user_agent=request.headers.get("user-agent"),
+            resultado="SUCCESS",
+        )
+    )
+
+
+@app.patch("/tickets/bulk/campos", tags=["tickets"])
+def atualizar_tickets_bulk(
+    payload: TicketBulkUpdate,
+    request: Request,
+    tamanho_lote: int = Query(
+        1000, ge=1, le=5000, description="Tickets por UPDATE/transação"
+    ),
+    db: Session = Depends(get_db),
 ):
     """
-    Obter todos os controles mensais do ano/mês especificado
-    Endpoint principal que substitui as chamadas diretas ao Supabase
+    Atualizar campos de múltiplos tickets
+
+    Os tickets são selecionados por `ticket_ids`, por `filtro` (mesmos
+    critérios da listagem; ao menos um critério) ou por `todos=true`, e
+    recebem as mesmas `alteracoes` (formato de TicketUpdate). Cada lote é
+    aplicado com um único UPDATE em sua própria transação, junto com os
+    contadores de estatísticas e um registro em LOGOPERACOES (ids, campos e
+    valores aplicados).
     """
+    # Validated once by the body model; None means "leave unchanged" as in PATCH /tickets/{id}
+    valores = {
+        campo: getattr(valor, "value", valor)
+        for campo, valor in payload.alteracoes.model_dump(
+            exclude_unset=True, exclude={"version"}
+        ).items()
+        if valor is not None
+    }
+    campos = sorted(valores)
+
+    # TODO: Get contabilidade_id from auth context
+    contabilidade_id = 1
+
+    if payload.ticket_ids is not None:
+        ids_pendentes = sorted(set(payload.ticket_ids))
+        query_ids = None
+        selecao = {"selecao": "ticket_ids"}
+    elif payload.todos:
+        ids_pendentes = None
+        query_ids = db.query(TicketDB.id)
+        selecao = {"selecao": "todos"}
+    else:
+        ids_pendentes = None
+        query_ids = _filtrar_tickets_por_filtro(
+            db.query(TicketDB.id), db, payload.filtro
+        )
+        selecao = {
+            "selecao": "filtro",
+            "filtro": payload.filtro.model_dump(exclude_none=True),
+        }
+
+    atualizados = 0
+    lotes = 0
+    ultimo_id = 0
+
     try:
-        # Get user's accounting firm ID (this would come from auth in production)
-        # For now, we'll assume contabilidade_id = 1 for testing
-        contabilidade_id = 1  # TODO: Get from authentication context
-        
-        # Query controls with companies and tasks
-        controles_query = (
-            db.query(ControleMensalDB, EmpresaDB.nome.label('nome_empresa'))
-            .join(EmpresaDB, ControleMensalDB.empresa_id == EmpresaDB.id)
-            .filter(EmpresaDB.contabilidade_id == contabilidade_id)
-            .filter(ControleMensalDB.ano == ano)
-            .filter(ControleMensalDB.mes == mes)
-        )
-        
-        controles_raw = controles_query.all()
-        
-        # Build detailed control objects
-        controles = []
-        for controle_db, nome_empresa in controles_raw:
-            # Get tasks for this control
-            tarefas_raw = (
-                db.query(TarefaControleDB)
-                .filter(TarefaControleDB.controle_mensal_id == controle_db.id)
-                .all()
+        while True:
+            # Next chunk of ids, walking the primary key so updated rows are never revisited
+            if ids_pendentes is not None:
+                ids = ids_pendentes[lotes * tamanho_lote:(lotes + 1) * tamanho_lote]
+            else:
+                ids = [
+                    ticket_id
+                    for (ticket_id,) in query_ids.filter(TicketDB.id > ultimo_id)
+                    .order_by(asc(TicketDB.id))
+                    .limit(tamanho_lote)
+                ]
+            if not ids:
+                break
+            ultimo_id = ids[-1]
+
+            # Locked in PK order: the chunk can overlap the archiver or other writers
+            antes = carregar_snapshots(db, TicketDB.id.in_(ids), bloquear=True)
+            ids_bloqueados = [snapshot["id"] for snapshot in antes]
+            valores_lote = {**valores, "atualizado_em": datetime.now(timezone.utc)}
+
+            resultado = db.execute(
+                update(TicketDB)
+                .where(TicketDB.id.in_(ids_bloqueados))
+                .values(**valores_lote, version=TicketDB.version + 1)
+                .execution_options(synchronize_session=False)
             )
-            
-            tarefas = [
-                Tarefa(
-                    id=tarefa.id,
-                    nome_tarefa=tarefa.descricao_tarefa,
-                    concluido=tarefa.concluida,
-                    data_conclusao=tarefa.data_conclusao
-                ) for tarefa in tarefas_raw
+
+            depois = [
+                {**snapshot, **{k: v for k, v in valores_lote.items() if k in snapshot}}
+                for snapshot in antes
             ]
-            
-            controles.append(
-                ControleMensalDetalhado(
-                    id_controle=controle_db.id,
-                    mes=controle_db.mes,
-                    ano=controle_db.ano,
-                    status_dados=controle_db.status,
-                    id_empresa=controle_db.empresa_id,
-                    nome_empresa=nome_empresa,
-                    tarefas=tarefas
+            estatisticas_tickets_service.registrar_alteracoes(db, antes, depois)
+            rollups_tickets_service.registrar_alteracoes(db, antes, depois)
+            if "tags" in valores:
+                tags_tickets_service.sincronizar(
+                    db, {snapshot["id"]: valores["tags"] for snapshot in antes}
                 )
+            versoes_tabelas_service.incrementar(db, TicketDB.__tablename__)
+            _registrar_log_operacao(
+                db,
+                request,
+                contabilidade_id,
+                "UPDATE_BULK",
+                TicketDB.__tablename__,
+                f"{ids[0]}..{ids[-1]}",
+                {
+                    **selecao,
+                    "lote": lotes + 1,
+                    "ids": ids_bloqueados,
+                    "campos": campos,
+                    "valores": valores,
+                },
             )
-        
-        # Calculate summary statistics
-        total_empresas = (
-            db.query(EmpresaDB)
-            .filter(EmpresaDB.contabilidade_id == contabilidade_id)
-            .count()
+
+            db.commit()
+            atualizados += resultado.rowcount
+            lotes += 1
+
+            logger.info(
+                f"Bulk ticket update: {resultado.rowcount} tickets "
+                f"(IDs {ids[0]}..{ids[-1]}) campos={campos}"
+            )
+            broadcaster_eventos.publicar(
+                "tickets.atualizados_bulk", {"ids": ids_bloqueados, "campos": campos}
+            )
+
+        return {
+            "message": f"{atualizados} tickets atualizados",
+            "updated_count": atualizados,
+            "lotes": lotes,
+            "campos": campos,
+        }
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed bulk ticket update after {atualizados} tickets: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Erro na atualização em lote ({atualizados} tickets já atualizados): {str(e)}",
         )
-        
-        controles_iniciados = len(controles)
-        controles_concluidos = sum(1 for c in controles if c.status_dados == "CONCLUÍDO")
-        percentual_conclusao = (
-            f"{(controles_concluidos / controles_iniciados * 100):.2f}%" 
-            if controles_iniciados > 0 else "0.00%"
+
+
+@app.post("/tickets/import", tags=["tickets"])
+def importar_tickets(
+    arquivo: UploadFile = File(..., description="Arquivo CSV (com cabeçalho) ou NDJSON"),
+    formato: Optional[str] = Query(
+        None, description="csv ou ndjson (padrão: inferido pelo nome do arquivo)"
+    ),
+    tamanho_lote: int = Query(
+        500, ge=1, le=5000, description="Linhas por lote/transação"
+    ),
+    max_erros: int = Query(
+        1000, ge=0, le=10000, description="Máximo de erros detalhados no relatório"
+    ),
+    db: Session = Depends(get_db),
+):
+    """
+    Importar tickets em lote a partir de CSV ou NDJSON
+
+    O arquivo é lido de forma incremental, cada linha é validada com as
+    regras de TicketCreate e as linhas válidas são gravadas em lotes
+    (executemany), cada lote em sua própria transação. Linhas inválidas são
+    reportadas com o número da linha.
+    """
+    formato = (formato or detectar_formato(arquivo.filename, arquivo.content_type) or "").lower()
+    if formato not in FORMATOS_SUPORTADOS:
+        raise HTTPException(
+            status_code=400,
+            detail="Formato não suportado. Use CSV ou NDJSON (parâmetro formato)",
         )
-        
-        sumario = ControleMensalSumario(
-            total_empresas=total_empresas,
+
+    try:
+        resultado = importacao_tickets_service.importar(
+            db,
+            arquivo.file,
+            formato,
+            tamanho_lote=tamanho_lote,
+            max_erros=max_erros,
+        )
+
+        logger.info(
+            f"Ticket import ({formato}): {resultado['importados']} imported, "
+            f"{resultado['rejeitados']} rejected in {resultado['lotes']} batches"
+        )
+        if resultado["importados"]:
+            broadcaster_eventos.publicar(
+                "tickets.importados", {"quantidade": resultado["importados"]}
+            )
+
+        return {
+            "message": f"{resultado['importados']} tickets importados, {resultado['rejeitados']} linhas rejeitadas",
+            **resultado,
+        }
+
+    except UnicodeDecodeError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"Arquivo não está em UTF-8: {str(e)}")
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed ticket import: {e}")
+        raise HTTPException(
+            status_code=500, detail=f"Erro na importação de tickets: {str(e)}"
+        )
+
+
+# ===== CONTROLE MENSAL ENDPOINTS =====
+
+def _montar_quadro_controles(
+    db: Session, contabilidade_id: int, ano: int, mes: int
+) -> ControleMensalResponse:
+    """
+    Monthly control board of an accounting firm in a single query
+
+    Companies LEFT JOIN their controls of the period LEFT JOIN the control
+    tasks: one round trip regardless of the number of companies, grouped in
+    memory. Companies without a control still produce a row, so the company
+    total comes from the same result.
+    """
+    linhas = (
+        db.query(
+            EmpresaDB.id,
+            EmpresaDB.nome,
+            ControleMensalDB.id,
+            ControleMensalDB.status,
+            ControleMensalDB.tarefas_total,
+            ControleMensalDB.tarefas_concluidas,
+            TarefaControleDB.id,
+            TarefaControleDB.descricao_tarefa,
+            TarefaControleDB.concluida,
+            TarefaControleDB.data_conclusao,
+            TarefaControleDB.version,
+        )
+        .select_from(EmpresaDB)
+        .outerjoin(
+            ControleMensalDB,
+            (ControleMensalDB.empresa_id == EmpresaDB.id)
+            & (ControleMensalDB.ano == ano)
+            & (ControleMensalDB.mes == mes),
+        )
+        .outerjoin(TarefaControleDB, TarefaControleDB.controle_mensal_id == ControleMensalDB.id)
+        .filter(EmpresaDB.contabilidade_id == contabilidade_id)
+        .order_by(ControleMensalDB.id, TarefaControleDB.id)
+        .all()
+    )
+
+    empresas = set()
+    controles: Dict[int, ControleMensalDetalhado] = {}
+    for (
+        empresa_id,
+        nome_empresa,
+        controle_id,
+        status_controle,
+        tarefas_total,
+        tarefas_concluidas,
+        tarefa_id,
+        descricao_tarefa,
+        concluida,
+        data_conclusao,
+        versao_tarefa,
+    ) in linhas:
+        empresas.add(empresa_id)
+        if controle_id is None:
+            continue
+
+        controle = controles.get(controle_id)
+        if controle is None:
+            controle = controles[controle_id] = ControleMensalDetalhado(
+                id_controle=controle_id,
+                mes=mes,
+                ano=ano,
+                status_dados=status_controle,
+                id_empresa=empresa_id,
+                nome_empresa=nome_empresa,
+                tarefas=[],
+                tarefas_total=tarefas_total,
+                tarefas_concluidas=tarefas_concluidas,
+            )
+        if tarefa_id is not None:
+            controle.tarefas.append(
+                Tarefa(
+                    id=tarefa_id,
+                    nome_tarefa=descricao_tarefa,
+                    concluido=concluida,
+                    data_conclusao=data_conclusao,
+                    version=versao_tarefa,
+                )
+            )
+
+    controles_iniciados = len(controles)
+    controles_concluidos = sum(
+        1 for controle in controles.values() if controle.status_dados == "CONCLUÍDO"
+    )
+    percentual_conclusao = (
+        f"{(controles_concluidos / controles_iniciados * 100):.2f}%"
+        if controles_iniciados > 0 else "0.00%"
+    )
+
+    return ControleMensalResponse(
+        sumario=ControleMensalSumario(
+            total_empresas=len(empresas),
             controles_iniciados=controles_iniciados,
             controles_concluidos=controles_concluidos,
-            percentual_conclusao=percentual_conclusao
-        )
-        
-        response = ControleMensalResponse(
-            sumario=sumario,
-            controles=controles
+            percentual_conclusao=percentual_conclusao,
+        ),
+        controles=list(controles.values()),
+    )
+
+
+@app.get("/v1/controles/resumo", tags=["controle-mensal"])
+def resumir_controles_periodo(
+    inicio: str = Query(..., pattern=r"^\d{4}-(0[1-9]|1[0-2])$", description="Primeiro mês (AAAA-MM)"),
+    fim: str = Query(..., pattern=r"^\d{4}-(0[1-9]|1[0-2])$", description="Último mês (AAAA-MM)"),
+    pendentes: bool = Query(False, description="Somente controles com tarefas pendentes"),
+):
+    """
+    Resumo de vários meses: status e percentual de conclusão por empresa e mês
+
+    Para visões anuais: uma única consulta (com os contadores de tarefas dos
+    controles) em vez de um quadro completo por mês. Resposta em NDJSON: a
+    primeira linha lista os períodos; cada linha seguinte é uma empresa com
+    `meses` alinhado aos períodos ([status, concluídas/total] ou null).
+    Com pendentes=true só entram controles com tarefas pendentes (os demais
+    meses ficam null) e empresas sem nenhum deles são omitidas.
+    """
+    # TODO: Get contabilidade_id from auth context
+    contabilidade_id = 1
+
+    ano_inicio, mes_inicio = (int(parte) for parte in inicio.split("-"))
+    ano_fim, mes_fim = (int(parte) for parte in fim.split("-"))
+    quantidade_meses = (ano_fim * 12 + mes_fim) - (ano_inicio * 12 + mes_inicio) + 1
+    if quantidade_meses < 1:
+        raise HTTPException(status_code=400, detail="'inicio' deve ser anterior ou igual a 'fim'")
+    if quantidade_meses > MAX_MESES_RESUMO_CONTROLES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Intervalo máximo de {MAX_MESES_RESUMO_CONTROLES} meses",
         )
+
+    return StreamingResponse(
+        _gerar_resumo_controles(
+            contabilidade_id, (ano_inicio, mes_inicio), (ano_fim, mes_fim), pendentes
+        ),
+        media_type="application/x-ndjson",
+    )
+
+
+def _gerar_resumo_controles(contabilidade_id: int, inicio, fim, pendentes: bool = False):
+    """Stream the multi-period summary in chunks (own session, as in exports)"""
+    periodos = []
+    ano, mes = inicio
+    while (ano, mes) <= fim:
+        periodos.append(f"{ano:04d}-{mes:02d}")
+        ano, mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+
+    buffer = [json.dumps({"periodos": periodos}, separators=(",", ":"))]
+    empresas = 0
+    with SessionLocal() as session:
+        try:
+            for empresa_id, nome, meses in controles_mensais_service.resumo_periodos(
+                session,
+                contabilidade_id,
+                inicio,
+                fim,
+                pendentes=pendentes,
+                tamanho_lote=EXPORT_BATCH_SIZE,
+            ):
+                buffer.append(
+                    json.dumps(
+                        {"empresa_id": empresa_id, "nome_empresa": nome, "meses": meses},
+                        ensure_ascii=False,
+                        separators=(",", ":"),
+                    )
+                )
+                empresas += 1
+                if len(buffer) >= EXPORT_BATCH_SIZE:
+                    yield "\n".join(buffer) + "\n"
+                    buffer = []
+
+            if buffer:
+                yield "\n".join(buffer) + "\n"
+            logger.info(f"Control summary {periodos[0]}..{periodos[-1]}: {empresas} empresas")
+
+        except Exception as e:
+            logger.error(f"Control summary failed after {empresas} empresas: {e}")
+            raise
+
+
+@app.get("/v1/controles/{ano}/{mes}", response_model=ControleMensalResponse, tags=["controle-mensal"])
+def obter_controles_do_mes(
+    ano: int,
+    mes: int,
+    pendentes: bool = Query(False, description="Somente controles com tarefas pendentes"),
+    db: Session = Depends(get_db),
+):
+    """
+    Obter todos os controles mensais do ano/mês especificado
+    Endpoint principal que substitui as chamadas diretas ao Supabase
+
+    Served from an in-memory LRU/TTL cache per (contabilidade, ano, mes),
+    invalidated by the writes that change the board. With pendentes=true
+    only controls with tarefas_concluidas < tarefas_total are listed,
+    filtered from the same cached board (the sumario stays the month's).
+    """
+    try:
+        # Get user's accounting firm ID (this would come from auth in production)
+        # For now, we'll assume contabilidade_id = 1 for testing
+        contabilidade_id = 1  # TODO: Get from authentication context
         
-        logger.info(f"Retrieved {len(controles)} controles for {ano}/{mes} - {percentual_conclusao} completed")
+        chave = chave_quadro(contabilidade_id, ano, mes)
+        response = cache_quadro_controles.obter(chave)
+        if response is None:
+            # One query for controls, tasks and the summary (no per-control queries)
+            geracao = cache_quadro_controles.geracao(chave)
+            response = _montar_quadro_controles(db, contabilidade_id, ano, mes)
+            cache_quadro_controles.gravar(chave, response, geracao)
+
+            logger.info(
+                f"Retrieved {len(response.controles)} controles for {ano}/{mes} - "
+                f"{response.sumario.percentual_conclusao} completed"
+            )
+
+        if pendentes:
+            # The cached board is shared: filter a copy, never the entry itself
+            response = response.model_copy(
+                update={
+                    "controles": [
+                        controle
+                        for controle in response.controles
+                        if controle.tarefas_concluidas < controle.tarefas_total
+                    ]
+                }
+            )
         return response
 
     except Exception as e:
@@ -748,34 +1845,130 @@ def obter_controles_do_mes(
         )
 
 
+@app.patch("/v1/controles-mensais/tarefas/bulk/status", tags=["controle-mensal"])
+def atualizar_status_tarefas_bulk(payload: TarefasBulkStatus, db: Session = Depends(get_db)):
+    """
+    Concluir ou reabrir várias tarefas de uma vez
+
+    Seleciona por `tarefa_ids` ou pela mesma tarefa (descricao_tarefa) em
+    todas as empresas de um período - ex.: fechamento do mês. Um único
+    UPDATE marca as tarefas, carimba data_conclusao e incrementa a versão;
+    os contadores de progresso dos controles mudam na mesma transação.
+    """
+    try:
+        # TODO: Get contabilidade_id from auth context
+        contabilidade_id = 1
+
+        resultado = controles_mensais_service.alternar_tarefas(
+            db,
+            contabilidade_id,
+            payload.concluido,
+            tarefa_ids=payload.tarefa_ids,
+            descricao_tarefa=payload.descricao_tarefa,
+            ano=payload.ano,
+            mes=payload.mes,
+            empresas_ids=payload.empresas_ids,
+        )
+        db.commit()
+        for ano, mes in resultado["periodos"]:
+            cache_quadro_controles.invalidar(chave_quadro(contabilidade_id, ano, mes))
+
+        logger.info(
+            f"Bulk task status: {resultado['atualizadas']} tasks in "
+            f"{len(resultado['controles'])} controls set to concluido={payload.concluido}"
+        )
+        return {
+            "message": f"{resultado['atualizadas']} tarefas atualizadas",
+            "atualizadas": resultado["atualizadas"],
+            "controles_afetados": len(resultado["controles"]),
+        }
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to bulk update task status: {e}")
+        raise HTTPException(
+            status_code=500, detail=f"Erro ao atualizar tarefas: {str(e)}"
+        )
+
+
 @app.patch("/v1/controles-mensais/tarefas/{tarefa_id}/status", response_model=Tarefa, tags=["controle-mensal"])
 def atualizar_status_tarefa(
-    tarefa_id: int, concluido: bool, db: Session = Depends(get_db)
+    tarefa_id: int,
+    concluido: bool,
+    version: Optional[int] = Query(
+        None, ge=1, description="Versão esperada da tarefa (409 se ela já mudou)"
+    ),
+    db: Session = Depends(get_db),
 ):
     """
     Atualizar o status de conclusão de uma tarefa
+
+    Compare-and-swap na coluna version: sem `version`, vale a versão lida
+    nesta requisição. Uma alteração concorrente resulta em 409.
     """
-    tarefa = db.query(TarefaControleDB).filter(TarefaControleDB.id == tarefa_id).first()
+    resultado_tarefa = (
+        db.query(TarefaControleDB, EmpresaDB.contabilidade_id, ControleMensalDB.ano, ControleMensalDB.mes)
+        .join(ControleMensalDB, TarefaControleDB.controle_mensal_id == ControleMensalDB.id)
+        .join(EmpresaDB, ControleMensalDB.empresa_id == EmpresaDB.id)
+        .filter(TarefaControleDB.id == tarefa_id)
+        .first()
+    )
     
-    if not tarefa:
+    if not resultado_tarefa:
         raise HTTPException(status_code=404, detail="Tarefa não encontrada")
     
+    tarefa, contabilidade_id, ano, mes = resultado_tarefa
+    
     try:
-        tarefa.concluida = concluido
-        tarefa.data_conclusao = datetime.now(timezone.utc) if concluido else None
+        # The CAS below runs against the version read here, so the previous
+        # `concluida` is known and the control's counter gets an exact delta
+        versao_esperada = tarefa.version
+        if version is not None and version != versao_esperada:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Conflito de versão: a tarefa foi alterada por outra requisição (versão esperada {version}, atual {versao_esperada})",
+            )
+        concluida_antes = tarefa.concluida
+
+        resultado = db.execute(
+            update(TarefaControleDB)
+            .where(
+                TarefaControleDB.id == tarefa_id,
+                TarefaControleDB.version == versao_esperada,
+            )
+            .values(
+                concluida=concluido,
+                data_conclusao=datetime.now(timezone.utc) if concluido else None,
+                version=TarefaControleDB.version + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if resultado.rowcount == 0:
+            db.rollback()
+            raise HTTPException(
+                status_code=409,
+                detail=f"Conflito de versão: a tarefa foi alterada por outra requisição (versão esperada {versao_esperada})",
+            )
+        controles_mensais_service.registrar_conclusoes(
+            db, {tarefa.controle_mensal_id: int(concluido) - int(concluida_antes)}
+        )
         
         db.commit()
+        cache_quadro_controles.invalidar(chave_quadro(contabilidade_id, ano, mes))
         db.refresh(tarefa)
         
-        logger.info(f"Task {tarefa_id} updated: concluido={concluido}")
+        logger.info(f"Task {tarefa_id} updated: concluido={concluido}, version={tarefa.version}")
         
         return Tarefa(
             id=tarefa.id,
             nome_tarefa=tarefa.descricao_tarefa, 
             concluido=tarefa.concluida,
-            data_conclusao=tarefa.data_conclusao
+            data_conclusao=tarefa.data_conclusao,
+            version=tarefa.version,
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         logger.error(f"Failed to update task {tarefa_id}: {e}")
@@ -825,35 +2018,8 @@ def listar_templates(db: Session = Depends(get_db)):
         # TODO: Get contabilidade_id from auth context
         contabilidade_id = 1
         
-        templates_raw = (
-            db.query(TemplateControleDB)
-            .filter(TemplateControleDB.contabilidade_id == contabilidade_id)
-            .all()
-        )
-        
-        templates = []
-        for template_db in templates_raw:
-            # Get tasks for this template
-            tarefas_raw = (
-                db.query(TemplateControleTarefaDB.descricao_tarefa)
-                .filter(TemplateControleTarefaDB.template_id == template_db.id)
-                .all()
-            )
-            
-            tarefas = [t[0] for t in tarefas_raw]
-            
-            templates.append(
-                TemplateControle(
-                    id=template_db.id,
-                    contabilidade_id=template_db.contabilidade_id,
-                    nome_template=template_db.nome_template,
-                    descricao=template_db.descricao,
-                    criado_em=template_db.criado_em,
-                    tarefas=tarefas
-                )
-            )
-        
-        return templates
+        # Per-tenant registry: one grouped query on load, then served from memory
+        return registro_templates.listar(db, contabilidade_id)
 
     except Exception as e:
         logger.error(f"Failed to list templates: {e}")
@@ -890,7 +2056,9 @@ def criar_template(template: TemplateControleCreate, db: Session = Depends(get_d
             )
             db.add(tarefa_db)
         
+        registro_templates.registrar_alteracao(db, contabilidade_id)
         db.commit()
+        registro_templates.descartar(contabilidade_id)
         db.refresh(template_db)
         
         logger.info(f"Created template: {template_db.id} - {template_db.nome_template}")
@@ -921,73 +2089,28 @@ def aplicar_template(aplicacao: TemplateAplicacao, db: Session = Depends(get_db)
         # TODO: Get contabilidade_id from auth context  
         contabilidade_id = 1
         
-        # Verify template exists and belongs to the accounting firm
-        template = (
-            db.query(TemplateControleDB)
-            .filter(TemplateControleDB.id == aplicacao.template_id)
-            .filter(TemplateControleDB.contabilidade_id == contabilidade_id)
-            .first()
-        )
+        # Verify template exists and belongs to the accounting firm (registry, in memory)
+        template = registro_templates.obter(db, contabilidade_id, aplicacao.template_id)
         
         if not template:
             raise HTTPException(status_code=404, detail="Template não encontrado")
         
-        # Get template tasks
-        template_tarefas = (
-            db.query(TemplateControleTarefaDB)
-            .filter(TemplateControleTarefaDB.template_id == template.id)
-            .all()
+        # Anti-join + bulk inserts: a fixed number of statements per call
+        resultado = controles_mensais_service.aplicar_template(
+            db,
+            template_id=template.id,
+            contabilidade_id=contabilidade_id,
+            ano=aplicacao.ano,
+            mes=aplicacao.mes,
+            status="AGUARD. DADOS",
+            empresas_ids=aplicacao.empresas_ids,
+            total_tarefas=len(template.tarefas),
         )
-        
-        # Get companies to apply to
-        empresas_query = db.query(EmpresaDB).filter(EmpresaDB.contabilidade_id == contabilidade_id)
-        
-        if aplicacao.empresas_ids:
-            empresas_query = empresas_query.filter(EmpresaDB.id.in_(aplicacao.empresas_ids))
-        
-        empresas = empresas_query.all()
-        
-        controles_criados = 0
-        tarefas_criadas = 0
-        
-        for empresa in empresas:
-            # Check if control already exists for this month/year
-            controle_existente = (
-                db.query(ControleMensalDB)
-                .filter(ControleMensalDB.empresa_id == empresa.id)
-                .filter(ControleMensalDB.mes == aplicacao.mes)
-                .filter(ControleMensalDB.ano == aplicacao.ano)
-                .first()
-            )
-            
-            if controle_existente:
-                continue  # Skip if already exists
-            
-            # Create monthly control
-            controle = ControleMensalDB(
-                empresa_id=empresa.id,
-                mes=aplicacao.mes,
-                ano=aplicacao.ano,
-                status="AGUARD. DADOS",
-                criado_em=datetime.now(timezone.utc)
-            )
-            
-            db.add(controle)
-            db.flush()  # Get ID
-            controles_criados += 1
-            
-            # Create tasks from template
-            for template_tarefa in template_tarefas:
-                tarefa = TarefaControleDB(
-                    controle_mensal_id=controle.id,
-                    descricao_tarefa=template_tarefa.descricao_tarefa,
-                    concluida=False,
-                    criado_em=datetime.now(timezone.utc)
-                )
-                db.add(tarefa)
-                tarefas_criadas += 1
+        controles_criados = resultado["controles_criados"]
+        tarefas_criadas = resultado["tarefas_criadas"]
         
         db.commit()
+        cache_quadro_controles.invalidar(chave_quadro(contabilidade_id, aplicacao.ano, aplicacao.mes))
         
         logger.info(f"Applied template {aplicacao.template_id}: {controles_criados} controles, {tarefas_criadas} tarefas created")
         
@@ -997,6 +2120,8 @@ def aplicar_template(aplicacao: TemplateAplicacao, db: Session = Depends(get_db)
             "tarefas_criadas": tarefas_criadas
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         logger.error(f"Failed to apply template {aplicacao.template_id}: {e}")
@@ -1007,12 +2132,125 @@ def aplicar_template(aplicacao: TemplateAplicacao, db: Session = Depends(get_db)
 
 # ===== PAYROLL AUDIT ENDPOINTS =====
 
+def _resposta_processamento_folha(
+    processamento: ProcessamentosFolhaDB, divergencias: Optional[List[dict]] = None
+) -> ProcessamentoFolhaResponse:
+    """Build the API response of a payroll processing (divergences parsed from JSON if omitted)"""
+    if divergencias is None:
+        divergencias = json.loads(processamento.relatorio_divergencias or "[]")
+
+    divergencias_models = [
+        FuncionarioDivergencia(
+            nome_funcionario=div["nome_funcionario"],
+            tipo_divergencia=div["tipo_divergencia"],
+            descricao_divergencia=div["descricao_divergencia"],
+            valor_encontrado=div.get("valor_encontrado"),
+            valor_esperado=div.get("valor_esperado"),
+            campo_afetado=div["campo_afetado"]
+        ) for div in divergencias
+    ]
+
+    return ProcessamentoFolhaResponse(
+        id=processamento.id,
+        empresa_id=processamento.empresa_id,
+        mes=processamento.mes,
+        ano=processamento.ano,
+        arquivo_pdf=processamento.arquivo_pdf,
+        total_funcionarios=processamento.total_funcionarios or 0,
+        total_divergencias=processamento.total_divergencias or 0,
+        status_processamento=processamento.status_processamento,
+        criado_em=processamento.criado_em,
+        concluido_em=processamento.concluido_em,
+        divergencias=divergencias_models,
+        mensagem_erro=processamento.mensagem_erro,
+    )
+
+
+def _registrar_resultado_auditoria(
+    processamento: ProcessamentosFolhaDB, dados_extraidos: dict, divergencias: List[dict]
+):
+    """Store the audit results on the processing record (caller commits)"""
+    processamento.dados_extraidos = json.dumps(dados_extraidos, ensure_ascii=False)
+    processamento.relatorio_divergencias = json.dumps(divergencias, ensure_ascii=False)
+    processamento.total_funcionarios = len(dados_extraidos.get("funcionarios", []))
+    processamento.total_divergencias = len(divergencias)
+    processamento.status_processamento = "CONCLUIDO"
+    processamento.concluido_em = datetime.now(timezone.utc)
+
+
+async def _receber_pdf(arquivo_pdf: UploadFile) -> UploadRecebido:
+    """Hash and size-check a PDF upload (413 above PORTAL_UPLOAD_MAX_MB)"""
+    try:
+        return await receber_upload(arquivo_pdf)
+    except UploadMuitoGrandeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+
+def _marcar_erro_processamento(processamento_id: int, mensagem: str):
+    """Flag a background processing as failed (own session)"""
+    with SessionLocal() as sessao:
+        processamento = sessao.get(ProcessamentosFolhaDB, processamento_id)
+        if processamento is None:
+            return
+        processamento.status_processamento = "ERRO"
+        processamento.mensagem_erro = mensagem[:2000]
+        processamento.concluido_em = datetime.now(timezone.utc)
+        sessao.commit()
+
+
+async def _auditar_folha_em_segundo_plano(
+    processamento_id: int, upload: UploadRecebido, empresa_id: int, mes: int, ano: int
+):
+    """
+    Worker job of the 202 mode: same processing as the synchronous path,
+    with its own session (the request's one is gone by now); closes the upload
+
+    Only the AI call is awaited on the event loop: database work and the
+    audit itself run in the threadpool, so a running audit never stalls the
+    other requests.
+    """
+
+    def _carregar():
+        return (
+            sessao.get(ProcessamentosFolhaDB, processamento_id),
+            sessao.get(EmpresaDB, empresa_id),
+        )
+
+    def _gravar(processamento, dados_extraidos, divergencias):
+        _registrar_resultado_auditoria(processamento, dados_extraidos, divergencias)
+        sessao.commit()
+
+    try:
+        with upload, SessionLocal() as sessao:
+            processamento, empresa = await run_in_threadpool(_carregar)
+
+            dados_extraidos, divergencias = await processar_pdf_com_ia(
+                upload.conteudo, empresa, mes, ano, sessao, sha256_conteudo=upload.sha256
+            )
+            await run_in_threadpool(_gravar, processamento, dados_extraidos, divergencias)
+
+        logger.info(
+            f"Payroll audit {processamento_id} completed in background: "
+            f"divergencias={len(divergencias)}"
+        )
+    except Exception as e:
+        logger.error(f"Background payroll audit {processamento_id} failed: {e}")
+        await run_in_threadpool(_marcar_erro_processamento, processamento_id, str(e))
+        raise
+
+
 @app.post("/v1/folha/auditar", response_model=ProcessamentoFolhaResponse, tags=["folha-pagamento"])
 async def auditar_folha_pagamento(
     empresa_id: int,
     mes: int,
     ano: int,
+    response: Response,
     arquivo_pdf: UploadFile = File(...),
+    assincrono: bool = Query(
+        False,
+        description="Responder 202 imediatamente e processar em segundo plano "
+        "(acompanhe em GET /v1/folha/auditorias/{id})",
+    ),
     db: Session = Depends(get_db)
 ):
     """
@@ -1020,7 +2258,16 @@ async def auditar_folha_pagamento(
     
     Processa PDFs da folha de pagamento usando IA para extrair dados,
     audita contra CCTs e gera relatório de conformidade e divergências.
+
+    Com `assincrono=true` o processamento é gravado como PROCESSANDO,
+    enfileirado no pool de workers e a resposta é 202 com o header Location
+    do status; fila cheia responde 503 com Retry-After. Um processamento do
+    período em ERRO não bloqueia o reenvio (o registro é reaproveitado).
+
+    O PDF é lido em blocos (hash SHA-256 incremental, limite
+    PORTAL_UPLOAD_MAX_MB → 413) e repassado como mmap, sem cópia em memória.
     """
+    upload = None
     try:
         # Validate request parameters
         if mes < 1 or mes > 12:
@@ -1032,6 +2279,16 @@ async def auditar_folha_pagamento(
         if not arquivo_pdf.filename.lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail="Apenas arquivos PDF são aceitos")
         
+        if assincrono:
+            try:
+                fila_auditoria_folha.verificar_vaga()
+            except FilaCheiaError:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Fila de auditorias cheia, tente novamente em instantes",
+                    headers={"Retry-After": "30"},
+                )
+        
         # Verify company exists
         empresa = db.query(EmpresaDB).filter(EmpresaDB.id == empresa_id).first()
         if not empresa:
@@ -1043,43 +2300,90 @@ async def auditar_folha_pagamento(
             .filter(ProcessamentosFolhaDB.empresa_id == empresa_id)
             .filter(ProcessamentosFolhaDB.mes == mes)
             .filter(ProcessamentosFolhaDB.ano == ano)
+            .order_by(ProcessamentosFolhaDB.id)
             .first()
         )
         
-        if processamento_existente:
+        # A failed processing (ERRO) does not block a retry: its row is reused
+        if processamento_existente and processamento_existente.status_processamento != "ERRO":
             raise HTTPException(
                 status_code=409, 
                 detail=f"Já existe processamento para {empresa.nome} em {mes:02d}/{ano}"
             )
         
-        # Read PDF content
-        pdf_content = await arquivo_pdf.read()
+        # Hash and size-check the PDF (content stays in the spooled temp file)
+        upload = await _receber_pdf(arquivo_pdf)
         
-        # Create processing record
-        processamento = ProcessamentosFolhaDB(
-            empresa_id=empresa_id,
-            mes=mes,
-            ano=ano,
-            arquivo_pdf=arquivo_pdf.filename,
-            status_processamento="PROCESSANDO",
-            criado_em=datetime.now(timezone.utc)
-        )
+        if processamento_existente:
+            processamento = processamento_existente
+            processamento.arquivo_pdf = arquivo_pdf.filename
+            processamento.dados_extraidos = None
+            processamento.relatorio_divergencias = None
+            processamento.total_funcionarios = 0
+            processamento.total_divergencias = 0
+            processamento.status_processamento = "PROCESSANDO"
+            processamento.mensagem_erro = None
+            processamento.criado_em = datetime.now(timezone.utc)
+            processamento.concluido_em = None
+        else:
+            # Create processing record
+            processamento = ProcessamentosFolhaDB(
+                empresa_id=empresa_id,
+                mes=mes,
+                ano=ano,
+                arquivo_pdf=arquivo_pdf.filename,
+                status_processamento="PROCESSANDO",
+                criado_em=datetime.now(timezone.utc)
+            )
+            db.add(processamento)
         
-        db.add(processamento)
         db.flush()  # Get the ID
         
+        if assincrono:
+            # The worker reads the row with its own session: commit first
+            db.commit()
+            processamento_id = processamento.id
+            upload_job = upload
+
+            def _descartar_job():
+                upload_job.fechar()
+                _marcar_erro_processamento(
+                    processamento_id, "Processamento interrompido antes de iniciar"
+                )
+
+            try:
+                fila_auditoria_folha.enfileirar(
+                    f"processamento {processamento_id}",
+                    lambda: _auditar_folha_em_segundo_plano(
+                        processamento_id, upload_job, empresa_id, mes, ano
+                    ),
+                    ao_descartar=_descartar_job,
+                )
+            except FilaCheiaError:
+                await run_in_threadpool(
+                    _marcar_erro_processamento, processamento_id, "Fila de auditorias cheia"
+                )
+                raise HTTPException(
+                    status_code=503,
+                    detail="Fila de auditorias cheia, tente novamente em instantes",
+                    headers={"Retry-After": "30"},
+                )
+            # The job owns the upload now
+            upload = None
+            
+            logger.info(f"Payroll audit {processamento_id} queued: empresa_id={empresa_id}")
+            db.refresh(processamento)
+            response.status_code = 202
+            response.headers["Location"] = f"/v1/folha/auditorias/{processamento_id}"
+            return _resposta_processamento_folha(processamento, [])
+        
         # TODO: Implement AI processing - now using the real service
         dados_extraidos, divergencias = await processar_pdf_com_ia(
-            pdf_content, empresa, mes, ano, db
+            upload.conteudo, empresa, mes, ano, db, sha256_conteudo=upload.sha256
         )
         
         # Update processing record with results
-        processamento.dados_extraidos = json.dumps(dados_extraidos, ensure_ascii=False)
-        processamento.relatorio_divergencias = json.dumps(divergencias, ensure_ascii=False)
-        processamento.total_funcionarios = len(dados_extraidos.get("funcionarios", []))
-        processamento.total_divergencias = len(divergencias)
-        processamento.status_processamento = "CONCLUIDO"
-        processamento.concluido_em = datetime.now(timezone.utc)
+        _registrar_resultado_auditoria(processamento, dados_extraidos, divergencias)
         
         db.commit()
         db.refresh(processamento)
@@ -1090,31 +2394,7 @@ async def auditar_folha_pagamento(
             f"divergencias={processamento.total_divergencias}"
         )
         
-        # Convert divergencias to Pydantic models
-        divergencias_models = [
-            FuncionarioDivergencia(
-                nome_funcionario=div["nome_funcionario"],
-                tipo_divergencia=div["tipo_divergencia"],
-                descricao_divergencia=div["descricao_divergencia"],
-                valor_encontrado=div.get("valor_encontrado"),
-                valor_esperado=div.get("valor_esperado"),
-                campo_afetado=div["campo_afetado"]
-            ) for div in divergencias
-        ]
-        
-        return ProcessamentoFolhaResponse(
-            id=processamento.id,
-            empresa_id=processamento.empresa_id,
-            mes=processamento.mes,
-            ano=processamento.ano,
-            arquivo_pdf=processamento.arquivo_pdf,
-            total_funcionarios=processamento.total_funcionarios,
-            total_divergencias=processamento.total_divergencias,
-            status_processamento=processamento.status_processamento,
-            criado_em=processamento.criado_em,
-            concluido_em=processamento.concluido_em,
-            divergencias=divergencias_models
-        )
+        return _resposta_processamento_folha(processamento, divergencias)
 
     except HTTPException:
         raise
@@ -1125,6 +2405,38 @@ async def auditar_folha_pagamento(
             status_code=500, 
             detail=f"Erro no processamento da auditoria: {str(e)}"
         )
+    finally:
+        if upload is not None:
+            upload.fechar()
+
+
+@app.get("/v1/folha/auditorias/{processamento_id}", response_model=ProcessamentoFolhaResponse, tags=["folha-pagamento"])
+def obter_status_auditoria_folha(processamento_id: int, db: Session = Depends(get_db)):
+    """
+    Status e resultado de uma auditoria de folha
+
+    status_processamento: PROCESSANDO (na fila ou em execução), CONCLUIDO
+    (com as divergências) ou ERRO (com mensagem_erro).
+    """
+    processamento = db.get(ProcessamentosFolhaDB, processamento_id)
+    if not processamento:
+        raise HTTPException(status_code=404, detail="Processamento não encontrado")
+
+    return _resposta_processamento_folha(processamento)
+
+
+@app.get("/v1/folha/fila", tags=["folha-pagamento"])
+def obter_metricas_fila_auditoria():
+    """
+    Métricas do pool de auditorias assíncronas
+
+    Profundidade atual e máxima da fila, auditorias em execução, concluídas,
+    com falha ou rejeitadas (fila cheia) e tempos médios de espera/execução.
+    """
+    return {
+        **fila_auditoria_folha.estatisticas(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }
 
 
 @app.get("/v1/folha/processamentos/{empresa_id}", response_model=List[ProcessamentoFolhaResponse], tags=["folha-pagamento"])
@@ -1148,36 +2460,7 @@ def listar_processamentos_folha(
             .all()
         )
         
-        result = []
-        for proc in processamentos:
-            # Parse divergencias from JSON
-            divergencias_json = json.loads(proc.relatorio_divergencias or "[]")
-            divergencias_models = [
-                FuncionarioDivergencia(
-                    nome_funcionario=div["nome_funcionario"],
-                    tipo_divergencia=div["tipo_divergencia"],
-                    descricao_divergencia=div["descricao_divergencia"],
-                    valor_encontrado=div.get("valor_encontrado"),
-                    valor_esperado=div.get("valor_esperado"),
-                    campo_afetado=div["campo_afetado"]
-                ) for div in divergencias_json
-            ]
-            
-            result.append(ProcessamentoFolhaResponse(
-                id=proc.id,
-                empresa_id=proc.empresa_id,
-                mes=proc.mes,
-                ano=proc.ano,
-                arquivo_pdf=proc.arquivo_pdf,
-                total_funcionarios=proc.total_funcionarios,
-                total_divergencias=proc.total_divergencias,
-                status_processamento=proc.status_processamento,
-                criado_em=proc.criado_em,
-                concluido_em=proc.concluido_em,
-                divergencias=divergencias_models
-            ))
-        
-        return result
+        return [_resposta_processamento_folha(proc) for proc in processamentos]
         
     except HTTPException:
         raise
@@ -1525,6 +2808,156 @@ async def monitorar_fontes_oficiais(db: Session = Depends(get_db)):
         )
 
 
+@app.post("/v1/jobs/reconciliar-estatisticas", tags=["jobs"])
+def reconciliar_estatisticas_tickets(
+    corrigir: bool = Query(False, description="Reescrever os contadores com os valores reais"),
+    db: Session = Depends(get_db),
+):
+    """
+    Reconciliação periódica dos contadores de /stats/
+
+    Recalcula os agregados diretamente da tabela de tickets e reporta
+    qualquer divergência (drift) nos contadores incrementais. Pode ser
+    agendado como cron job, assim como o monitoramento do Mediador.
+    """
+    try:
+        resultado = estatisticas_tickets_service.reconciliar(db, corrigir=corrigir)
+        logger.info(
+            f"Stats reconciliation: {resultado['total_divergencias']} divergences, "
+            f"corrigido={resultado['corrigido']}"
+        )
+        return {**resultado, "timestamp": datetime.now(timezone.utc).isoformat()}
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to reconcile ticket statistics: {e}")
+        raise HTTPException(
+            status_code=500, detail=f"Erro na reconciliação de estatísticas: {str(e)}"
+        )
+
+
+@app.post("/v1/jobs/reconciliar-controles", tags=["jobs"])
+def reconciliar_contadores_controles(
+    corrigir: bool = Query(False, description="Reescrever os contadores com os valores reais"),
+    db: Session = Depends(get_db),
+):
+    """
+    Reconciliação dos contadores de tarefas dos controles mensais
+
+    Recalcula tarefas_total / tarefas_concluidas a partir de TarefasControle
+    e reporta (ou corrige) os controles divergentes.
+    """
+    try:
+        resultado = controles_mensais_service.reconciliar(db, corrigir=corrigir)
+        if resultado["corrigido"]:
+            cache_quadro_controles.limpar()
+        logger.info(
+            f"Control counters reconciliation: {resultado['total_divergencias']} divergences, "
+            f"corrigido={resultado['corrigido']}"
+        )
+        return {**resultado, "timestamp": datetime.now(timezone.utc).isoformat()}
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to reconcile control counters: {e}")
+        raise HTTPException(
+            status_code=500, detail=f"Erro na reconciliação dos controles: {str(e)}"
+        )
+
+
+@app.post("/v1/jobs/backfill-tags", tags=["jobs"])
+def backfill_tags_tickets(
+    tamanho_lote: int = Query(1000, ge=1, le=10000, description="Tickets por lote/transação"),
+    db: Session = Depends(get_db),
+):
+    """
+    Migração/reconstrução do índice de tags
+
+    Reconstrói a tabela ticket_tags a partir do campo `tags` (texto separado
+    por vírgula) de todos os tickets. Idempotente e executada em lotes.
+    """
+    try:
+        resultado = tags_tickets_service.backfill(db, tamanho_lote=tamanho_lote)
+        return {**resultado, "timestamp": datetime.now(timezone.utc).isoformat()}
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to backfill ticket tags: {e}")
+        raise HTTPException(
+            status_code=500, detail=f"Erro no backfill de tags: {str(e)}"
+        )
+
+
+@app.post("/v1/jobs/backfill-rollups", tags=["jobs"])
+def backfill_rollups_tickets(
+    desde: Optional[date] = Query(None, description="Reconstruir apenas a partir deste dia"),
+    db: Session = Depends(get_db),
+):
+    """
+    Reconstrução dos rollups diários de tickets
+
+    Recalcula TicketsRollupDiario a partir da tabela de tickets (tudo ou a
+    partir de `desde`). Também disponível como comando:
+    python -m portal_demandas.rollups_service --desde AAAA-MM-DD
+    """
+    try:
+        resultado = rollups_tickets_service.backfill(db, desde=desde)
+        return {**resultado, "timestamp": datetime.now(timezone.utc).isoformat()}
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Failed to backfill ticket rollups: {e}")
+        raise HTTPException(
+            status_code=500, detail=f"Erro na reconstrução dos rollups: {str(e)}"
+        )
+
+
+@app.post("/v1/jobs/arquivar-tickets", tags=["jobs"])
+def arquivar_tickets(
+    meses: int = Query(12, ge=1, le=120, description="Arquivar tickets fechados há mais de N meses"),
+    tamanho_lote: int = Query(500, ge=1, le=5000, description="Tickets por lote/transação"),
+    max_lotes: Optional[int] = Query(
+        None, ge=1, description="Pausar após N lotes (a próxima execução continua de onde parou)"
+    ),
+    db: Session = Depends(get_db),
+):
+    """
+    Arquivamento de tickets concluídos/cancelados antigos
+
+    Move os tickets para `tickets_arquivados` em lotes; cada lote é uma
+    transação que também grava o progresso do job, então uma execução
+    interrompida (ou pausada por max_lotes) é retomada do último lote.
+    Tickets arquivados continuam acessíveis com include_archived=true.
+    """
+    try:
+        resultado = arquivamento_tickets_service.arquivar(
+            db, meses=meses, tamanho_lote=tamanho_lote, max_lotes=max_lotes
+        )
+        if resultado["lotes_nesta_execucao"]:
+            broadcaster_eventos.publicar(
+                "tickets.arquivados", {"ultimo_id": resultado["ultimo_id"]}
+            )
+        return resultado
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Ticket archival failed: {e}")
+        raise HTTPException(
+            status_code=500, detail=f"Erro no arquivamento de tickets: {str(e)}"
+        )
+
+
+@app.get("/v1/jobs/arquivar-tickets", tags=["jobs"])
+def obter_progresso_arquivamento(db: Session = Depends(get_db)):
+    """
+    Progresso da última execução do arquivamento de tickets
+    """
+    progresso = arquivamento_tickets_service.progresso(db)
+    if progresso is None:
+        raise HTTPException(status_code=404, detail="Arquivamento nunca executado")
+    return progresso
+
+
 @app.post("/v1/legislacao/extrair-pdf", response_model=ExtrairPDFResponse, tags=["legislacao"])
 async def extrair_pdf_legislacao(
     arquivo_pdf: UploadFile = File(...),
@@ -1540,6 +2973,7 @@ async def extrair_pdf_legislacao(
     
     Este é o coração da transformação de arquivos estáticos em base de conhecimento ativa.
     """
+    upload = None
     try:
         import time
         start_time = time.time()
@@ -1548,9 +2982,9 @@ async def extrair_pdf_legislacao(
         if not arquivo_pdf.filename.lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail="Apenas arquivos PDF são aceitos")
         
-        # Read PDF content
-        pdf_content = await arquivo_pdf.read()
-        if len(pdf_content) == 0:
+        # Hash and size-check the PDF (content stays in the spooled temp file)
+        upload = await _receber_pdf(arquivo_pdf)
+        if upload.tamanho == 0:
             raise HTTPException(status_code=400, detail="Arquivo PDF está vazio")
         
         # Create document record
@@ -1566,7 +3000,7 @@ async def extrair_pdf_legislacao(
         
         # 🤖 AI Processing - Extract structured data from PDF using real service
         dados_extraidos, confidence_score, sugestoes = await processar_pdf_legislacao_com_ia(
-            pdf_content, arquivo_pdf.filename, db
+            upload.conteudo, arquivo_pdf.filename, db, sha256_conteudo=upload.sha256
         )
         
         # Update document with results
@@ -1618,9 +3052,14 @@ async def extrair_pdf_legislacao(
             status_code=500,
             detail=f"Erro no processamento do PDF: {str(e)}"
         )
+    finally:
+        if upload is not None:
+            upload.fechar()
 
 
-async def processar_pdf_legislacao_com_ia(pdf_content: bytes, filename: str, db: Session):
+async def processar_pdf_legislacao_com_ia(
+    pdf_content: bytes, filename: str, db: Session, sha256_conteudo: Optional[str] = None
+):
     """
     🧠 AI-Powered PDF Processing for Legislation
     
@@ -1637,7 +3076,9 @@ async def processar_pdf_legislacao_com_ia(pdf_content: bytes, filename: str, db:
         # Use the real document AI service
         instruction = "Esta é uma Convenção Coletiva de Trabalho ou documento de legislação. Extraia o piso salarial, a lista de benefícios com valores, o período de vigência, e outras informações estruturadas relevantes."
         
-        dados_extraidos = await document_ai_client.process(pdf_content, instruction)
+        dados_extraidos = await cache_extracao.extrair(
+            document_ai_client, pdf_content, instruction, sha256_conteudo=sha256_conteudo
+        )
         
         # Calculate confidence score based on completeness
         confidence_score = calculate_confidence_score(dados_extraidos)
@@ -1727,7 +3168,14 @@ async def fallback_pdf_processing(pdf_content: bytes, filename: str) -> dict:
     }
 
 
-async def processar_pdf_com_ia(pdf_content: bytes, empresa: EmpresaDB, mes: int, ano: int, db: Session):
+async def processar_pdf_com_ia(
+    pdf_content: bytes,
+    empresa: EmpresaDB,
+    mes: int,
+    ano: int,
+    db: Session,
+    sha256_conteudo: Optional[str] = None,
+):
     """
     🧠 AI-powered PDF processing and auditing logic
     
@@ -1743,7 +3191,9 @@ async def processar_pdf_com_ia(pdf_content: bytes, empresa: EmpresaDB, mes: int,
     try:
         # 1. Extract data from PDF using real AI service
         instruction = "Esta é uma folha de pagamento. Extraia os dados dos funcionários incluindo nomes, cargos, salários base, horas extras, descontos e valores líquidos."
-        dados_folha_raw = await document_ai_client.process(pdf_content, instruction)
+        dados_folha_raw = await cache_extracao.extrair(
+            document_ai_client, pdf_content, instruction, sha256_conteudo=sha256_conteudo
+        )
         
         # 2. Structure the extracted data for audit processing
         dados_extraidos = {
@@ -1756,8 +3206,8 @@ async def processar_pdf_com_ia(pdf_content: bytes, empresa: EmpresaDB, mes: int,
         
         logger.info(f"📊 Extracted data for {len(dados_extraidos['funcionarios'])} employees")
         
-        # 3. Load applicable CCT rules for the company
-        regras_cct = await carregar_regras_cct_empresa(empresa, db, mes, ano)
+        # 3. Load applicable CCT rules for the company (blocking query: threadpool)
+        regras_cct = await run_in_threadpool(carregar_regras_cct_empresa, empresa, db, mes, ano)
         
         # 4. Execute audit logic
         divergencias = await executar_auditoria_folha(dados_extraidos, regras_cct, empresa)
@@ -1772,7 +3222,7 @@ async def processar_pdf_com_ia(pdf_content: bytes, empresa: EmpresaDB, mes: int,
         return await processar_pdf_com_ia_fallback(pdf_content, empresa, mes, ano)
 
 
-async def carregar_regras_cct_empresa(empresa: EmpresaDB, db: Session, mes: int, ano: int) -> dict:
+def carregar_regras_cct_empresa(empresa: EmpresaDB, db: Session, mes: int, ano: int) -> dict:
     """Load CCT rules applicable to the company for the given period"""
     try:
         # Query CCT rules for this company's syndicate
@@ -1803,80 +3253,18 @@ async def carregar_regras_cct_empresa(empresa: EmpresaDB, db: Session, mes: int,
 
 
 async def executar_auditoria_folha(dados_extraidos: dict, regras_cct: dict, empresa: EmpresaDB) -> List[dict]:
-    """Execute the payroll audit logic comparing extracted data against CCT rules"""
-    divergencias = []
+    """
+    Execute the payroll audit logic comparing extracted data against CCT rules
+
+    The rules live in motor_auditoria_service: large payrolls are evaluated
+    column-wise with NumPy (same results as the per-employee engine).
+    """
     funcionarios = dados_extraidos.get("funcionarios", [])
     
     logger.info(f"🔍 Starting audit of {len(funcionarios)} employees against CCT rules")
     
-    for funcionario in funcionarios:
-        nome = funcionario.get("nome", "Nome não informado")
-        cargo = funcionario.get("cargo", "Cargo não informado")
-        salario_base = funcionario.get("salario_base", 0)
-        
-        # Audit 1: Minimum wage compliance
-        piso_cct = regras_cct.get("piso_salarial", 1412.00)
-        if salario_base < piso_cct:
-            divergencias.append({
-                "nome_funcionario": nome,
-                "tipo_divergencia": "ALERTA",
-                "descricao_divergencia": f"Salário base (R$ {salario_base:,.2f}) está abaixo do piso da CCT (R$ {piso_cct:,.2f})",
-                "valor_encontrado": f"R$ {salario_base:,.2f}",
-                "valor_esperado": f"R$ {piso_cct:,.2f}",
-                "campo_afetado": "salario_base"
-            })
-        
-        # Audit 2: Overtime calculation validation
-        horas_extras_50 = funcionario.get("horas_extras_50", 0)
-        if horas_extras_50 > 0:
-            # Calculate expected overtime value
-            valor_hora = salario_base / 220  # Monthly hours
-            percentual_cct = regras_cct.get("percentual_he_50", 50.0)
-            
-            # If CCT specifies a different percentage (e.g., 60% instead of 50%)
-            if percentual_cct != 50.0:
-                divergencias.append({
-                    "nome_funcionario": nome,
-                    "tipo_divergencia": "AVISO",
-                    "descricao_divergencia": f"Percentual de horas extras (50%) pode diferir do estabelecido na CCT ({percentual_cct}%)",
-                    "valor_encontrado": f"{horas_extras_50:.2f} (50%)",
-                    "valor_esperado": f"Verificar cálculo com {percentual_cct}%",
-                    "campo_afetado": "horas_extras_50"
-                })
-        
-        # Audit 3: Mandatory benefits check
-        beneficios_obrigatorios = regras_cct.get("beneficios", [])
-        for beneficio in beneficios_obrigatorios:
-            if isinstance(beneficio, dict):
-                nome_beneficio = beneficio.get("nome", "")
-                valor_esperado = beneficio.get("valor", 0)
-                
-                # Check if benefit is present in payroll
-                if nome_beneficio and valor_esperado > 0:
-                    # For simplicity, assume benefit is missing if not explicitly found
-                    # In real implementation, this would check specific payroll fields
-                    if cargo not in ["Gerente"]:  # Mock: managers have all benefits
-                        divergencias.append({
-                            "nome_funcionario": nome,
-                            "tipo_divergencia": "INFO",
-                            "descricao_divergencia": f"Benefício '{nome_beneficio}' previsto na CCT não foi encontrado na folha",
-                            "valor_encontrado": None,
-                            "valor_esperado": f"R$ {valor_esperado:,.2f}",
-                            "campo_afetado": nome_beneficio.lower().replace(" ", "_")
-                        })
-        
-        # Audit 4: Transportation voucher limit check
-        vale_transporte = funcionario.get("vale_transporte", 0)
-        limite_vt = salario_base * (regras_cct.get("vale_transporte_max", 6.0) / 100)
-        if vale_transporte > limite_vt:
-            divergencias.append({
-                "nome_funcionario": nome,
-                "tipo_divergencia": "AVISO",
-                "descricao_divergencia": f"Desconto de vale transporte (R$ {vale_transporte:.2f}) excede limite legal de 6%",
-                "valor_encontrado": f"R$ {vale_transporte:.2f}",
-                "valor_esperado": f"Máximo R$ {limite_vt:.2f}",
-                "campo_afetado": "vale_transporte"
-            })
+    # CPU-bound: keep it off the event loop
+    divergencias = await run_in_threadpool(auditar_funcionarios, funcionarios, regras_cct)
     
     logger.info(f"✅ Audit completed: {len(divergencias)} total divergences found")
     return divergencias
@@ -2322,14 +3710,15 @@ async def iniciar_extracao_documento(
     
     This is the entry point for the "surreal moment" described in the manifesto.
     """
+    upload = None
     try:
         # Validate file
         if not arquivo_pdf.filename.lower().endswith('.pdf'):
             raise HTTPException(status_code=400, detail="Apenas arquivos PDF são aceitos")
         
-        # Read PDF content
-        pdf_content = await arquivo_pdf.read()
-        if len(pdf_content) == 0:
+        # Hash and size-check the PDF (content stays in the spooled temp file)
+        upload = await _receber_pdf(arquivo_pdf)
+        if upload.tamanho == 0:
             raise HTTPException(status_code=400, detail="Arquivo PDF está vazio")
         
         # Create document record with PENDING status
@@ -2353,7 +3742,9 @@ async def iniciar_extracao_documento(
         # For demo, process immediately
         try:
             instruction = f"Esta é uma {tipo_documento.upper()}. Extraia informações estruturadas como piso salarial, benefícios, vigência e outras regras relevantes."
-            dados_extraidos = await document_ai_client.process(pdf_content, instruction)
+            dados_extraidos = await cache_extracao.extrair(
+                document_ai_client, upload.conteudo, instruction, sha256_conteudo=upload.sha256
+            )
             
             # Update document status to AGUARDANDO_VALIDACAO
             db_documento.dados_extraidos = dados_extraidos
@@ -2389,6 +3780,9 @@ async def iniciar_extracao_documento(
             status_code=500,
             detail=f"Erro na extração do documento: {str(e)}"
         )
+    finally:
+        if upload is not None:
+            upload.fechar()
 
 
 @app.post("/v1/conhecimento/processar-cct", tags=["grand-tomo"])
@@ -2701,7 +4095,7 @@ def aplicar_template_controle(
         from datetime import datetime
         
         # Verify template exists
-        template = db.query(TemplateControleDB).filter(TemplateControleDB.id == template_id).first()
+        template = registro_templates.localizar(db, template_id)
         if not template:
             raise HTTPException(status_code=404, detail="Template não encontrado")
         
@@ -2709,71 +4103,41 @@ def aplicar_template_controle(
         ano, mes = periodo.split('-')
         ano, mes = int(ano), int(mes)
         
-        # Get companies matching filter
-        query = db.query(EmpresaDB).filter(EmpresaDB.contabilidade_id == template.contabilidade_id)
-        
         if filtro_tributacao != "TODOS":
             # In a real implementation, filter by tax regime
             pass
         
-        empresas = query.all()
-        
-        controles_criados = []
-        
-        # Create monthly controls for each company
-        for empresa in empresas:
-            # Check if control already exists
-            controle_existente = (
-                db.query(ControleMensalDB)
-                .filter(ControleMensalDB.empresa_id == empresa.id)
-                .filter(ControleMensalDB.mes == mes)
-                .filter(ControleMensalDB.ano == ano)
-                .first()
-            )
-            
-            if not controle_existente:
-                controle = ControleMensalDB(
-                    empresa_id=empresa.id,
-                    mes=mes,
-                    ano=ano,
-                    status='PENDENTE'
-                )
-                db.add(controle)
-                db.flush()
-                controles_criados.append(controle)
-                
-                # Create control tasks from template
-                tarefas_template = (
-                    db.query(TemplateControleTarefaDB)
-                    .filter(TemplateControleTarefaDB.template_id == template_id)
-                    .all()
-                )
-                
-                for tarefa_template in tarefas_template:
-                    tarefa = TarefaControleDB(
-                        controle_mensal_id=controle.id,
-                        descricao_tarefa=tarefa_template.descricao_tarefa,
-                        concluida=False
-                    )
-                    db.add(tarefa)
+        # Create monthly controls and their tasks for every company (set-based)
+        resultado = controles_mensais_service.aplicar_template(
+            db,
+            template_id=template_id,
+            contabilidade_id=template.contabilidade_id,
+            ano=ano,
+            mes=mes,
+            status="PENDENTE",
+            total_tarefas=len(template.tarefas),
+        )
         
         db.commit()
+        cache_quadro_controles.invalidar(chave_quadro(template.contabilidade_id, ano, mes))
         
         # In a real implementation, this would trigger background tasks
         # for audit robots using something like Celery or similar
         
-        logger.info(f"Applied template {template_id}: created {len(controles_criados)} controls for period {periodo}")
+        logger.info(f"Applied template {template_id}: created {resultado['controles_criados']} controls for period {periodo}")
         
         return {
             "status": "Processos de auditoria iniciados. O painel será atualizado em tempo real.",
             "template_aplicado": template.nome_template,
             "periodo": periodo,
-            "empresas_processadas": len(empresas),
-            "controles_criados": len(controles_criados),
+            "empresas_processadas": resultado["empresas_processadas"],
+            "controles_criados": resultado["controles_criados"],
             "audit_robots_triggered": True,
             "dashboard_update": "real-time"
         }
         
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Invalid period format: {str(e)}")
     except Exception as e:
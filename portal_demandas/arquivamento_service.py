@@ -0,0 +1,229 @@
+"""
+ArquivamentoService - Hot/cold archival of closed tickets
+Moves tickets closed more than N months ago from `tickets` to
+`tickets_arquivados` so live listings, counts and indexes only carry the
+tickets people still work with
+
+Each batch copies the rows (INSERT ... SELECT), deletes them from `tickets`,
+updates the /stats/ counters and the job position in one transaction, so the
+job can be stopped at any point (max_lotes, failure, deploy) and resumed.
+
+A ticket reopened or edited after the batch was picked must stay live: the
+batch rows are locked (FOR UPDATE SKIP LOCKED on Postgres) and re-checked,
+and the copy and the delete repeat the "closed before the cutoff" criteria.
+
+The daily rollups are historical and keep counting archived tickets; comments
+and tag rows stay keyed by the (preserved) ticket id.
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import delete, insert, literal, select
+from sqlalchemy.orm import Session
+
+try:
+    from db import COLUNAS_TICKET, JobProgressoDB, TicketArquivadoDB, TicketDB
+except ImportError:
+    from .db import COLUNAS_TICKET, JobProgressoDB, TicketArquivadoDB, TicketDB
+
+try:
+    from estatisticas_service import carregar_snapshots, estatisticas_tickets_service
+except ImportError:
+    from .estatisticas_service import carregar_snapshots, estatisticas_tickets_service
+
+try:
+    from rollups_service import STATUS_FINAIS
+except ImportError:
+    from .rollups_service import STATUS_FINAIS
+
+try:
+    from versoes_service import versoes_tabelas_service
+except ImportError:
+    from .versoes_service import versoes_tabelas_service
+
+logger = logging.getLogger(__name__)
+
+JOB_ARQUIVAMENTO = "arquivar_tickets"
+
+
+def subtrair_meses(referencia: datetime, meses: int) -> datetime:
+    """Same day N months earlier (clamped to the month's last day)"""
+    ano, mes = divmod(referencia.year * 12 + referencia.month - 1 - meses, 12)
+    mes += 1
+    dia = referencia.day
+    while True:
+        try:
+            return referencia.replace(year=ano, month=mes, day=dia)
+        except ValueError:
+            dia -= 1
+
+
+class ArquivamentoTicketsService:
+    """
+    🗄️ Batched, resumable ticket archival
+
+    Closing time is approximated by atualizado_em of tickets in a final
+    status (concluido/cancelado), as in the daily rollups.
+    """
+
+    def arquivar(
+        self,
+        db: Session,
+        meses: int = 12,
+        tamanho_lote: int = 500,
+        max_lotes: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Archive closed tickets older than `meses` months
+
+        A paused run (max_lotes reached) or a failed one resumes from its last
+        committed batch, with the cutoff date it started with.
+        """
+        progresso = self._iniciar_ou_retomar(db, meses)
+        corte = datetime.fromisoformat(progresso.parametros["corte"])
+        lotes_execucao = 0
+
+        try:
+            while True:
+                ids = [
+                    ticket_id
+                    for (ticket_id,) in db.query(TicketDB.id)
+                    .filter(
+                        TicketDB.status.in_(STATUS_FINAIS),
+                        TicketDB.atualizado_em < corte,
+                        TicketDB.id > progresso.ultimo_id,
+                    )
+                    .order_by(TicketDB.id)
+                    .limit(tamanho_lote)
+                ]
+                if not ids:
+                    progresso.status = "concluido"
+                    progresso.concluido_em = datetime.utcnow()
+                    db.commit()
+                    break
+
+                movidos = self._mover_lote(db, ids, corte)
+
+                progresso.ultimo_id = ids[-1]
+                progresso.processados += movidos
+                progresso.lotes += 1
+                db.commit()
+                lotes_execucao += 1
+
+                logger.info(
+                    f"Ticket archival: batch of {movidos}/{len(ids)} (IDs {ids[0]}..{ids[-1]}), "
+                    f"{progresso.processados} archived so far"
+                )
+
+                if max_lotes and lotes_execucao >= max_lotes:
+                    progresso.status = "pausado"
+                    db.commit()
+                    break
+
+        except Exception as e:
+            db.rollback()
+            progresso = db.get(JobProgressoDB, JOB_ARQUIVAMENTO)
+            progresso.status = "erro"
+            progresso.erro = str(e)
+            db.commit()
+            raise
+
+        return {**progresso.to_dict(), "lotes_nesta_execucao": lotes_execucao}
+
+    def _iniciar_ou_retomar(self, db: Session, meses: int) -> JobProgressoDB:
+        progresso = db.get(JobProgressoDB, JOB_ARQUIVAMENTO)
+        retomar = (
+            progresso is not None
+            and progresso.status in ("executando", "pausado", "erro")
+            and (progresso.parametros or {}).get("meses") == meses
+        )
+
+        if retomar:
+            logger.info(f"Resuming ticket archival after ID {progresso.ultimo_id}")
+            progresso.status = "executando"
+            progresso.erro = None
+        else:
+            corte = subtrair_meses(datetime.utcnow(), meses)
+            if progresso is None:
+                progresso = JobProgressoDB(job=JOB_ARQUIVAMENTO)
+                db.add(progresso)
+            progresso.status = "executando"
+            progresso.ultimo_id = 0
+            progresso.processados = 0
+            progresso.lotes = 0
+            progresso.erro = None
+            progresso.concluido_em = None
+            progresso.iniciado_em = datetime.utcnow()
+            progresso.parametros = {"meses": meses, "corte": corte.isoformat()}
+
+        db.commit()
+        return progresso
+
+    def _mover_lote(self, db: Session, ids, corte: datetime) -> int:
+        """
+        Copy one batch to the archive and remove it from tickets (caller commits)
+
+        Only rows still closed before the cutoff are moved; rows locked by a
+        concurrent writer are skipped (the writer is probably reopening them).
+
+        Returns:
+            Number of tickets archived
+        """
+        ainda_arquivaveis = (
+            TicketDB.status.in_(STATUS_FINAIS),
+            TicketDB.atualizado_em < corte,
+        )
+        ids = [
+            ticket_id
+            for (ticket_id,) in db.query(TicketDB.id)
+            .filter(TicketDB.id.in_(ids), *ainda_arquivaveis)
+            .with_for_update(skip_locked=True)
+        ]
+        if not ids:
+            return 0
+
+        # Counters follow exactly the rows moved below
+        antes = carregar_snapshots(db, TicketDB.id.in_(ids), *ainda_arquivaveis)
+        ids = [snapshot["id"] for snapshot in antes]
+        selecao = (TicketDB.id.in_(ids), *ainda_arquivaveis)
+
+        colunas_origem = [TicketDB.__table__.c[coluna] for coluna in COLUNAS_TICKET]
+        copiados = db.execute(
+            insert(TicketArquivadoDB).from_select(
+                [*COLUNAS_TICKET, "arquivado_em"],
+                select(*colunas_origem, literal(datetime.utcnow())).where(*selecao),
+            )
+        ).rowcount
+        removidos = db.execute(
+            delete(TicketDB)
+            .where(*selecao)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+
+        if not (copiados == removidos == len(antes)):
+            # Only possible without row locks (SQLite): undo the batch, the job resumes
+            raise RuntimeError(
+                f"Lote alterado durante o arquivamento ({len(antes)} lidos, "
+                f"{copiados} copiados, {removidos} removidos)"
+            )
+
+        # /stats/ describes the live table; rollups keep archived history
+        estatisticas_tickets_service.registrar_alteracoes(db, antes, [])
+        versoes_tabelas_service.incrementar(db, TicketDB.__tablename__)
+        return len(antes)
+
+    def progresso(self, db: Session) -> Optional[Dict[str, Any]]:
+        progresso = db.get(JobProgressoDB, JOB_ARQUIVAMENTO)
+        return progresso.to_dict() if progresso else None
+
+
+# Global service instance
+arquivamento_tickets_service = ArquivamentoTicketsService()
+
+__all__ = [
+    "ArquivamentoTicketsService",
+    "arquivamento_tickets_service",
+    "JOB_ARQUIVAMENTO",
+]
@@ -0,0 +1,188 @@
+"""
+BuscaService - Full-text search index for tickets
+Keeps a relevance-ranked, accent-insensitive index over titulo/descricao
+
+- SQLite: external-content FTS5 table (unicode61 remove_diacritics) kept in
+  sync by triggers on insert, update and delete
+- PostgreSQL: tsvector column (portuguese + unaccent) maintained by a
+  trigger and indexed with GIN
+
+Because synchronization happens in the database, every write path (ORM,
+bulk UPDATE, executemany imports) keeps the index current. When the index is
+unavailable, callers fall back to the original ILIKE search.
+"""
+
+import logging
+import os
+import re
+from typing import Any, Optional, Tuple
+
+from sqlalchemy import asc, bindparam, desc, func, inspect, literal_column, select, table, text
+
+try:
+    from db import TicketDB
+except ImportError:
+    from .db import TicketDB
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+_SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+        titulo, descricao,
+        content='tickets', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tickets_fts_ai AFTER INSERT ON tickets BEGIN
+        INSERT INTO tickets_fts(rowid, titulo, descricao)
+        VALUES (new.id, new.titulo, new.descricao);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tickets_fts_ad AFTER DELETE ON tickets BEGIN
+        INSERT INTO tickets_fts(tickets_fts, rowid, titulo, descricao)
+        VALUES ('delete', old.id, old.titulo, old.descricao);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tickets_fts_au AFTER UPDATE OF titulo, descricao ON tickets BEGIN
+        INSERT INTO tickets_fts(tickets_fts, rowid, titulo, descricao)
+        VALUES ('delete', old.id, old.titulo, old.descricao);
+        INSERT INTO tickets_fts(rowid, titulo, descricao)
+        VALUES (new.id, new.titulo, new.descricao);
+    END
+    """,
+]
+
+_POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "ALTER TABLE tickets ADD COLUMN IF NOT EXISTS busca_tsv tsvector",
+    """
+    CREATE OR REPLACE FUNCTION tickets_busca_tsv_atualizar() RETURNS trigger AS $$
+    BEGIN
+        NEW.busca_tsv :=
+            setweight(to_tsvector('portuguese', unaccent(coalesce(NEW.titulo, ''))), 'A') ||
+            setweight(to_tsvector('portuguese', unaccent(coalesce(NEW.descricao, ''))), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS tickets_busca_tsv_trg ON tickets",
+    """
+    CREATE TRIGGER tickets_busca_tsv_trg
+    BEFORE INSERT OR UPDATE OF titulo, descricao ON tickets
+    FOR EACH ROW EXECUTE FUNCTION tickets_busca_tsv_atualizar()
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_tickets_busca_tsv ON tickets USING GIN (busca_tsv)",
+    # Backfill rows written before the trigger existed
+    "UPDATE tickets SET titulo = titulo WHERE busca_tsv IS NULL",
+]
+
+
+class BuscaTicketsService:
+    """
+    🔎 Full-text search over tickets
+
+    Builds the index on startup and translates the free-text `search`
+    parameter into an index-backed filter plus a relevance ordering.
+    """
+
+    def __init__(self):
+        self.habilitado = os.getenv("PORTAL_BUSCA_FULLTEXT", "1") != "0"
+        self._disponivel = {}  # dialect name -> bool
+
+    def inicializar_indice(self, engine) -> bool:
+        """Create (idempotently) the search index for the engine's dialect"""
+        dialeto = engine.dialect.name
+        if not self.habilitado:
+            self._disponivel[dialeto] = False
+            return False
+
+        try:
+            if dialeto == "sqlite":
+                with engine.begin() as conn:
+                    existia = conn.execute(
+                        text("SELECT 1 FROM sqlite_master WHERE name = 'tickets_fts'")
+                    ).first()
+                    for ddl in _SQLITE_DDL:
+                        conn.execute(text(ddl))
+                    if not existia:
+                        conn.execute(text("INSERT INTO tickets_fts(tickets_fts) VALUES ('rebuild')"))
+            elif dialeto == "postgresql":
+                with engine.begin() as conn:
+                    for ddl in _POSTGRES_DDL:
+                        conn.execute(text(ddl))
+            else:
+                logger.info(f"Full-text search not supported on {dialeto} - using ILIKE")
+                self._disponivel[dialeto] = False
+                return False
+
+            self._disponivel[dialeto] = True
+            logger.info(f"Ticket full-text index ready ({dialeto})")
+            return True
+
+        except Exception as e:
+            logger.warning(f"Could not initialize ticket full-text index, falling back to ILIKE: {e}")
+            self._disponivel[dialeto] = False
+            return False
+
+    def disponivel(self, db) -> bool:
+        """Whether the index exists for the session's database"""
+        dialeto = db.bind.dialect.name
+        if dialeto not in self._disponivel:
+            if not self.habilitado:
+                self._disponivel[dialeto] = False
+            elif dialeto == "sqlite":
+                self._disponivel[dialeto] = inspect(db.bind).has_table("tickets_fts")
+            elif dialeto == "postgresql":
+                colunas = inspect(db.bind).get_columns("tickets")
+                self._disponivel[dialeto] = any(c["name"] == "busca_tsv" for c in colunas)
+            else:
+                self._disponivel[dialeto] = False
+        return self._disponivel[dialeto]
+
+    def criterio_busca(self, db, termo: str) -> Optional[Tuple[Any, Any]]:
+        """
+        Translate a search term into (filter criterion, relevance ORDER BY)
+
+        Every word must match (prefix match on the last characters typed is
+        allowed). Returns None when the index is unavailable or the term has
+        no searchable words, so the caller can use the ILIKE fallback.
+        """
+        tokens = _TOKEN_RE.findall(termo or "")
+        if not tokens or not self.disponivel(db):
+            return None
+
+        dialeto = db.bind.dialect.name
+
+        if dialeto == "sqlite":
+            consulta = " ".join(f'"{token}"*' for token in tokens)
+            fts = table("tickets_fts")
+            match = literal_column("tickets_fts").op("MATCH")(
+                bindparam("fts_consulta", consulta)
+            )
+            ids = select(literal_column("rowid")).select_from(fts).where(match)
+            rank = (
+                select(literal_column("rank"))
+                .select_from(fts)
+                .where(match)
+                .where(literal_column("tickets_fts.rowid") == TicketDB.id)
+                .scalar_subquery()
+            )
+            # FTS5 rank is bm25: lower means more relevant
+            return TicketDB.id.in_(ids), asc(rank)
+
+        consulta = " & ".join(f"{token}:*" for token in tokens)
+        tsquery = func.to_tsquery("portuguese", func.unaccent(consulta))
+        tsv = literal_column("tickets.busca_tsv")
+        return tsv.op("@@")(tsquery), desc(func.ts_rank(tsv, tsquery))
+
+
+# Global service instance
+busca_tickets_service = BuscaTicketsService()
+
+__all__ = ["BuscaTicketsService", "busca_tickets_service"]
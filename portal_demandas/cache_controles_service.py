@@ -0,0 +1,154 @@
+"""
+CacheControlesService - In-memory cache of the monthly control board
+Serves repeated GET /v1/controles/{ano}/{mes} reads without touching the
+database
+
+Entries are keyed by (contabilidade_id, ano, mes), bounded by an LRU limit
+and a TTL. Write paths that change a board (task status, template
+application, control status) invalidate exactly its key after commit.
+
+A reader that missed takes a generation token (a global sequence number)
+before querying the database; invalidations record the sequence number at
+which each key was invalidated, and gravar() drops a board loaded before its
+key's last invalidation. The invalidation records are bounded: the oldest are
+pruned and become a floor below which every token is refused (a pruned key
+costs at most one skipped store, never a stale board). limpar() is a global
+invalidation: it raises the floor to a new sequence number, so loads that
+started before it are dropped whatever their key. The cache is per
+process; with several replicas the TTL bounds how long another replica's
+write stays invisible.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def chave_quadro(contabilidade_id: int, ano: int, mes: int) -> Tuple[int, int, int]:
+    return (int(contabilidade_id), int(ano), int(mes))
+
+
+class CacheQuadroControles:
+    """
+    🗃️ LRU + TTL cache with per-key invalidation
+
+    Thread-safe: sync endpoints run in the threadpool.
+    """
+
+    def __init__(
+        self,
+        tamanho_max: Optional[int] = None,
+        ttl_segundos: Optional[float] = None,
+    ):
+        self.tamanho_max = (
+            tamanho_max
+            if tamanho_max is not None
+            else int(os.getenv("PORTAL_CACHE_CONTROLES_MAX", "256"))
+        )
+        self.ttl_segundos = (
+            ttl_segundos
+            if ttl_segundos is not None
+            else float(os.getenv("PORTAL_CACHE_CONTROLES_TTL", "60"))
+        )
+
+        self._entradas: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        # key -> sequence number of its last invalidation (oldest first)
+        self._invalidacoes: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._sequencia = 0
+        self._piso = 0
+        self.max_invalidacoes = max(1024, 4 * self.tamanho_max)
+        self._lock = threading.Lock()
+        self.metricas = {"hits": 0, "misses": 0, "invalidacoes": 0, "expirados": 0, "removidos_lru": 0}
+
+    @property
+    def ativo(self) -> bool:
+        return self.tamanho_max > 0 and self.ttl_segundos > 0
+
+    def geracao(self, chave: Hashable) -> int:
+        """Token to hand back to gravar() after loading a missed key"""
+        with self._lock:
+            return self._sequencia
+
+    def obter(self, chave: Hashable) -> Optional[Any]:
+        """Cached value, or None on a miss / expired entry"""
+        if not self.ativo:
+            return None
+
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                self.metricas["misses"] += 1
+                return None
+
+            expira_em, valor = entrada
+            if expira_em <= time.monotonic():
+                del self._entradas[chave]
+                self.metricas["expirados"] += 1
+                self.metricas["misses"] += 1
+                return None
+
+            self._entradas.move_to_end(chave)
+            self.metricas["hits"] += 1
+            return valor
+
+    def gravar(self, chave: Hashable, valor: Any, geracao: int):
+        """Store a value loaded at `geracao`; dropped if the key was invalidated since"""
+        if not self.ativo:
+            return
+
+        with self._lock:
+            if geracao < self._piso or self._invalidacoes.get(chave, 0) > geracao:
+                return
+
+            self._entradas[chave] = (time.monotonic() + self.ttl_segundos, valor)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.tamanho_max:
+                self._entradas.popitem(last=False)
+                self.metricas["removidos_lru"] += 1
+
+    def invalidar(self, chave: Hashable):
+        """Drop a key (call after the write that changed it committed)"""
+        with self._lock:
+            self._entradas.pop(chave, None)
+            self._marcar_invalidada(chave)
+            self.metricas["invalidacoes"] += 1
+
+    def limpar(self):
+        """Drop every key, including boards still being loaded (e.g. after a reconciliation)"""
+        with self._lock:
+            # Global generation: tokens taken before the clear are all refused
+            self._sequencia += 1
+            self._piso = self._sequencia
+            self._entradas.clear()
+            self._invalidacoes.clear()
+            self.metricas["invalidacoes"] += 1
+
+    def _marcar_invalidada(self, chave: Hashable):
+        # Call with the lock held
+        self._sequencia += 1
+        self._invalidacoes[chave] = self._sequencia
+        self._invalidacoes.move_to_end(chave)
+        while len(self._invalidacoes) > self.max_invalidacoes:
+            _, sequencia = self._invalidacoes.popitem(last=False)
+            self._piso = max(self._piso, sequencia)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.metricas,
+                "entradas": len(self._entradas),
+                "invalidacoes_registradas": len(self._invalidacoes),
+                "tamanho_max": self.tamanho_max,
+                "ttl_segundos": self.ttl_segundos,
+            }
+
+
+# Global service instance
+cache_quadro_controles = CacheQuadroControles()
+
+__all__ = ["CacheQuadroControles", "cache_quadro_controles", "chave_quadro"]
@@ -0,0 +1,251 @@
+"""
+CacheExtracaoService - Content-addressed cache of AI document extractions
+Re-uploading the same PDF (a resend after a 409 or a timeout, the same CCT
+sent by two users) returns the stored extraction instead of paying
+DocumentAIClient.process again
+
+The key is SHA-256 over the model version, the instruction and the SHA-256
+of the file bytes: the same file extracted with another instruction or after
+a model upgrade is a different entry. Entries are JSON files on disk
+(<dir>/<2 hex>/<key>.json, written atomically), so they survive restarts and
+can be shared by workers on the same host. A hit refreshes the file's mtime;
+when the directory grows past its size limit the least recently used
+entries are deleted. Each process keeps its own index, so with several
+processes the limit is approximate.
+
+Configuration:
+    PORTAL_CACHE_EXTRACAO_DIR     directory (default: <tmp>/auditoria360_extracoes)
+    PORTAL_CACHE_EXTRACAO_MAX_MB  size limit in MB (default 256); 0 disables the cache
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def hash_conteudo(conteudo: bytes) -> str:
+    """SHA-256 (hex) of a file's bytes"""
+    return hashlib.sha256(conteudo).hexdigest()
+
+
+class CacheExtracao:
+    """
+    🗄️ Disk-backed extraction cache with LRU/size eviction and hit/miss metrics
+
+    Thread-safe: the index is guarded by a lock; file writes are atomic
+    (temp file + rename), so a reader never sees a partial entry.
+    """
+
+    def __init__(
+        self,
+        diretorio: Optional[str] = None,
+        tamanho_max_bytes: Optional[int] = None,
+    ):
+        self.diretorio = diretorio or os.getenv(
+            "PORTAL_CACHE_EXTRACAO_DIR",
+            os.path.join(tempfile.gettempdir(), "auditoria360_extracoes"),
+        )
+        self.tamanho_max_bytes = (
+            tamanho_max_bytes
+            if tamanho_max_bytes is not None
+            else int(float(os.getenv("PORTAL_CACHE_EXTRACAO_MAX_MB", "256")) * 1024 * 1024)
+        )
+
+        # key -> size in bytes, least recently used first (loaded lazily from disk)
+        self._indice: Optional["OrderedDict[str, int]"] = None
+        self._tamanho_total = 0
+        self._lock = threading.Lock()
+        self.metricas = {"hits": 0, "misses": 0, "gravacoes": 0, "removidos_lru": 0, "erros": 0}
+
+    @property
+    def ativo(self) -> bool:
+        return self.tamanho_max_bytes > 0
+
+    @staticmethod
+    def chave(sha256_conteudo: str, instrucao: str, modelo: str) -> str:
+        """Cache key of (file, instruction, model version)"""
+        return hashlib.sha256(
+            json.dumps([modelo, instrucao, sha256_conteudo]).encode("utf-8")
+        ).hexdigest()
+
+    # ----- extraction -----
+
+    async def extrair(
+        self,
+        cliente,
+        conteudo: bytes,
+        instrucao: str,
+        sha256_conteudo: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        cliente.process(conteudo, instrucao), served from the cache when the
+        same file was already extracted with this instruction and model
+
+        Args:
+            cliente: DocumentAIClient (its model_version is part of the key)
+            conteudo: Raw file bytes
+            instrucao: Processing instruction for the AI
+            sha256_conteudo: Hash of conteudo when the caller already computed it
+        """
+        if not self.ativo:
+            return await cliente.process(conteudo, instrucao)
+
+        chave = self.chave(
+            sha256_conteudo or hash_conteudo(conteudo),
+            instrucao,
+            str(getattr(cliente, "model_version", "")),
+        )
+        dados = self.obter(chave)
+        if dados is not None:
+            logger.info(f"📦 Extraction cache hit ({chave[:12]}) - AI extraction skipped")
+            return dados
+
+        dados = await cliente.process(conteudo, instrucao)
+        self.gravar(chave, dados)
+        return dados
+
+    # ----- store -----
+
+    def obter(self, chave: str) -> Optional[Dict[str, Any]]:
+        """Stored extraction, or None on a miss"""
+        if not self.ativo:
+            return None
+
+        caminho = self._caminho(chave)
+        with self._lock:
+            indice = self._carregar_indice()
+            try:
+                with open(caminho, "r", encoding="utf-8") as arquivo:
+                    dados = json.load(arquivo)
+                os.utime(caminho)
+            except FileNotFoundError:
+                # Never stored, or evicted by another process
+                self._remover_do_indice(chave)
+                self.metricas["misses"] += 1
+                return None
+            except (OSError, ValueError) as e:
+                logger.warning(f"Extraction cache entry {chave[:12]} unreadable, discarding: {e}")
+                self._remover(chave)
+                self.metricas["erros"] += 1
+                self.metricas["misses"] += 1
+                return None
+
+            if chave in indice:
+                indice.move_to_end(chave)
+            self.metricas["hits"] += 1
+            return dados
+
+    def gravar(self, chave: str, dados: Dict[str, Any]):
+        """Store an extraction, evicting least recently used entries over the size limit"""
+        if not self.ativo:
+            return
+
+        try:
+            conteudo = json.dumps(dados, ensure_ascii=False).encode("utf-8")
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Extraction not cacheable (not JSON serializable): {e}")
+            self.metricas["erros"] += 1
+            return
+        if len(conteudo) > self.tamanho_max_bytes:
+            return
+
+        caminho = self._caminho(chave)
+        with self._lock:
+            indice = self._carregar_indice()
+            try:
+                os.makedirs(os.path.dirname(caminho), exist_ok=True)
+                descritor, temporario = tempfile.mkstemp(dir=os.path.dirname(caminho), suffix=".tmp")
+                try:
+                    with os.fdopen(descritor, "wb") as arquivo:
+                        arquivo.write(conteudo)
+                    os.replace(temporario, caminho)
+                except BaseException:
+                    os.unlink(temporario)
+                    raise
+            except OSError as e:
+                logger.warning(f"Extraction cache write failed: {e}")
+                self.metricas["erros"] += 1
+                return
+
+            self._remover_do_indice(chave)
+            indice[chave] = len(conteudo)
+            self._tamanho_total += len(conteudo)
+            self.metricas["gravacoes"] += 1
+
+            while self._tamanho_total > self.tamanho_max_bytes and indice:
+                antiga = next(iter(indice))
+                self._remover(antiga)
+                self.metricas["removidos_lru"] += 1
+
+    def limpar(self):
+        with self._lock:
+            for chave in list(self._carregar_indice()):
+                self._remover(chave)
+
+    def estatisticas(self) -> Dict[str, Any]:
+        with self._lock:
+            indice = self._carregar_indice() if self.ativo else {}
+            consultas = self.metricas["hits"] + self.metricas["misses"]
+            return {
+                **self.metricas,
+                "taxa_acerto": round(self.metricas["hits"] / consultas, 3) if consultas else 0.0,
+                "entradas": len(indice),
+                "tamanho_bytes": self._tamanho_total,
+                "tamanho_max_bytes": self.tamanho_max_bytes,
+                "diretorio": self.diretorio,
+            }
+
+    # ----- index (call with the lock held) -----
+
+    def _caminho(self, chave: str) -> str:
+        return os.path.join(self.diretorio, chave[:2], f"{chave}.json")
+
+    def _carregar_indice(self) -> "OrderedDict[str, int]":
+        if self._indice is not None:
+            return self._indice
+
+        entradas = []
+        if os.path.isdir(self.diretorio):
+            for subdiretorio in os.scandir(self.diretorio):
+                if not subdiretorio.is_dir():
+                    continue
+                for entrada in os.scandir(subdiretorio.path):
+                    if entrada.name.endswith(".json"):
+                        estado = entrada.stat()
+                        entradas.append((estado.st_mtime, entrada.name[:-5], estado.st_size))
+
+        entradas.sort()
+        self._indice = OrderedDict((chave, tamanho) for _, chave, tamanho in entradas)
+        self._tamanho_total = sum(self._indice.values())
+        logger.info(
+            f"Extraction cache index loaded: {len(self._indice)} entries, "
+            f"{self._tamanho_total} bytes in {self.diretorio}"
+        )
+        return self._indice
+
+    def _remover_do_indice(self, chave: str):
+        tamanho = self._indice.pop(chave, None)
+        if tamanho is not None:
+            self._tamanho_total -= tamanho
+
+    def _remover(self, chave: str):
+        self._remover_do_indice(chave)
+        try:
+            os.remove(self._caminho(chave))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Extraction cache entry {chave[:12]} not removed: {e}")
+
+
+# Global service instance
+cache_extracao = CacheExtracao()
+
+__all__ = ["CacheExtracao", "cache_extracao", "hash_conteudo"]
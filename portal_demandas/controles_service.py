@@ -0,0 +1,418 @@
+"""
+ControlesService - Set-based operations on monthly controls
+Applies a control template to any number of companies with a fixed number
+of statements instead of one round trip per company and task
+
+- anti-join (NOT EXISTS) selects the companies without a control for the period
+- INSERT ... SELECT ... RETURNING creates their controls in one statement
+- INSERT ... SELECT over controls x template tasks creates every task
+
+The unique index on (empresa_id, ano, mes) plus ON CONFLICT DO NOTHING keeps
+concurrent or repeated applications idempotent.
+
+Each control carries tarefas_total / tarefas_concluidas, maintained in the
+same transaction as the task writes, so progress is a column read; a
+reconciliation recomputes them from TarefasControle.
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import (
+    Boolean,
+    DateTime,
+    Integer,
+    String,
+    bindparam,
+    case,
+    exists,
+    func,
+    insert,
+    literal,
+    select,
+    true,
+    update,
+)
+from sqlalchemy.orm import Session
+
+try:
+    from db import ControleMensalDB, EmpresaDB, TarefaControleDB, TemplateControleTarefaDB
+except ImportError:
+    from .db import ControleMensalDB, EmpresaDB, TarefaControleDB, TemplateControleTarefaDB
+
+logger = logging.getLogger(__name__)
+
+# Controls per INSERT ... SELECT of tasks (bounds the IN list)
+TAMANHO_LOTE_TAREFAS = 1000
+
+
+def _insert_ignorando_conflitos(db: Session, tabela):
+    """INSERT ... ON CONFLICT DO NOTHING where the dialect supports it"""
+    dialeto = db.bind.dialect.name
+    if dialeto == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as insert_dialeto
+    elif dialeto == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as insert_dialeto
+    else:
+        return insert(tabela)
+    return insert_dialeto(tabela).on_conflict_do_nothing()
+
+
+class ControlesMensaisService:
+    """
+    🗓️ Bulk creation of monthly controls from templates and their task counters
+
+    Methods write into the caller's transaction; the caller commits.
+    """
+
+    def aplicar_template(
+        self,
+        db: Session,
+        template_id: int,
+        contabilidade_id: int,
+        ano: int,
+        mes: int,
+        status: str,
+        empresas_ids: Optional[List[int]] = None,
+        total_tarefas: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Create the period's control (and the template tasks) for every company
+        of the accounting firm that does not have one yet
+
+        Args:
+            empresas_ids: restrict to these companies (None = all of the firm)
+            total_tarefas: number of template tasks, when already known
+                (template registry); counted otherwise
+        """
+        agora = datetime.now(timezone.utc)
+        if total_tarefas is None:
+            total_tarefas = db.execute(
+                select(func.count(TemplateControleTarefaDB.id)).where(
+                    TemplateControleTarefaDB.template_id == template_id
+                )
+            ).scalar() or 0
+
+        empresas = select(EmpresaDB.id).where(EmpresaDB.contabilidade_id == contabilidade_id)
+        if empresas_ids:
+            empresas = empresas.where(EmpresaDB.id.in_(empresas_ids))
+
+        sem_controle = ~exists().where(
+            ControleMensalDB.empresa_id == EmpresaDB.id,
+            ControleMensalDB.ano == ano,
+            ControleMensalDB.mes == mes,
+        )
+        origem = (
+            empresas.add_columns(
+                literal(mes, Integer),
+                literal(ano, Integer),
+                literal(status, String),
+                literal(agora, DateTime),
+                literal(total_tarefas, Integer),
+            )
+            .where(sem_controle)
+            .order_by(EmpresaDB.id)
+        )
+
+        insercao = _insert_ignorando_conflitos(db, ControleMensalDB).from_select(
+            ["empresa_id", "mes", "ano", "status", "criado_em", "tarefas_total"], origem
+        )
+        if db.bind.dialect.insert_returning:
+            controle_ids = list(db.execute(insercao.returning(ControleMensalDB.id)).scalars())
+        else:
+            db.execute(insercao)
+            controle_ids = list(
+                db.execute(
+                    select(ControleMensalDB.id).where(
+                        ControleMensalDB.ano == ano,
+                        ControleMensalDB.mes == mes,
+                        ControleMensalDB.criado_em == agora,
+                        ControleMensalDB.empresa_id.in_(empresas.scalar_subquery()),
+                    )
+                ).scalars()
+            )
+
+        tarefas_criadas = 0
+        for inicio in range(0, len(controle_ids), TAMANHO_LOTE_TAREFAS):
+            lote = controle_ids[inicio : inicio + TAMANHO_LOTE_TAREFAS]
+            resultado = db.execute(
+                insert(TarefaControleDB).from_select(
+                    ["controle_mensal_id", "descricao_tarefa", "concluida", "criado_em"],
+                    select(
+                        ControleMensalDB.id,
+                        TemplateControleTarefaDB.descricao_tarefa,
+                        literal(False, Boolean),
+                        literal(agora, DateTime),
+                    )
+                    .select_from(ControleMensalDB)
+                    .join(TemplateControleTarefaDB, true())
+                    .where(
+                        ControleMensalDB.id.in_(lote),
+                        TemplateControleTarefaDB.template_id == template_id,
+                    )
+                    .order_by(ControleMensalDB.id, TemplateControleTarefaDB.id),
+                )
+            )
+            tarefas_criadas += resultado.rowcount
+
+        total_empresas = db.execute(
+            select(func.count()).select_from(empresas.subquery())
+        ).scalar()
+
+        return {
+            "empresas_processadas": int(total_empresas or 0),
+            "controles_criados": len(controle_ids),
+            "tarefas_criadas": tarefas_criadas,
+        }
+
+    def resumo_periodos(
+        self,
+        db: Session,
+        contabilidade_id: int,
+        inicio: Tuple[int, int],
+        fim: Tuple[int, int],
+        pendentes: bool = False,
+        tamanho_lote: int = 1000,
+    ) -> Iterator[Tuple[int, str, List[Optional[list]]]]:
+        """
+        Status and completion ratio per company and month between two (ano, mes)
+
+        One query (companies LEFT JOIN their controls of the range, progress
+        read from the counters), consumed with a server-side cursor and
+        yielded one company at a time as (empresa_id, nome, meses); `meses`
+        has one entry per month of the range: [status, concluidas/total] or
+        None when the company has no control that month.
+
+        With pendentes=True only controls with tarefas_concluidas <
+        tarefas_total are read (inner join): other months are None and
+        companies without any pending control are not yielded.
+        """
+        primeiro = inicio[0] * 12 + inicio[1] - 1
+        ultimo = fim[0] * 12 + fim[1] - 1
+        indice_mes = ControleMensalDB.ano * 12 + ControleMensalDB.mes - 1
+
+        condicao = (
+            (ControleMensalDB.empresa_id == EmpresaDB.id)
+            & ControleMensalDB.ano.between(inicio[0], fim[0])
+            & indice_mes.between(primeiro, ultimo)
+        )
+        if pendentes:
+            condicao &= ControleMensalDB.tarefas_concluidas < ControleMensalDB.tarefas_total
+
+        linhas = db.execute(
+            select(
+                EmpresaDB.id,
+                EmpresaDB.nome,
+                indice_mes,
+                ControleMensalDB.status,
+                ControleMensalDB.tarefas_total,
+                ControleMensalDB.tarefas_concluidas,
+            )
+            .select_from(EmpresaDB)
+            .join(ControleMensalDB, condicao, isouter=not pendentes)
+            .where(EmpresaDB.contabilidade_id == contabilidade_id)
+            .order_by(EmpresaDB.id)
+            .execution_options(yield_per=tamanho_lote)
+        )
+
+        atual = None
+        for empresa_id, nome, indice, status, total, concluidas in linhas:
+            if atual is None or atual[0] != empresa_id:
+                if atual is not None:
+                    yield atual
+                atual = (empresa_id, nome, [None] * (ultimo - primeiro + 1))
+            if indice is not None:
+                atual[2][indice - primeiro] = [
+                    status,
+                    round(concluidas / total, 4) if total else None,
+                ]
+        if atual is not None:
+            yield atual
+
+    def alternar_tarefas(
+        self,
+        db: Session,
+        contabilidade_id: int,
+        concluido: bool,
+        tarefa_ids: Optional[List[int]] = None,
+        descricao_tarefa: Optional[str] = None,
+        ano: Optional[int] = None,
+        mes: Optional[int] = None,
+        empresas_ids: Optional[List[int]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Complete or reopen many tasks with one UPDATE (before commit)
+
+        Selects tasks by id, or by description within a period, always
+        restricted to the firm's controls. Only tasks whose state actually
+        changes are updated (version bumped, data_conclusao stamped or
+        cleared); the returned control ids feed the counter deltas.
+
+        Returns:
+            atualizadas, the affected control ids and their (ano, mes) periods
+        """
+        controles = (
+            select(ControleMensalDB.id)
+            .join(EmpresaDB, ControleMensalDB.empresa_id == EmpresaDB.id)
+            .where(EmpresaDB.contabilidade_id == contabilidade_id)
+        )
+        criterios = [TarefaControleDB.concluida != concluido]
+        if tarefa_ids is not None:
+            criterios.append(TarefaControleDB.id.in_(tarefa_ids))
+        else:
+            controles = controles.where(ControleMensalDB.ano == ano, ControleMensalDB.mes == mes)
+            if empresas_ids:
+                controles = controles.where(ControleMensalDB.empresa_id.in_(empresas_ids))
+            criterios.append(TarefaControleDB.descricao_tarefa == descricao_tarefa)
+        criterios.append(TarefaControleDB.controle_mensal_id.in_(controles))
+
+        alteracao = (
+            update(TarefaControleDB)
+            .where(*criterios)
+            .values(
+                concluida=concluido,
+                data_conclusao=datetime.now(timezone.utc) if concluido else None,
+                version=TarefaControleDB.version + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if db.bind.dialect.update_returning:
+            controle_por_tarefa = db.execute(
+                alteracao.returning(TarefaControleDB.controle_mensal_id)
+            ).scalars().all()
+        else:
+            selecionadas = db.execute(
+                select(TarefaControleDB.id, TarefaControleDB.controle_mensal_id)
+                .where(*criterios)
+                .with_for_update()
+            ).all()
+            db.execute(alteracao.where(TarefaControleDB.id.in_([tarefa_id for tarefa_id, _ in selecionadas])))
+            controle_por_tarefa = [controle_id for _, controle_id in selecionadas]
+
+        deltas: Dict[int, int] = {}
+        for controle_id in controle_por_tarefa:
+            deltas[controle_id] = deltas.get(controle_id, 0) + (1 if concluido else -1)
+        self.registrar_conclusoes(db, deltas)
+
+        periodos = []
+        if deltas:
+            periodos = [
+                tuple(periodo)
+                for periodo in db.execute(
+                    select(ControleMensalDB.ano, ControleMensalDB.mes)
+                    .where(ControleMensalDB.id.in_(list(deltas)))
+                    .distinct()
+                )
+            ]
+
+        return {
+            "atualizadas": len(controle_por_tarefa),
+            "controles": sorted(deltas),
+            "periodos": periodos,
+        }
+
+    def registrar_conclusoes(self, db: Session, deltas: Dict[int, int]):
+        """Apply tarefas_concluidas deltas per control id (before commit)"""
+        # Sorted ids keep lock acquisition order stable across transactions
+        parametros = [
+            {"controle_id": controle_id, "delta": delta}
+            for controle_id, delta in sorted(deltas.items())
+            if delta
+        ]
+        if not parametros:
+            return
+
+        tabela = ControleMensalDB.__table__
+        db.execute(
+            update(tabela)
+            .where(tabela.c.id == bindparam("controle_id"))
+            .values(tarefas_concluidas=tabela.c.tarefas_concluidas + bindparam("delta")),
+            parametros,
+        )
+
+    def _contagens_reais(self):
+        return (
+            select(
+                TarefaControleDB.controle_mensal_id.label("controle_id"),
+                func.count(TarefaControleDB.id).label("total"),
+                func.sum(case((TarefaControleDB.concluida, 1), else_=0)).label("concluidas"),
+            )
+            .group_by(TarefaControleDB.controle_mensal_id)
+            .subquery()
+        )
+
+    def reconciliar(self, db: Session, corrigir: bool = False) -> Dict[str, Any]:
+        """
+        Compare the task counters with a recomputation from TarefasControle
+
+        Args:
+            corrigir: Overwrite the divergent counters with the recomputed values
+        """
+        reais = self._contagens_reais()
+        total_real = func.coalesce(reais.c.total, 0)
+        concluidas_real = func.coalesce(reais.c.concluidas, 0)
+
+        linhas = db.execute(
+            select(
+                ControleMensalDB.id,
+                ControleMensalDB.tarefas_total,
+                ControleMensalDB.tarefas_concluidas,
+                total_real,
+                concluidas_real,
+            )
+            .outerjoin(reais, reais.c.controle_id == ControleMensalDB.id)
+            .where(
+                (ControleMensalDB.tarefas_total != total_real)
+                | (ControleMensalDB.tarefas_concluidas != concluidas_real)
+            )
+            .order_by(ControleMensalDB.id)
+        ).all()
+
+        divergencias = [
+            {
+                "controle_id": controle_id,
+                "tarefas_total": {"contador": total, "real": int(real_total)},
+                "tarefas_concluidas": {"contador": concluidas, "real": int(real_concluidas)},
+            }
+            for controle_id, total, concluidas, real_total, real_concluidas in linhas
+        ]
+
+        if corrigir and divergencias:
+            for divergencia in divergencias:
+                db.execute(
+                    update(ControleMensalDB)
+                    .where(ControleMensalDB.id == divergencia["controle_id"])
+                    .values(
+                        tarefas_total=divergencia["tarefas_total"]["real"],
+                        tarefas_concluidas=divergencia["tarefas_concluidas"]["real"],
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+            db.commit()
+            logger.info(f"Control task counters corrected for {len(divergencias)} controls")
+
+        return {
+            "total_divergencias": len(divergencias),
+            "divergencias": divergencias[:100],
+            "corrigido": bool(corrigir and divergencias),
+        }
+
+    def inicializar(self, db: Session):
+        """Seed the counters of controls created before they existed"""
+        sem_contador = db.execute(
+            select(ControleMensalDB.id)
+            .where(
+                ControleMensalDB.tarefas_total == 0,
+                exists().where(TarefaControleDB.controle_mensal_id == ControleMensalDB.id),
+            )
+            .limit(1)
+        ).first()
+        if sem_contador:
+            self.reconciliar(db, corrigir=True)
+
+
+# Global service instance
+controles_mensais_service = ControlesMensaisService()
+
+__all__ = ["ControlesMensaisService", "controles_mensais_service"]
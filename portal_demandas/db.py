@@ -9,7 +9,7 @@ import os
 import sys
 from datetime import datetime
 
-from sqlalchemy import Column, DateTime, Integer, String, Text, Boolean, ForeignKey, Date, JSON, DECIMAL, ARRAY
+from sqlalchemy import Column, DateTime, Integer, String, Text, Boolean, ForeignKey, Date, JSON, DECIMAL, ARRAY, Index
 from sqlalchemy.dialects.postgresql import UUID, INET, JSONB
 from sqlalchemy.orm import declarative_base, relationship
 import json
@@ -32,14 +32,12 @@ Base = declarative_base()
 PortalSessionLocal = SessionLocal
 
 
-class TicketDB(Base):
+class TicketColunasMixin:
     """
-    Ticket model for the demands portal
-    Represents a work ticket/task in the system
+    Columns and helpers shared by live and archived tickets
+    Both tables have the same shape so they can be combined with UNION ALL
     """
 
-    __tablename__ = "tickets"
-
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     titulo = Column(String(200), nullable=False, index=True)
     descricao = Column(Text)
@@ -61,8 +59,11 @@ class TicketDB(Base):
     tempo_estimado = Column(Integer)  # Estimated time in hours
     tempo_gasto = Column(Integer, default=0)  # Time spent in hours
 
+    # Optimistic concurrency: every UPDATE is a compare-and-swap on version
+    version = Column(Integer, default=1, server_default="1", nullable=False)
+
     def __repr__(self):
-        return f"<Ticket(id={self.id}, titulo='{self.titulo}', status='{self.status}')>"
+        return f"<{type(self).__name__}(id={self.id}, titulo='{self.titulo}', status='{self.status}')>"
 
     def to_dict(self):
         """Convert model instance to dictionary"""
@@ -85,15 +86,69 @@ class TicketDB(Base):
             "comentarios_internos": self.comentarios_internos,
             "tempo_estimado": self.tempo_estimado,
             "tempo_gasto": self.tempo_gasto,
+            "version": self.version,
         }
 
 
+# Column names shared by TicketDB and TicketArquivadoDB (declaration order)
+COLUNAS_TICKET = (
+    "id",
+    "titulo",
+    "descricao",
+    "etapa",
+    "prazo",
+    "responsavel",
+    "status",
+    "criado_em",
+    "atualizado_em",
+    "prioridade",
+    "categoria",
+    "tags",
+    "arquivo_anexo",
+    "comentarios_internos",
+    "tempo_estimado",
+    "tempo_gasto",
+    "version",
+)
+
+
+class TicketDB(TicketColunasMixin, Base):
+    """
+    Ticket model for the demands portal
+    Represents a work ticket/task in the system
+    """
+
+    __tablename__ = "tickets"
+    __table_args__ = (
+        # Open-tickets-by-deadline lookups (overdue / at-risk / SLA counters)
+        Index("ix_tickets_status_prazo", "status", "prazo"),
+        # Default listing order; lets cursor pages seek instead of sorting
+        Index("ix_tickets_criado_em_id", "criado_em", "id"),
+    )
+
+
+class TicketArquivadoDB(TicketColunasMixin, Base):
+    """
+    Cold storage for tickets closed long ago (moved by the archival job)
+    Same columns as `tickets`; ids are kept, so comments and tags still match
+    """
+
+    __tablename__ = "tickets_arquivados"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    arquivado_em = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 class TicketComment(Base):
     """
     Comments/history for tickets
     """
 
     __tablename__ = "ticket_comments"
+    __table_args__ = (
+        # Serves the per-ticket, newest-first keyset pagination of comments
+        Index("ix_ticket_comments_ticket_criado", "ticket_id", "criado_em", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     ticket_id = Column(Integer, nullable=False, index=True)  # Foreign key to tickets
@@ -106,6 +161,125 @@ class TicketComment(Base):
         return f"<TicketComment(id={self.id}, ticket_id={self.ticket_id}, autor='{self.autor}')>"
 
 
+class TicketTagDB(Base):
+    """
+    Normalized ticket tags - one row per (ticket, tag)
+    Mirrors the comma-separated TicketDB.tags so tag filters are index lookups
+    """
+
+    __tablename__ = "ticket_tags"
+    __table_args__ = (Index("ix_ticket_tags_tag_ticket", "tag", "ticket_id"),)
+
+    ticket_id = Column(Integer, primary_key=True)  # Foreign key to tickets
+    tag = Column(String(50), primary_key=True)  # Lowercased, trimmed
+
+    def __repr__(self):
+        return f"<TicketTag(ticket_id={self.ticket_id}, tag='{self.tag}')>"
+
+
+class TicketEstatisticaDB(Base):
+    """
+    Incrementally maintained ticket counters for /stats/
+    One row per (dimensao, valor), updated in the same transaction as ticket writes
+    """
+
+    __tablename__ = "TicketsEstatisticas"
+
+    dimensao = Column(String(20), primary_key=True)  # total, status, prioridade, categoria
+    valor = Column(String(50), primary_key=True)
+    quantidade = Column(Integer, default=0, nullable=False)
+    soma_tempo_gasto = Column(Integer, default=0, nullable=False)  # Sum of non-null tempo_gasto
+    qtd_tempo_gasto = Column(Integer, default=0, nullable=False)  # Tickets with tempo_gasto set
+    atualizado_em = Column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+    )
+
+    def __repr__(self):
+        return f"<TicketEstatistica(dimensao='{self.dimensao}', valor='{self.valor}', quantidade={self.quantidade})>"
+
+
+class TicketRollupDiarioDB(Base):
+    """
+    Daily ticket rollup keyed by (dia, status, prioridade, categoria, responsavel)
+    abertos counts tickets created on `dia`; fechados counts tickets in a final
+    status whose last update happened on `dia`. Maintained from the same
+    before/after snapshots as TicketsEstatisticas
+    """
+
+    __tablename__ = "TicketsRollupDiario"
+    __table_args__ = (
+        Index("ix_tickets_rollup_responsavel_dia", "responsavel", "dia"),
+        Index("ix_tickets_rollup_categoria_dia", "categoria", "dia"),
+    )
+
+    dia = Column(Date, primary_key=True)
+    status = Column(String(20), primary_key=True)
+    prioridade = Column(String(10), primary_key=True)  # "" when unset
+    categoria = Column(String(50), primary_key=True)  # "" when unset
+    responsavel = Column(String(100), primary_key=True)
+    abertos = Column(Integer, default=0, nullable=False)
+    fechados = Column(Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<TicketRollupDiario(dia={self.dia}, status='{self.status}', abertos={self.abertos}, fechados={self.fechados})>"
+
+
+class VersaoTabelaDB(Base):
+    """
+    Per-table change version, bumped in the same transaction as every write
+    Backs the ETags of list endpoints (a changed version means changed data)
+    """
+
+    __tablename__ = "VersoesTabelas"
+
+    tabela = Column(String(100), primary_key=True)
+    versao = Column(Integer, default=0, nullable=False)
+    atualizado_em = Column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+    )
+
+    def __repr__(self):
+        return f"<VersaoTabela(tabela='{self.tabela}', versao={self.versao})>"
+
+
+class JobProgressoDB(Base):
+    """
+    Progress of resumable batch jobs (one row per job name)
+    Each batch commits its work together with the new position, so an
+    interrupted run continues from ultimo_id
+    """
+
+    __tablename__ = "JobsProgresso"
+
+    job = Column(String(100), primary_key=True)
+    status = Column(String(20), default="executando", nullable=False)  # executando, pausado, concluido, erro
+    ultimo_id = Column(Integer, default=0, nullable=False)
+    processados = Column(Integer, default=0, nullable=False)
+    lotes = Column(Integer, default=0, nullable=False)
+    parametros = Column(JSON)
+    erro = Column(Text)
+    iniciado_em = Column(DateTime, default=datetime.utcnow, nullable=False)
+    atualizado_em = Column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False
+    )
+    concluido_em = Column(DateTime)
+
+    def to_dict(self):
+        """Convert model instance to dictionary"""
+        return {
+            "job": self.job,
+            "status": self.status,
+            "ultimo_id": self.ultimo_id,
+            "processados": self.processados,
+            "lotes": self.lotes,
+            "parametros": self.parametros,
+            "erro": self.erro,
+            "iniciado_em": self.iniciado_em.isoformat() if self.iniciado_em else None,
+            "atualizado_em": self.atualizado_em.isoformat() if self.atualizado_em else None,
+            "concluido_em": self.concluido_em.isoformat() if self.concluido_em else None,
+        }
+
+
 # ===== CONTROLE MENSAL DATABASE MODELS =====
 
 class ContabilidadeDB(Base):
@@ -194,6 +368,10 @@ class ControleMensalDB(Base):
     """
     
     __tablename__ = "ControlesMensais"
+    __table_args__ = (
+        # One control per company and period (idempotent template application)
+        Index("uq_controles_mensais_empresa_periodo", "empresa_id", "ano", "mes", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     empresa_id = Column(Integer, ForeignKey("Empresas.id"), nullable=False)
@@ -201,6 +379,9 @@ class ControleMensalDB(Base):
     ano = Column(Integer, nullable=False)
     status = Column(String(50), default="PENDENTE", nullable=False)
     criado_em = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Task progress, maintained by the task write paths (see controles_service)
+    tarefas_total = Column(Integer, default=0, server_default="0", nullable=False)
+    tarefas_concluidas = Column(Integer, default=0, server_default="0", nullable=False)
 
 
 class TarefaControleDB(Base):
@@ -209,6 +390,10 @@ class TarefaControleDB(Base):
     """
     
     __tablename__ = "TarefasControle"
+    __table_args__ = (
+        # Serves the tasks join of the monthly control board
+        Index("ix_tarefas_controle_controle", "controle_mensal_id", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     controle_mensal_id = Column(Integer, ForeignKey("ControlesMensais.id"), nullable=False)
@@ -216,6 +401,7 @@ class TarefaControleDB(Base):
     concluida = Column(Boolean, default=False, nullable=False)
     criado_em = Column(DateTime, default=datetime.utcnow, nullable=False)
     data_conclusao = Column(DateTime, nullable=True)
+    version = Column(Integer, default=1, server_default="1", nullable=False)  # Optimistic concurrency
 
 
 class TemplateControleDB(Base):
@@ -261,6 +447,7 @@ class ProcessamentosFolhaDB(Base):
     total_funcionarios = Column(Integer, default=0)
     total_divergencias = Column(Integer, default=0)
     status_processamento = Column(String(50), default="PROCESSANDO", nullable=False)  # PROCESSANDO, CONCLUIDO, ERRO
+    mensagem_erro = Column(Text, nullable=True)  # Failure reason of background (202) processings
     criado_em = Column(DateTime, default=datetime.utcnow, nullable=False)
     concluido_em = Column(DateTime, nullable=True)
 
@@ -504,6 +691,8 @@ def init_portal_db():
     try:
         # Create tables but don't overwrite existing ones
         Base.metadata.create_all(bind=engine, checkfirst=True)
+        adicionar_colunas_pendentes()
+        criar_indices_pendentes()
         logger.info("Portal demandas database tables initialized (checkfirst=True)")
         return True
     except Exception as e:
@@ -512,6 +701,61 @@ def init_portal_db():
         return True
 
 
+def adicionar_colunas_pendentes():
+    """
+    Add columns declared on models but missing from existing tables
+    Only columns that are nullable or have a server default can be added this
+    way (e.g. the optimistic-concurrency `version` columns)
+    """
+    from sqlalchemy import inspect, text
+
+    inspetor = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+
+    for table in Base.metadata.sorted_tables:
+        if not inspetor.has_table(table.name):
+            continue
+        existentes = {coluna["name"] for coluna in inspetor.get_columns(table.name)}
+
+        for coluna in table.columns:
+            if coluna.name in existentes:
+                continue
+            if not coluna.nullable and coluna.server_default is None:
+                logger.warning(f"Cannot add NOT NULL column {table.name}.{coluna.name} without a server default")
+                continue
+
+            ddl = (
+                f"ALTER TABLE {preparer.format_table(table)} "
+                f"ADD COLUMN {preparer.format_column(coluna)} "
+                f"{coluna.type.compile(dialect=engine.dialect)}"
+            )
+            if coluna.server_default is not None:
+                ddl += f" DEFAULT {coluna.server_default.arg}"
+            if not coluna.nullable:
+                ddl += " NOT NULL"
+
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(ddl))
+                logger.info(f"Added column {table.name}.{coluna.name}")
+            except Exception as e:
+                logger.warning(f"Could not add column {table.name}.{coluna.name}: {e}")
+
+
+def criar_indices_pendentes():
+    """
+    Create indexes declared on models whose tables already existed
+    create_all(checkfirst=True) skips existing tables, so indexes added later
+    to a model would otherwise never reach deployed databases
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except Exception as e:
+                logger.warning(f"Could not create index {index.name}: {e}")
+
+
 def test_db_connection():
     """
     Test database connection
@@ -534,7 +778,14 @@ except Exception as e:
 # Re-export for convenience
 __all__ = [
     "TicketDB",
+    "TicketArquivadoDB",
+    "COLUNAS_TICKET",
     "TicketComment",
+    "TicketEstatisticaDB",
+    "TicketTagDB",
+    "TicketRollupDiarioDB",
+    "VersaoTabelaDB",
+    "JobProgressoDB",
     "ContabilidadeDB", 
     "EmpresaDB",
     "SindicatoDB",
@@ -559,6 +810,8 @@ __all__ = [
     # Functions
     "get_db",
     "init_portal_db",
+    "criar_indices_pendentes",
+    "adicionar_colunas_pendentes",
     "test_db_connection",
     "Base",
     "engine",
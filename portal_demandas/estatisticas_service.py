@@ -0,0 +1,312 @@
+"""
+EstatisticasService - Incrementally maintained ticket statistics
+Serves /stats/ from a small counters table instead of aggregating `tickets`
+
+Every ticket write path reports "before" and "after" snapshots of the rows it
+touched; the service turns them into counter deltas applied in the caller's
+transaction, so /stats/ becomes a read of a handful of rows. A reconciliation
+job recomputes the aggregates from `tickets` to detect (and optionally fix)
+drift.
+"""
+
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy import func, insert, text, update
+from sqlalchemy.orm import Session
+
+try:
+    from db import TicketDB, TicketEstatisticaDB
+except ImportError:
+    from .db import TicketDB, TicketEstatisticaDB
+
+try:
+    from models import TicketCategoria, TicketPrioridade, TicketStats, TicketStatus
+except ImportError:
+    from .models import TicketCategoria, TicketPrioridade, TicketStats, TicketStatus
+
+logger = logging.getLogger(__name__)
+
+# Columns captured in a ticket snapshot (shared with the daily rollups)
+COLUNAS_SNAPSHOT = (
+    "id",
+    "status",
+    "prioridade",
+    "categoria",
+    "tempo_gasto",
+    "responsavel",
+    "criado_em",
+    "atualizado_em",
+)
+
+# Counted dimensions and the enum each one is derived from
+DIMENSOES = {
+    "status": TicketStatus,
+    "prioridade": TicketPrioridade,
+    "categoria": TicketCategoria,
+}
+
+
+def snapshot_ticket(ticket: TicketDB) -> Dict[str, Any]:
+    """Capture the counted attributes of a (flushed) ticket instance"""
+    return {coluna: getattr(ticket, coluna) for coluna in COLUNAS_SNAPSHOT}
+
+
+def carregar_snapshots(db: Session, *criterios, bloquear: bool = False) -> List[Dict[str, Any]]:
+    """
+    Load snapshots for the tickets matching the criteria without building ORM objects
+
+    With bloquear=True the rows are locked (FOR UPDATE, in id order) until the
+    caller's transaction ends: an UPDATE restricted to the returned ids then
+    replaces exactly these snapshots, which is what registrar_alteracoes()
+    assumes for its "antes".
+    """
+    colunas = [getattr(TicketDB, coluna) for coluna in COLUNAS_SNAPSHOT]
+    consulta = db.query(*colunas).filter(*criterios)
+    if bloquear:
+        consulta = consulta.order_by(TicketDB.id).with_for_update()
+    return [dict(row._mapping) for row in consulta]
+
+
+class EstatisticasTicketsService:
+    """
+    📊 Ticket counters keyed by (dimensao, valor)
+
+    The "total" dimension has a single "total" row; status, prioridade and
+    categoria have one row per value. Time spent is tracked as sum/count so
+    the average completion time can be derived without scanning tickets.
+    """
+
+    def registrar_alteracoes(
+        self,
+        db: Session,
+        antes: Iterable[Dict[str, Any]],
+        depois: Iterable[Dict[str, Any]],
+    ):
+        """
+        Apply the counter deltas between two sets of snapshots
+
+        Pass antes=[] for creations and depois=[] for deletions. Must be
+        called before the caller commits so counters and tickets stay
+        consistent.
+        """
+        deltas = defaultdict(lambda: [0, 0, 0])
+        for snapshot in antes:
+            self._acumular(deltas, snapshot, -1)
+        for snapshot in depois:
+            self._acumular(deltas, snapshot, 1)
+
+        self._aplicar_deltas(db, deltas)
+
+    def _acumular(self, deltas, snapshot: Dict[str, Any], sinal: int):
+        tempo_gasto = snapshot.get("tempo_gasto")
+        soma = (tempo_gasto or 0) * sinal
+        qtd = sinal if tempo_gasto is not None else 0
+
+        chaves = [("total", "total")]
+        chaves += [
+            (dimensao, snapshot.get(dimensao))
+            for dimensao in DIMENSOES
+            if snapshot.get(dimensao) is not None
+        ]
+        for chave in chaves:
+            delta = deltas[chave]
+            delta[0] += sinal
+            delta[1] += soma
+            delta[2] += qtd
+
+    def _aplicar_deltas(self, db: Session, deltas):
+        # Sorted keys keep lock acquisition order stable across transactions
+        for (dimensao, valor), (quantidade, soma, qtd) in sorted(deltas.items()):
+            if not (quantidade or soma or qtd):
+                continue
+
+            result = db.execute(
+                update(TicketEstatisticaDB)
+                .where(TicketEstatisticaDB.dimensao == dimensao)
+                .where(TicketEstatisticaDB.valor == valor)
+                .values(
+                    quantidade=TicketEstatisticaDB.quantidade + quantidade,
+                    soma_tempo_gasto=TicketEstatisticaDB.soma_tempo_gasto + soma,
+                    qtd_tempo_gasto=TicketEstatisticaDB.qtd_tempo_gasto + qtd,
+                )
+            )
+            if result.rowcount == 0:
+                # Value outside the enums (legacy data) - create its row lazily
+                db.execute(
+                    insert(TicketEstatisticaDB).values(
+                        dimensao=dimensao,
+                        valor=valor,
+                        quantidade=quantidade,
+                        soma_tempo_gasto=soma,
+                        qtd_tempo_gasto=qtd,
+                    )
+                )
+
+    def obter_estatisticas(self, db: Session) -> TicketStats:
+        """Build TicketStats from the counters table (constant-size read)"""
+        linhas = {
+            (linha.dimensao, linha.valor): linha
+            for linha in db.query(TicketEstatisticaDB).all()
+        }
+
+        def quantidade(dimensao: str, valor: str) -> int:
+            linha = linhas.get((dimensao, valor))
+            return int(linha.quantidade) if linha else 0
+
+        por_status = {s.value: quantidade("status", s.value) for s in TicketStatus}
+        concluidos = linhas.get(("status", TicketStatus.CONCLUIDO.value))
+
+        return TicketStats(
+            total=quantidade("total", "total"),
+            pendentes=por_status[TicketStatus.PENDENTE.value],
+            em_andamento=por_status[TicketStatus.EM_ANDAMENTO.value],
+            concluidos=por_status[TicketStatus.CONCLUIDO.value],
+            cancelados=por_status[TicketStatus.CANCELADO.value],
+            por_prioridade={
+                p.value: quantidade("prioridade", p.value) for p in TicketPrioridade
+            },
+            por_categoria={
+                c.value: quantidade("categoria", c.value) for c in TicketCategoria
+            },
+            por_status=por_status,
+            tempo_medio_conclusao=(
+                float(concluidos.soma_tempo_gasto) / concluidos.qtd_tempo_gasto
+                if concluidos and concluidos.qtd_tempo_gasto
+                else None
+            ),
+        )
+
+    def calcular_agregados(self, db: Session) -> Dict[tuple, List[int]]:
+        """Recompute every counter directly from the tickets table"""
+        agregados = {}
+
+        total = db.query(
+            func.count(TicketDB.id),
+            func.coalesce(func.sum(TicketDB.tempo_gasto), 0),
+            func.count(TicketDB.tempo_gasto),
+        ).one()
+        agregados[("total", "total")] = [int(v or 0) for v in total]
+
+        for dimensao, enum in DIMENSOES.items():
+            # Enum values are always present so missing rows read as zero
+            for membro in enum:
+                agregados[(dimensao, membro.value)] = [0, 0, 0]
+
+            coluna = getattr(TicketDB, dimensao)
+            linhas = (
+                db.query(
+                    coluna,
+                    func.count(TicketDB.id),
+                    func.coalesce(func.sum(TicketDB.tempo_gasto), 0),
+                    func.count(TicketDB.tempo_gasto),
+                )
+                .filter(coluna.isnot(None))
+                .group_by(coluna)
+                .all()
+            )
+            for valor, quantidade, soma, qtd in linhas:
+                agregados[(dimensao, valor)] = [int(quantidade), int(soma or 0), int(qtd)]
+
+        return agregados
+
+    def reconciliar(self, db: Session, corrigir: bool = False) -> Dict[str, Any]:
+        """
+        Compare the counters with a full recomputation
+
+        Args:
+            corrigir: Overwrite the counters with the recomputed values
+
+        Returns:
+            Report with every divergent (dimensao, valor)
+        """
+        if corrigir:
+            self._bloquear_contadores(db)
+
+        esperado = self.calcular_agregados(db)
+        atual = {
+            (linha.dimensao, linha.valor): [
+                linha.quantidade,
+                linha.soma_tempo_gasto,
+                linha.qtd_tempo_gasto,
+            ]
+            for linha in db.query(TicketEstatisticaDB).all()
+        }
+
+        divergencias = []
+        for chave in sorted(set(esperado) | set(atual)):
+            # A missing counter row is equivalent to zero
+            valores_esperados = esperado.get(chave, [0, 0, 0])
+            valores_atuais = atual.get(chave, [0, 0, 0])
+            if valores_atuais != valores_esperados:
+                divergencias.append(
+                    {
+                        "dimensao": chave[0],
+                        "valor": chave[1],
+                        "contador": valores_atuais[0],
+                        "real": valores_esperados[0],
+                    }
+                )
+
+        if divergencias:
+            logger.warning(f"⚠️ Ticket statistics drift detected in {len(divergencias)} counters")
+
+        if corrigir and divergencias:
+            db.query(TicketEstatisticaDB).delete(synchronize_session=False)
+            db.execute(
+                insert(TicketEstatisticaDB),
+                [
+                    {
+                        "dimensao": dimensao,
+                        "valor": valor,
+                        "quantidade": quantidade,
+                        "soma_tempo_gasto": soma,
+                        "qtd_tempo_gasto": qtd,
+                    }
+                    for (dimensao, valor), (quantidade, soma, qtd) in esperado.items()
+                ],
+            )
+            db.commit()
+            logger.info("Ticket statistics counters rebuilt from tickets table")
+
+        return {
+            "consistente": not divergencias,
+            "total_divergencias": len(divergencias),
+            "corrigido": bool(corrigir and divergencias),
+            "divergencias": divergencias,
+        }
+
+    def _bloquear_contadores(self, db: Session):
+        """
+        Hold off ticket writers until the caller's transaction ends
+
+        Every ticket write updates the counters, so a SHARE ROW EXCLUSIVE lock
+        on the counters table makes recompute + rewrite atomic with respect to
+        them: a write that committed before the lock is in the recomputation,
+        a later one applies its delta on top of the rewritten counters. On
+        SQLite writers are already serialized by the database lock.
+        """
+        if db.bind.dialect.name == "postgresql":
+            db.execute(
+                text(
+                    f'LOCK TABLE "{TicketEstatisticaDB.__tablename__}" '
+                    "IN SHARE ROW EXCLUSIVE MODE"
+                )
+            )
+
+    def inicializar(self, db: Session):
+        """Seed the counters from the tickets table when they are empty"""
+        if db.query(TicketEstatisticaDB).first() is None:
+            self.reconciliar(db, corrigir=True)
+
+
+# Global service instance
+estatisticas_tickets_service = EstatisticasTicketsService()
+
+__all__ = [
+    "EstatisticasTicketsService",
+    "estatisticas_tickets_service",
+    "snapshot_ticket",
+    "carregar_snapshots",
+]
@@ -0,0 +1,222 @@
+"""
+EventosService - Ticket change stream (Server-Sent Events)
+Lets dashboards refresh on change instead of polling /tickets/ and /stats/
+
+Write endpoints publish small change events after commit; every connected SSE
+client has its own bounded queue. A client whose queue fills up (it is not
+reading fast enough) is dropped instead of buffering without limit - its
+EventSource reconnects and the dashboard reloads once.
+
+With PORTAL_EVENTOS_REDIS_URL (or REDIS_URL) set, events are published to a
+Redis-compatible pub/sub channel and every replica delivers what it receives
+from the channel, so clients see writes made on any replica.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Sentinel queued when a client is dropped
+_DESCARTADO = object()
+
+
+class _ClienteEventos:
+    """One connected SSE client: its queue and the event loop that owns it"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, tamanho_fila: int):
+        self.loop = loop
+        self.fila: asyncio.Queue = asyncio.Queue(maxsize=tamanho_fila)
+        self.descartado = False
+
+
+class BroadcasterEventos:
+    """
+    📡 In-process broadcaster with optional Redis fan-out
+
+    publicar() may be called from any thread (sync endpoints run in the
+    threadpool); queues are only touched from their event loop.
+    """
+
+    def __init__(self):
+        self.tamanho_fila = int(os.getenv("PORTAL_EVENTOS_FILA_MAX", "100"))
+        self.intervalo_keepalive = float(os.getenv("PORTAL_EVENTOS_KEEPALIVE", "15"))
+        self.canal = os.getenv("PORTAL_EVENTOS_CANAL", "portal_demandas:eventos")
+        self.redis_url = os.getenv("PORTAL_EVENTOS_REDIS_URL") or os.getenv("REDIS_URL")
+
+        self._clientes: Set[_ClienteEventos] = set()
+        self._lock = threading.Lock()
+        self._sequencia = itertools.count(1)
+        self._redis_pub = None
+        self._tarefa_redis: Optional[asyncio.Task] = None
+        self.metricas = {"publicados": 0, "entregues": 0, "clientes_descartados": 0}
+
+    # ----- lifecycle -----
+
+    async def iniciar(self):
+        """Start the Redis listener when a backend is configured"""
+        if not self.redis_url or self._tarefa_redis:
+            return
+        try:
+            import redis
+            import redis.asyncio  # noqa: F401 - fail early if unavailable
+        except ImportError:
+            logger.warning("redis package not installed - ticket events are local to this process")
+            self.redis_url = None
+            return
+
+        self._redis_pub = redis.Redis.from_url(self.redis_url)
+        self._tarefa_redis = asyncio.create_task(self._escutar_redis())
+        logger.info(f"Ticket events fan-out via Redis channel '{self.canal}'")
+
+    async def parar(self):
+        if self._tarefa_redis:
+            self._tarefa_redis.cancel()
+            try:
+                await self._tarefa_redis
+            except asyncio.CancelledError:
+                pass
+            self._tarefa_redis = None
+        if self._redis_pub is not None:
+            self._redis_pub.close()
+            self._redis_pub = None
+
+    async def _escutar_redis(self):
+        import redis.asyncio as aioredis
+
+        while True:
+            try:
+                conexao = aioredis.Redis.from_url(self.redis_url)
+                async with conexao.pubsub() as pubsub:
+                    await pubsub.subscribe(self.canal)
+                    async for mensagem in pubsub.listen():
+                        if mensagem.get("type") != "message":
+                            continue
+                        try:
+                            evento = json.loads(mensagem["data"])
+                        except (TypeError, ValueError):
+                            continue
+                        self._entregar_local(evento)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Ticket events Redis listener failed, retrying in 5s: {e}")
+                await asyncio.sleep(5)
+
+    # ----- clients -----
+
+    def inscrever(self) -> _ClienteEventos:
+        """Register a client; must be called from the event loop serving it"""
+        cliente = _ClienteEventos(asyncio.get_running_loop(), self.tamanho_fila)
+        with self._lock:
+            self._clientes.add(cliente)
+        return cliente
+
+    def cancelar(self, cliente: _ClienteEventos):
+        with self._lock:
+            self._clientes.discard(cliente)
+
+    @property
+    def total_clientes(self) -> int:
+        return len(self._clientes)
+
+    # ----- publishing -----
+
+    def publicar(self, tipo: str, dados: Dict[str, Any]):
+        """
+        Publish a change event (call after commit)
+
+        Never raises: a failing event stream must not fail the write that
+        produced it.
+        """
+        evento = {
+            "id": f"{os.getpid()}-{next(self._sequencia)}",
+            "tipo": tipo,
+            "dados": dados,
+            "timestamp": time.time(),
+        }
+        self.metricas["publicados"] += 1
+
+        if self._redis_pub is not None:
+            try:
+                self._redis_pub.publish(self.canal, json.dumps(evento, default=str))
+                return
+            except Exception as e:
+                logger.warning(f"Could not publish ticket event to Redis, delivering locally: {e}")
+
+        self._entregar_local(evento)
+
+    def _entregar_local(self, evento: Dict[str, Any]):
+        with self._lock:
+            clientes = list(self._clientes)
+
+        for cliente in clientes:
+            try:
+                cliente.loop.call_soon_threadsafe(self._enfileirar, cliente, evento)
+            except RuntimeError:
+                # Loop already closed - the client is gone
+                self.cancelar(cliente)
+
+    def _enfileirar(self, cliente: _ClienteEventos, evento: Dict[str, Any]):
+        if cliente.descartado:
+            return
+        try:
+            cliente.fila.put_nowait(evento)
+            self.metricas["entregues"] += 1
+        except asyncio.QueueFull:
+            # Slow consumer: drop it rather than buffer without bound
+            cliente.descartado = True
+            self.metricas["clientes_descartados"] += 1
+            while not cliente.fila.empty():
+                cliente.fila.get_nowait()
+            cliente.fila.put_nowait(_DESCARTADO)
+            self.cancelar(cliente)
+            logger.warning("Ticket events client dropped (queue full)")
+
+    # ----- SSE encoding -----
+
+    async def stream(self, cliente: _ClienteEventos, desconectado):
+        """
+        Yield SSE frames for a client until it disconnects or is dropped
+
+        Args:
+            desconectado: async callable returning True once the client left
+        """
+        try:
+            yield f"retry: 3000\nevent: conectado\ndata: {json.dumps({'fila_max': self.tamanho_fila})}\n\n"
+            while True:
+                try:
+                    evento = await asyncio.wait_for(
+                        cliente.fila.get(), timeout=self.intervalo_keepalive
+                    )
+                except asyncio.TimeoutError:
+                    if await desconectado():
+                        break
+                    # Comment frame keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+
+                if evento is _DESCARTADO:
+                    yield "event: descartado\ndata: {}\n\n"
+                    break
+
+                dados = json.dumps(
+                    {**evento["dados"], "tipo": evento["tipo"], "timestamp": evento["timestamp"]},
+                    default=str,
+                    ensure_ascii=False,
+                )
+                yield f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {dados}\n\n"
+        finally:
+            self.cancelar(cliente)
+
+
+# Global service instance
+broadcaster_eventos = BroadcasterEventos()
+
+__all__ = ["BroadcasterEventos", "broadcaster_eventos"]
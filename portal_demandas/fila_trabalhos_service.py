@@ -0,0 +1,197 @@
+"""
+FilaTrabalhosService - Bounded background worker pool
+Runs slow request work (payroll audits: AI extraction + audit) after the
+request returned 202, so proxies don't time out and request workers are freed
+
+A fixed number of asyncio workers consume a bounded queue on the app's event
+loop. They only schedule the jobs: a job awaits its I/O on the loop and must
+hand blocking work (database sessions, CPU-bound steps) to the threadpool
+(run_in_threadpool), or it stalls every request. When the queue is full,
+enfileirar() refuses the job and the endpoint answers 503 instead of
+buffering without limit. Queue depth, waiting and running times are
+measured for GET /v1/folha/fila.
+
+Configuration (payroll audit pool):
+    PORTAL_FOLHA_WORKERS    concurrent audits (default 2)
+    PORTAL_FOLHA_FILA_MAX   queued audits before refusing (default 50)
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class FilaCheiaError(Exception):
+    """The queue is at its limit; the caller should retry later"""
+
+
+class _Trabalho:
+    def __init__(
+        self,
+        nome: str,
+        executar: Callable[[], Awaitable[Any]],
+        ao_descartar: Optional[Callable[[], Any]],
+    ):
+        self.nome = nome
+        self.executar = executar
+        self.ao_descartar = ao_descartar
+        self.enfileirado_em = time.monotonic()
+
+
+class FilaTrabalhos:
+    """
+    ⚙️ Bounded asyncio queue + fixed worker pool with metrics
+
+    enfileirar() must be called from the event loop running the workers
+    (async endpoints). Workers start lazily on first use, or in the lifespan.
+    """
+
+    def __init__(self, nome: str, workers: int, tamanho_max: int):
+        self.nome = nome
+        self.workers = max(1, workers)
+        self.tamanho_max = max(1, tamanho_max)
+
+        self._fila: Optional[asyncio.Queue] = None
+        self._tarefas: List[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.em_execucao = 0
+        self.metricas = {
+            "enfileirados": 0,
+            "concluidos": 0,
+            "falhas": 0,
+            "rejeitados": 0,
+            "profundidade_maxima": 0,
+            "espera_total_s": 0.0,
+            "execucao_total_s": 0.0,
+        }
+
+    # ----- lifecycle -----
+
+    def iniciar(self):
+        """Start the workers on the running event loop (idempotent)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._tarefas:
+            return
+
+        self._loop = loop
+        self._fila = asyncio.Queue(maxsize=self.tamanho_max)
+        self._tarefas = [
+            loop.create_task(self._worker(indice)) for indice in range(self.workers)
+        ]
+        logger.info(
+            f"Worker pool '{self.nome}' started: {self.workers} workers, queue limit {self.tamanho_max}"
+        )
+
+    async def parar(self):
+        """Cancel the workers; queued jobs that never started are discarded"""
+        for tarefa in self._tarefas:
+            tarefa.cancel()
+        for tarefa in self._tarefas:
+            try:
+                await tarefa
+            except asyncio.CancelledError:
+                pass
+        self._tarefas = []
+
+        while self._fila is not None and not self._fila.empty():
+            self._descartar(self._fila.get_nowait())
+
+    # ----- jobs -----
+
+    def enfileirar(
+        self,
+        nome: str,
+        executar: Callable[[], Awaitable[Any]],
+        ao_descartar: Optional[Callable[[], Any]] = None,
+    ):
+        """
+        Queue a job (a coroutine factory)
+
+        Raises:
+            FilaCheiaError: the queue is at its limit
+        """
+        self.iniciar()
+        try:
+            self._fila.put_nowait(_Trabalho(nome, executar, ao_descartar))
+        except asyncio.QueueFull:
+            self.metricas["rejeitados"] += 1
+            raise FilaCheiaError(f"Fila '{self.nome}' cheia ({self.tamanho_max} trabalhos)")
+
+        self.metricas["enfileirados"] += 1
+        self.metricas["profundidade_maxima"] = max(
+            self.metricas["profundidade_maxima"], self._fila.qsize()
+        )
+
+    def verificar_vaga(self):
+        """
+        Refuse early (before the caller does any work) when the queue is full
+
+        Raises:
+            FilaCheiaError: the queue is at its limit
+        """
+        if self._fila is not None and self._fila.full():
+            self.metricas["rejeitados"] += 1
+            raise FilaCheiaError(f"Fila '{self.nome}' cheia ({self.tamanho_max} trabalhos)")
+
+    async def _worker(self, indice: int):
+        while True:
+            trabalho: _Trabalho = await self._fila.get()
+            inicio = time.monotonic()
+            self.metricas["espera_total_s"] += inicio - trabalho.enfileirado_em
+            self.em_execucao += 1
+            try:
+                await trabalho.executar()
+                self.metricas["concluidos"] += 1
+            except asyncio.CancelledError:
+                self._descartar(trabalho)
+                raise
+            except Exception as e:
+                # The job records its own failure; this only keeps the worker alive
+                self.metricas["falhas"] += 1
+                logger.error(f"Worker pool '{self.nome}': job {trabalho.nome} failed: {e}")
+            finally:
+                self.em_execucao -= 1
+                self.metricas["execucao_total_s"] += time.monotonic() - inicio
+                self._fila.task_done()
+
+    def _descartar(self, trabalho: _Trabalho):
+        logger.warning(f"Worker pool '{self.nome}': job {trabalho.nome} discarded")
+        if trabalho.ao_descartar:
+            try:
+                trabalho.ao_descartar()
+            except Exception as e:
+                logger.error(f"Worker pool '{self.nome}': discard hook of {trabalho.nome} failed: {e}")
+
+    def estatisticas(self) -> Dict[str, Any]:
+        finalizados = self.metricas["concluidos"] + self.metricas["falhas"]
+        iniciados = finalizados + self.em_execucao
+        return {
+            "fila": self.nome,
+            "workers": self.workers,
+            "tamanho_max": self.tamanho_max,
+            "profundidade": self._fila.qsize() if self._fila is not None else 0,
+            "em_execucao": self.em_execucao,
+            **{
+                chave: valor
+                for chave, valor in self.metricas.items()
+                if not chave.endswith("_total_s")
+            },
+            "espera_media_s": round(self.metricas["espera_total_s"] / iniciados, 3) if iniciados else 0.0,
+            "execucao_media_s": (
+                round(self.metricas["execucao_total_s"] / finalizados, 3) if finalizados else 0.0
+            ),
+        }
+
+
+# Global pool for payroll audits
+fila_auditoria_folha = FilaTrabalhos(
+    "auditoria_folha",
+    workers=int(os.getenv("PORTAL_FOLHA_WORKERS", "2")),
+    tamanho_max=int(os.getenv("PORTAL_FOLHA_FILA_MAX", "50")),
+)
+
+__all__ = ["FilaTrabalhos", "FilaCheiaError", "fila_auditoria_folha"]
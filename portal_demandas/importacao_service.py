@@ -0,0 +1,226 @@
+"""
+ImportacaoService - Streaming bulk ticket import (CSV / NDJSON)
+
+Parses the upload incrementally, validates each row with the TicketCreate
+rules and inserts valid rows in executemany batches, each batch committed in
+its own transaction. Only the current batch and the (capped) error report are
+kept in memory, so arbitrarily large files can be imported.
+"""
+
+import csv
+import io
+import json
+import logging
+import warnings
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+try:
+    from db import TicketDB
+except ImportError:
+    from .db import TicketDB
+
+try:
+    from models import TicketCreate, TicketStatus
+except ImportError:
+    from .models import TicketCreate, TicketStatus
+
+try:
+    from estatisticas_service import estatisticas_tickets_service
+except ImportError:
+    from .estatisticas_service import estatisticas_tickets_service
+
+try:
+    from rollups_service import rollups_tickets_service
+except ImportError:
+    from .rollups_service import rollups_tickets_service
+
+try:
+    from tags_service import tags_tickets_service
+except ImportError:
+    from .tags_service import tags_tickets_service
+
+try:
+    from versoes_service import versoes_tabelas_service
+except ImportError:
+    from .versoes_service import versoes_tabelas_service
+
+logger = logging.getLogger(__name__)
+
+FORMATOS_SUPORTADOS = ("csv", "ndjson")
+
+
+def detectar_formato(nome_arquivo: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    """Infer the upload format from its filename or content type"""
+    nome = (nome_arquivo or "").lower()
+    tipo = (content_type or "").lower()
+    if nome.endswith(".csv") or "csv" in tipo:
+        return "csv"
+    if nome.endswith((".ndjson", ".jsonl")) or "ndjson" in tipo or "jsonl" in tipo:
+        return "ndjson"
+    return None
+
+
+def iterar_registros(
+    arquivo: BinaryIO, formato: str
+) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    Yield (line number, record, parse error) one row at a time
+
+    The binary stream is decoded lazily, so the file is never fully loaded.
+    """
+    texto = io.TextIOWrapper(arquivo, encoding="utf-8-sig", newline="")
+
+    try:
+        if formato == "csv":
+            leitor = csv.DictReader(texto)
+            for registro in leitor:
+                # Line of the record in the file (header is line 1)
+                linha = leitor.line_num
+                if None in registro:
+                    yield linha, None, "Quantidade de colunas maior que o cabeçalho"
+                    continue
+                yield linha, {k: (v if v != "" else None) for k, v in registro.items()}, None
+            return
+
+        for linha, conteudo in enumerate(texto, start=1):
+            if not conteudo.strip():
+                continue
+            try:
+                registro = json.loads(conteudo)
+            except json.JSONDecodeError as e:
+                yield linha, None, f"JSON inválido: {e.msg}"
+                continue
+            if not isinstance(registro, dict):
+                yield linha, None, "Cada linha deve ser um objeto JSON"
+                continue
+            yield linha, registro, None
+    finally:
+        # Leave the underlying upload open - its owner closes it
+        texto.detach()
+
+
+def _formatar_erros_validacao(erro: ValidationError) -> List[str]:
+    return [
+        f"{'.'.join(str(p) for p in detalhe['loc']) or 'registro'}: {detalhe['msg']}"
+        for detalhe in erro.errors()
+    ]
+
+
+class ImportacaoTicketsService:
+    """
+    📥 Bulk ticket importer
+
+    Rows failing validation are reported with their line number and never
+    reach the database; a batch failing at the database level is rolled back
+    on its own and reported, without affecting the batches already committed.
+    """
+
+    def importar(
+        self,
+        db: Session,
+        arquivo: BinaryIO,
+        formato: str,
+        tamanho_lote: int = 500,
+        max_erros: int = 1000,
+    ) -> Dict[str, Any]:
+        resultado = {
+            "total_linhas": 0,
+            "importados": 0,
+            "rejeitados": 0,
+            "lotes": 0,
+            "erros": [],
+            "erros_omitidos": 0,
+        }
+
+        def registrar_erro(linha: int, erros: List[str]):
+            resultado["rejeitados"] += 1
+            if len(resultado["erros"]) < max_erros:
+                resultado["erros"].append({"linha": linha, "erros": erros})
+            else:
+                resultado["erros_omitidos"] += 1
+
+        lote: List[Tuple[int, Dict[str, Any]]] = []
+
+        # Past deadlines only warn in TicketCreate; don't emit one warning per row
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+
+            for linha, registro, erro in iterar_registros(arquivo, formato):
+                resultado["total_linhas"] += 1
+                if erro:
+                    registrar_erro(linha, [erro])
+                    continue
+
+                try:
+                    ticket = TicketCreate.model_validate(registro)
+                except ValidationError as e:
+                    registrar_erro(linha, _formatar_erros_validacao(e))
+                    continue
+
+                lote.append((linha, self._linha_insert(ticket)))
+                if len(lote) >= tamanho_lote:
+                    self._inserir_lote(db, lote, resultado, registrar_erro)
+                    lote = []
+
+        if lote:
+            self._inserir_lote(db, lote, resultado, registrar_erro)
+
+        return resultado
+
+    def _linha_insert(self, ticket: TicketCreate) -> Dict[str, Any]:
+        agora = datetime.now(timezone.utc)
+        return {
+            "titulo": ticket.titulo,
+            "descricao": ticket.descricao,
+            "etapa": ticket.etapa,
+            "prazo": ticket.prazo,
+            "responsavel": ticket.responsavel,
+            "status": TicketStatus.PENDENTE.value,
+            "prioridade": ticket.prioridade.value,
+            "categoria": ticket.categoria.value,
+            "tags": ticket.tags,
+            "tempo_estimado": ticket.tempo_estimado,
+            "tempo_gasto": 0,
+            "criado_em": agora,
+            "atualizado_em": agora,
+        }
+
+    def _inserir_lote(self, db: Session, lote, resultado, registrar_erro):
+        """Insert one batch with a single executemany in its own transaction"""
+        linhas = [dados for _, dados in lote]
+        try:
+            ids = db.execute(
+                insert(TicketDB).returning(TicketDB.id, sort_by_parameter_order=True),
+                linhas,
+            ).scalars().all()
+            estatisticas_tickets_service.registrar_alteracoes(db, [], linhas)
+            rollups_tickets_service.registrar_alteracoes(db, [], linhas)
+            tags_tickets_service.sincronizar(
+                db,
+                {ticket_id: dados["tags"] for ticket_id, dados in zip(ids, linhas) if dados["tags"]},
+            )
+            versoes_tabelas_service.incrementar(db, TicketDB.__tablename__)
+            db.commit()
+            resultado["importados"] += len(linhas)
+            resultado["lotes"] += 1
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Ticket import batch failed ({len(linhas)} rows): {e}")
+            for numero_linha, _ in lote:
+                registrar_erro(numero_linha, [f"Erro ao gravar lote: {str(e)}"])
+
+
+# Global service instance
+importacao_tickets_service = ImportacaoTicketsService()
+
+__all__ = [
+    "ImportacaoTicketsService",
+    "importacao_tickets_service",
+    "detectar_formato",
+    "FORMATOS_SUPORTADOS",
+]
@@ -7,7 +7,7 @@ from datetime import datetime, date
 from enum import Enum
 from typing import List, Optional, Dict, Any
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 
 
 class TicketStatus(str, Enum):
@@ -117,6 +117,7 @@ class TicketUpdate(BaseModel):
     comentarios_internos: Optional[str] = Field(None, max_length=2000)
     tempo_gasto: Optional[int] = Field(None, ge=0, le=1000)
     tempo_estimado: Optional[int] = Field(None, ge=0, le=1000)
+    version: Optional[int] = Field(None, ge=1)  # Expected version (409 on mismatch)
 
     @field_validator("prazo")
     @classmethod
@@ -149,6 +150,8 @@ class Ticket(TicketBase):
     comentarios_internos: Optional[str] = None
     arquivo_anexo: Optional[str] = None
     tempo_gasto: Optional[int] = Field(default=0, ge=0)
+    comment_count: Optional[int] = None  # Only filled when requested (include_comment_count)
+    version: Optional[int] = None  # Send back in TicketUpdate.version for optimistic concurrency
 
     class Config:
         from_attributes = True
@@ -169,10 +172,12 @@ class TicketListResponse(BaseModel):
     """Response model for ticket listing with pagination"""
 
     tickets: List[Ticket]
-    total: int
+    total: Optional[int] = None  # Omitted in cursor mode unless requested
     page: int = 1
     per_page: int = 10
-    pages: int
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = None  # Opaque cursor for the next page (cursor mode)
+    has_more: Optional[bool] = None
 
     @classmethod
     def create(
@@ -184,6 +189,25 @@ class TicketListResponse(BaseModel):
             tickets=tickets, total=total, page=page, per_page=per_page, pages=pages
         )
 
+    @classmethod
+    def create_cursor(
+        cls,
+        tickets: List[Ticket],
+        next_cursor: Optional[str],
+        per_page: int = 10,
+        total: Optional[int] = None,
+    ):
+        """Create keyset-paginated response"""
+        pages = (total + per_page - 1) // per_page if total is not None else None
+        return cls(
+            tickets=tickets,
+            total=total,
+            per_page=per_page,
+            pages=pages,
+            next_cursor=next_cursor,
+            has_more=next_cursor is not None,
+        )
+
 
 class TicketComment(BaseModel):
     """Model for ticket comments"""
@@ -209,6 +233,7 @@ class TicketStats(BaseModel):
     cancelados: int
     por_prioridade: dict
     por_categoria: dict
+    por_status: Optional[dict] = None
     tempo_medio_conclusao: Optional[float] = None  # em horas
 
 
@@ -222,12 +247,38 @@ class TicketFilter(BaseModel):
     etapa: Optional[str] = None
     data_inicio: Optional[datetime] = None
     data_fim: Optional[datetime] = None
-    tags: Optional[str] = None
+    tags: Optional[str] = None  # Comma-separated
+    tags_modo: str = Field("any", pattern="^(any|all)$")
 
     class Config:
         use_enum_values = True
 
 
+class TicketBulkUpdate(BaseModel):
+    """Model for applying the same update to many tickets"""
+
+    ticket_ids: Optional[List[int]] = Field(None, min_length=1, max_length=10000)
+    filtro: Optional[TicketFilter] = None
+    todos: bool = False  # Explicit opt-in to update every ticket
+    alteracoes: TicketUpdate
+
+    @model_validator(mode="after")
+    def validate_selecao(self):
+        """Exactly one selector, a filter with criteria, and at least one field to change"""
+        seletores = [self.ticket_ids is not None, self.filtro is not None, self.todos]
+        if sum(seletores) != 1:
+            raise ValueError("Informe ticket_ids, filtro ou todos=true (apenas um)")
+        if self.filtro is not None and not any(
+            self.filtro.model_dump(exclude={"tags_modo"}).values()
+        ):
+            raise ValueError(
+                "Filtro sem critérios selecionaria todos os tickets - use todos=true"
+            )
+        if not self.alteracoes.model_dump(exclude_none=True, exclude={"version"}):
+            raise ValueError("Nenhum campo para atualizar em alteracoes")
+        return self
+
+
 # ===== CONTROLE MENSAL MODELS =====
 
 class Tarefa(BaseModel):
@@ -237,6 +288,7 @@ class Tarefa(BaseModel):
     nome_tarefa: str
     concluido: bool
     data_conclusao: Optional[datetime] = None
+    version: Optional[int] = None
 
     class Config:
         from_attributes = True
@@ -252,6 +304,8 @@ class ControleMensalDetalhado(BaseModel):
     id_empresa: int
     nome_empresa: str
     tarefas: List[Tarefa]
+    tarefas_total: int = 0
+    tarefas_concluidas: int = 0
 
     class Config:
         from_attributes = True
@@ -313,6 +367,28 @@ class TemplateAplicacao(BaseModel):
     empresas_ids: Optional[List[int]] = None  # If None, applies to all companies
 
 
+class TarefasBulkStatus(BaseModel):
+    """Model for completing/reopening many control tasks at once"""
+
+    concluido: bool
+    tarefa_ids: Optional[List[int]] = Field(None, min_length=1, max_length=10000)
+    # Alternative selector: the same template task in every company of a period
+    descricao_tarefa: Optional[str] = Field(None, min_length=1, max_length=200)
+    mes: Optional[int] = Field(None, ge=1, le=12)
+    ano: Optional[int] = Field(None, ge=2020, le=2030)
+    empresas_ids: Optional[List[int]] = None  # Restricts the period selector
+
+    @model_validator(mode="after")
+    def validate_selecao(self):
+        """Either tarefa_ids or descricao_tarefa + ano + mes"""
+        por_periodo = self.descricao_tarefa is not None
+        if (self.tarefa_ids is None) == (not por_periodo):
+            raise ValueError("Informe tarefa_ids ou descricao_tarefa com ano e mes (apenas um)")
+        if por_periodo and (self.ano is None or self.mes is None):
+            raise ValueError("descricao_tarefa exige ano e mes")
+        return self
+
+
 # ===== PAYROLL AUDIT MODELS =====
 
 class FuncionarioDivergencia(BaseModel):
@@ -340,6 +416,7 @@ class ProcessamentoFolhaResponse(BaseModel):
     criado_em: datetime
     concluido_em: Optional[datetime] = None
     divergencias: List[FuncionarioDivergencia] = []
+    mensagem_erro: Optional[str] = None
     
     class Config:
         from_attributes = True
@@ -0,0 +1,194 @@
+"""
+Portal Demandas Keyset Pagination
+Opaque cursor helpers for keyset (seek) pagination over (sort column, id)
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from sqlalchemy import asc, desc, or_
+
+
+class CursorInvalidoError(ValueError):
+    """Raised when a pagination cursor cannot be decoded or does not match the query"""
+
+
+def codificar_cursor(sort_by: str, sort_order: str, valor: Any, ultimo_id: int) -> str:
+    """
+    Encode the last row of a page as an opaque, URL-safe cursor
+
+    The cursor carries the sort column and direction so that a client cannot
+    reuse it with a different ordering.
+    """
+    if isinstance(valor, datetime):
+        valor = {"dt": valor.isoformat()}
+
+    payload = json.dumps(
+        {"s": sort_by, "o": sort_order, "v": valor, "id": ultimo_id},
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: str, sort_by: str, sort_order: str) -> Tuple[Any, int]:
+    """
+    Decode a cursor produced by codificar_cursor
+
+    Returns:
+        Tuple (sort value, id) of the last row already delivered
+    """
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(cursor + padding).decode("utf-8"))
+        valor = payload["v"]
+        ultimo_id = int(payload["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise CursorInvalidoError(f"Cursor inválido: {e}")
+
+    if payload.get("s") != sort_by or payload.get("o") != sort_order:
+        raise CursorInvalidoError(
+            "Cursor gerado com outra ordenação - reinicie a paginação"
+        )
+
+    if isinstance(valor, dict) and "dt" in valor:
+        valor = datetime.fromisoformat(valor["dt"])
+
+    return valor, ultimo_id
+
+
+def aplicar_keyset(query, coluna, coluna_id, sort_order: str, cursor_valor: Optional[Tuple[Any, int]]):
+    """
+    Order the query by (coluna, id) and seek past the cursor position
+
+    Uses "col <= v AND (col < v OR id < last_id)" instead of OFFSET: the
+    leading bound is a plain range on the (col, id) index, so deep pages cost
+    the same as the first one (a bare OR is planned as a scan by SQLite when
+    the values are bound parameters).
+    """
+    descendente = sort_order.lower() == "desc"
+    ordem = desc if descendente else asc
+
+    if cursor_valor is not None:
+        valor, ultimo_id = cursor_valor
+        if descendente:
+            query = query.filter(
+                coluna <= valor, or_(coluna < valor, coluna_id < ultimo_id)
+            )
+        else:
+            query = query.filter(
+                coluna >= valor, or_(coluna > valor, coluna_id > ultimo_id)
+            )
+
+    return query.order_by(ordem(coluna), ordem(coluna_id))
+
+
+if __name__ == "__main__":
+    # Benchmark: OFFSET vs keyset for page 1 and a deep page
+    #   python -m portal_demandas.paginacao [--linhas 1000000] [--url sqlite:///...]
+    # Seeds its own tickets table (default: a SQLite file in the temp dir) so it
+    # never touches the application database.
+    import argparse
+    import os
+    import tempfile
+    import time
+    from datetime import timedelta
+
+    from sqlalchemy import create_engine, func, insert
+    from sqlalchemy.orm import Session
+
+    try:
+        from db import TicketDB
+    except ImportError:
+        from .db import TicketDB
+
+    parser = argparse.ArgumentParser(description="Benchmark OFFSET vs cursor pagination")
+    parser.add_argument("--linhas", type=int, default=1_000_000)
+    parser.add_argument("--por-pagina", type=int, default=50)
+    parser.add_argument("--paginas", type=int, nargs="+", default=[1, 1000])
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument(
+        "--url",
+        default=f"sqlite:///{os.path.join(tempfile.gettempdir(), 'auditoria360_bench_paginacao.db')}",
+    )
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    TicketDB.__table__.create(engine, checkfirst=True)
+    for indice in TicketDB.__table__.indexes:
+        indice.create(engine, checkfirst=True)
+
+    with Session(engine) as sessao:
+        existentes = sessao.query(func.count(TicketDB.id)).scalar()
+        if existentes < args.linhas:
+            print(f"Seeding {args.linhas - existentes} tickets...")
+            base = datetime(2020, 1, 1)
+            lote = []
+            for indice in range(existentes, args.linhas):
+                criado_em = base + timedelta(seconds=indice * 7 % (args.linhas * 3))
+                lote.append({
+                    "titulo": f"Ticket {indice}",
+                    "etapa": "Etapa",
+                    "prazo": criado_em + timedelta(days=10),
+                    "responsavel": f"Responsavel {indice % 50}",
+                    "status": "pendente",
+                    "criado_em": criado_em,
+                    "atualizado_em": criado_em,
+                    "version": 1,
+                })
+                if len(lote) == 10_000:
+                    sessao.execute(insert(TicketDB), lote)
+                    lote = []
+            if lote:
+                sessao.execute(insert(TicketDB), lote)
+            sessao.commit()
+
+        def cronometrar(consulta) -> float:
+            melhor = None
+            for _ in range(args.repeticoes):
+                inicio = time.perf_counter()
+                consulta()
+                decorrido = time.perf_counter() - inicio
+                melhor = decorrido if melhor is None else min(melhor, decorrido)
+            return melhor * 1000
+
+        print(f"{args.linhas} tickets, {args.por_pagina} per page, ordered by criado_em desc, id desc")
+        print(f"{'pagina':>7} {'offset (ms)':>12} {'cursor (ms)':>12}")
+        for pagina in args.paginas:
+            offset = (pagina - 1) * args.por_pagina
+
+            def por_offset():
+                return (
+                    sessao.query(TicketDB)
+                    .order_by(desc(TicketDB.criado_em), desc(TicketDB.id))
+                    .offset(offset)
+                    .limit(args.por_pagina)
+                    .all()
+                )
+
+            # Cursor of the previous page's last row (what the client would send)
+            posicao = None
+            if offset:
+                anterior = (
+                    sessao.query(TicketDB.criado_em, TicketDB.id)
+                    .order_by(desc(TicketDB.criado_em), desc(TicketDB.id))
+                    .offset(offset - 1)
+                    .limit(1)
+                    .one()
+                )
+                cursor = codificar_cursor("criado_em", "desc", anterior.criado_em, anterior.id)
+                posicao = decodificar_cursor(cursor, "criado_em", "desc")
+
+            def por_cursor():
+                return (
+                    aplicar_keyset(
+                        sessao.query(TicketDB), TicketDB.criado_em, TicketDB.id, "desc", posicao
+                    )
+                    .limit(args.por_pagina + 1)
+                    .all()
+                )
+
+            assert [t.id for t in por_offset()] == [t.id for t in por_cursor()[: args.por_pagina]]
+            print(f"{pagina:>7} {cronometrar(por_offset):>12.2f} {cronometrar(por_cursor):>12.2f}")
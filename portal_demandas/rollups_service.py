@@ -0,0 +1,291 @@
+"""
+RollupsService - Daily pre-aggregated ticket analytics
+Serves opened/closed time series without scanning `tickets`
+
+The TicketsRollupDiario table holds one row per (dia, status, prioridade,
+categoria, responsavel). Ticket write paths pass the same before/after
+snapshots used by the /stats/ counters and the deltas are applied in the
+caller's transaction; a backfill rebuilds the table (or a date range of it)
+from `tickets` and `tickets_arquivados`.
+
+- abertos: tickets created on `dia` (date of criado_em)
+- fechados: tickets in a final status (concluido/cancelado) whose last update
+  happened on `dia` (date of atualizado_em) - tickets have no closing
+  timestamp, so the last update of a closed ticket stands for its closing day
+
+Usage (backfill command):
+    python -m portal_demandas.rollups_service [--desde AAAA-MM-DD]
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import func, insert, update
+from sqlalchemy.orm import Session
+
+try:
+    from db import TicketArquivadoDB, TicketDB, TicketRollupDiarioDB
+except ImportError:
+    from .db import TicketArquivadoDB, TicketDB, TicketRollupDiarioDB
+
+try:
+    from models import TicketStatus
+except ImportError:
+    from .models import TicketStatus
+
+logger = logging.getLogger(__name__)
+
+STATUS_FINAIS = (TicketStatus.CONCLUIDO.value, TicketStatus.CANCELADO.value)
+
+DIMENSOES_ROLLUP = ("status", "prioridade", "categoria", "responsavel")
+
+GRANULARIDADES = ("dia", "semana", "mes")
+
+
+def _como_data(valor) -> Optional[date]:
+    """Normalize datetimes, dates and ISO strings (SQLite date()) to a date"""
+    if valor is None:
+        return None
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return date.fromisoformat(str(valor)[:10])
+
+
+def inicio_periodo(dia: date, granularidade: str) -> date:
+    """First day of the bucket containing `dia` (weeks start on Monday)"""
+    if granularidade == "semana":
+        return dia - timedelta(days=dia.weekday())
+    if granularidade == "mes":
+        return dia.replace(day=1)
+    return dia
+
+
+class RollupsTicketsService:
+    """
+    📈 Daily ticket rollups
+
+    Same maintenance model as the /stats/ counters: deltas between snapshots,
+    applied with UPDATE ... SET col = col + delta (row created on first use).
+    """
+
+    def registrar_alteracoes(
+        self,
+        db: Session,
+        antes: Iterable[Dict[str, Any]],
+        depois: Iterable[Dict[str, Any]],
+    ):
+        """Apply the rollup deltas between two sets of snapshots (before commit)"""
+        deltas = defaultdict(lambda: [0, 0])
+        for snapshot in antes:
+            self._acumular(deltas, snapshot, -1)
+        for snapshot in depois:
+            self._acumular(deltas, snapshot, 1)
+
+        self._aplicar_deltas(db, deltas)
+
+    def _chave(self, dia: date, snapshot: Dict[str, Any]) -> tuple:
+        return (
+            dia,
+            snapshot.get("status") or "",
+            snapshot.get("prioridade") or "",
+            snapshot.get("categoria") or "",
+            snapshot.get("responsavel") or "",
+        )
+
+    def _acumular(self, deltas, snapshot: Dict[str, Any], sinal: int):
+        criado = _como_data(snapshot.get("criado_em"))
+        if criado:
+            deltas[self._chave(criado, snapshot)][0] += sinal
+
+        atualizado = _como_data(snapshot.get("atualizado_em"))
+        if atualizado and snapshot.get("status") in STATUS_FINAIS:
+            deltas[self._chave(atualizado, snapshot)][1] += sinal
+
+    def _aplicar_deltas(self, db: Session, deltas):
+        # Sorted keys keep lock acquisition order stable across transactions
+        for chave, (abertos, fechados) in sorted(deltas.items()):
+            if not (abertos or fechados):
+                continue
+
+            dia, status, prioridade, categoria, responsavel = chave
+            result = db.execute(
+                update(TicketRollupDiarioDB)
+                .where(TicketRollupDiarioDB.dia == dia)
+                .where(TicketRollupDiarioDB.status == status)
+                .where(TicketRollupDiarioDB.prioridade == prioridade)
+                .where(TicketRollupDiarioDB.categoria == categoria)
+                .where(TicketRollupDiarioDB.responsavel == responsavel)
+                .values(
+                    abertos=TicketRollupDiarioDB.abertos + abertos,
+                    fechados=TicketRollupDiarioDB.fechados + fechados,
+                )
+            )
+            if result.rowcount == 0:
+                db.execute(
+                    insert(TicketRollupDiarioDB).values(
+                        dia=dia,
+                        status=status,
+                        prioridade=prioridade,
+                        categoria=categoria,
+                        responsavel=responsavel,
+                        abertos=abertos,
+                        fechados=fechados,
+                    )
+                )
+
+    def backfill(self, db: Session, desde: Optional[date] = None) -> Dict[str, Any]:
+        """
+        Rebuild the rollups from `tickets` and `tickets_arquivados`
+        (everything, or from `desde` on)
+
+        Runs two GROUP BY queries per table and replaces the affected rows in
+        a single transaction. Meant for the initial load and for repairs; run
+        it while ticket writes are quiet.
+        """
+        linhas = defaultdict(lambda: [0, 0])
+        inicio = datetime.combine(desde, datetime.min.time()) if desde else None
+
+        # Archived tickets are closed history and still count in the series
+        for modelo in (TicketDB, TicketArquivadoDB):
+            dimensoes = [
+                func.coalesce(getattr(modelo, coluna), "") for coluna in DIMENSOES_ROLLUP
+            ]
+
+            dia_criacao = func.date(modelo.criado_em)
+            abertos = db.query(dia_criacao, *dimensoes, func.count(modelo.id))
+            if inicio:
+                abertos = abertos.filter(modelo.criado_em >= inicio)
+            for dia, *chave, quantidade in abertos.group_by(dia_criacao, *dimensoes):
+                linhas[(_como_data(dia), *chave)][0] += int(quantidade)
+
+            dia_fechamento = func.date(modelo.atualizado_em)
+            fechados = db.query(dia_fechamento, *dimensoes, func.count(modelo.id)).filter(
+                modelo.status.in_(STATUS_FINAIS)
+            )
+            if inicio:
+                fechados = fechados.filter(modelo.atualizado_em >= inicio)
+            for dia, *chave, quantidade in fechados.group_by(dia_fechamento, *dimensoes):
+                linhas[(_como_data(dia), *chave)][1] += int(quantidade)
+
+        remocao = db.query(TicketRollupDiarioDB)
+        if desde:
+            remocao = remocao.filter(TicketRollupDiarioDB.dia >= desde)
+        removidas = remocao.delete(synchronize_session=False)
+
+        if linhas:
+            db.execute(
+                insert(TicketRollupDiarioDB),
+                [
+                    {
+                        "dia": dia,
+                        "status": status,
+                        "prioridade": prioridade,
+                        "categoria": categoria,
+                        "responsavel": responsavel,
+                        "abertos": quantidade_abertos,
+                        "fechados": quantidade_fechados,
+                    }
+                    for (dia, status, prioridade, categoria, responsavel), (
+                        quantidade_abertos,
+                        quantidade_fechados,
+                    ) in linhas.items()
+                ],
+            )
+        db.commit()
+
+        logger.info(f"Ticket rollups rebuilt: {len(linhas)} rows (desde={desde})")
+        return {
+            "desde": desde.isoformat() if desde else None,
+            "linhas_removidas": removidas,
+            "linhas_gravadas": len(linhas),
+        }
+
+    def inicializar(self, db: Session):
+        """Load the rollups on first start after the table is created"""
+        if db.query(TicketRollupDiarioDB).first() is None and db.query(TicketDB.id).first():
+            self.backfill(db)
+
+    def serie_temporal(
+        self,
+        db: Session,
+        inicio: date,
+        fim: date,
+        granularidade: str = "dia",
+        agrupar_por: Optional[str] = None,
+        filtros: Optional[Dict[str, Optional[str]]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Opened/closed tickets per period (and per group) between inicio and fim
+
+        Reads only the rollup rows of the range; weekly/monthly buckets are
+        summed from the daily rows.
+        """
+        colunas = [TicketRollupDiarioDB.dia]
+        if agrupar_por:
+            colunas.append(getattr(TicketRollupDiarioDB, agrupar_por))
+
+        query = db.query(
+            *colunas,
+            func.sum(TicketRollupDiarioDB.abertos),
+            func.sum(TicketRollupDiarioDB.fechados),
+        ).filter(TicketRollupDiarioDB.dia >= inicio, TicketRollupDiarioDB.dia <= fim)
+
+        for coluna, valor in (filtros or {}).items():
+            if valor:
+                query = query.filter(getattr(TicketRollupDiarioDB, coluna) == valor)
+
+        series = defaultdict(lambda: [0, 0])
+        for linha in query.group_by(*colunas):
+            dia = _como_data(linha[0])
+            grupo = linha[1] if agrupar_por else None
+            abertos, fechados = linha[-2], linha[-1]
+            bucket = series[(inicio_periodo(dia, granularidade), grupo)]
+            bucket[0] += int(abertos or 0)
+            bucket[1] += int(fechados or 0)
+
+        return [
+            {
+                "periodo": periodo.isoformat(),
+                **({"grupo": grupo} if agrupar_por else {}),
+                "abertos": abertos,
+                "fechados": fechados,
+            }
+            for (periodo, grupo), (abertos, fechados) in sorted(
+                series.items(), key=lambda item: (item[0][0], item[0][1] or "")
+            )
+        ]
+
+
+# Global service instance
+rollups_tickets_service = RollupsTicketsService()
+
+__all__ = [
+    "RollupsTicketsService",
+    "rollups_tickets_service",
+    "DIMENSOES_ROLLUP",
+    "GRANULARIDADES",
+    "STATUS_FINAIS",
+]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rebuild the daily ticket rollups")
+    parser.add_argument(
+        "--desde", type=date.fromisoformat, default=None, help="Rebuild only from this day on (AAAA-MM-DD)"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        from db import SessionLocal
+    except ImportError:
+        from .db import SessionLocal
+
+    with SessionLocal() as sessao:
+        print(rollups_tickets_service.backfill(sessao, desde=args.desde))
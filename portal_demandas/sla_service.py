@@ -0,0 +1,157 @@
+"""
+SlaService - Overdue / at-risk tickets by prazo
+Answers "which open tickets are past or near their deadline" from the
+(status, prazo) index instead of listing everything client-side
+
+- atrasados: open tickets with prazo < now
+- em risco: open tickets with now <= prazo < now + N hours
+
+Deadlines are compared as naive UTC, like the timestamps the models default to.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+try:
+    from db import TicketDB
+except ImportError:
+    from .db import TicketDB
+
+try:
+    from models import TicketStatus
+except ImportError:
+    from .models import TicketStatus
+
+logger = logging.getLogger(__name__)
+
+# Statuses still subject to the deadline
+STATUS_ABERTOS = (
+    TicketStatus.PENDENTE.value,
+    TicketStatus.EM_ANDAMENTO.value,
+    TicketStatus.AGUARDANDO.value,
+)
+
+
+def agora_utc() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class SlaTicketsService:
+    """
+    ⏰ Deadline tracking over open tickets
+
+    Every query filters on status IN (open statuses) plus a prazo range, which
+    the composite ix_tickets_status_prazo index serves as a handful of range
+    scans - closed tickets (the bulk of the table over time) are never read.
+    """
+
+    def _abertos(self, query, responsavel: Optional[str] = None):
+        query = query.filter(TicketDB.status.in_(STATUS_ABERTOS))
+        if responsavel:
+            query = query.filter(TicketDB.responsavel == responsavel)
+        return query
+
+    def contar(self, db: Session, horas: int, responsavel: Optional[str] = None) -> Dict[str, Any]:
+        """Overdue and due-within-N-hours counts (index-only range counts)"""
+        agora = agora_utc()
+        limite = agora + timedelta(hours=horas)
+
+        atrasados = (
+            self._abertos(db.query(func.count(TicketDB.id)), responsavel)
+            .filter(TicketDB.prazo < agora)
+            .scalar()
+        )
+        vencendo = (
+            self._abertos(db.query(func.count(TicketDB.id)), responsavel)
+            .filter(TicketDB.prazo >= agora, TicketDB.prazo < limite)
+            .scalar()
+        )
+
+        return {
+            "atrasados": int(atrasados or 0),
+            "vencendo": int(vencendo or 0),
+            "horas": horas,
+            "referencia": agora.isoformat(),
+        }
+
+    def por_responsavel(
+        self, db: Session, horas: int, responsavel: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Overdue / at-risk aggregation per responsavel, most overdue first"""
+        agora = agora_utc()
+        limite = agora + timedelta(hours=horas)
+
+        atrasado = TicketDB.prazo < agora
+        linhas = (
+            self._abertos(
+                db.query(
+                    TicketDB.responsavel,
+                    func.sum(case((atrasado, 1), else_=0)),
+                    func.sum(case((atrasado, 0), else_=1)),
+                    func.min(TicketDB.prazo),
+                ),
+                responsavel,
+            )
+            .filter(TicketDB.prazo < limite)
+            .group_by(TicketDB.responsavel)
+            .all()
+        )
+
+        resultado = []
+        for nome, atrasados, em_risco, prazo_mais_antigo in linhas:
+            if isinstance(prazo_mais_antigo, str):
+                prazo_mais_antigo = datetime.fromisoformat(prazo_mais_antigo)
+            resultado.append(
+                {
+                    "responsavel": nome,
+                    "atrasados": int(atrasados or 0),
+                    "em_risco": int(em_risco or 0),
+                    "prazo_mais_antigo": prazo_mais_antigo.isoformat() if prazo_mais_antigo else None,
+                    "maior_atraso_horas": (
+                        round((agora - prazo_mais_antigo).total_seconds() / 3600, 1)
+                        if prazo_mais_antigo and prazo_mais_antigo < agora
+                        else 0
+                    ),
+                }
+            )
+
+        resultado.sort(key=lambda item: (-item["atrasados"], -item["em_risco"], item["responsavel"]))
+        return resultado
+
+    def listar(
+        self,
+        db: Session,
+        horas: int,
+        situacao: str = "todos",
+        responsavel: Optional[str] = None,
+        limite: int = 50,
+    ) -> List[TicketDB]:
+        """
+        Open tickets due before now + N hours, earliest deadline first
+
+        Args:
+            situacao: atrasados, em_risco or todos
+        """
+        agora = agora_utc()
+        query = self._abertos(db.query(TicketDB), responsavel)
+
+        if situacao == "atrasados":
+            query = query.filter(TicketDB.prazo < agora)
+        elif situacao == "em_risco":
+            query = query.filter(
+                TicketDB.prazo >= agora, TicketDB.prazo < agora + timedelta(hours=horas)
+            )
+        else:
+            query = query.filter(TicketDB.prazo < agora + timedelta(hours=horas))
+
+        return query.order_by(TicketDB.prazo.asc(), TicketDB.id.asc()).limit(limite).all()
+
+
+# Global service instance
+sla_tickets_service = SlaTicketsService()
+
+__all__ = ["SlaTicketsService", "sla_tickets_service", "STATUS_ABERTOS", "agora_utc"]
@@ -0,0 +1,175 @@
+"""
+TagsService - Normalized tag index for tickets
+Keeps the ticket_tags association table in sync with TicketDB.tags
+
+TicketDB.tags stays the display value (comma-separated string); ticket_tags
+holds one lowercased row per (ticket, tag), indexed by tag, so tag filters and
+tag cardinality are index lookups instead of LIKE scans over `tickets`.
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+try:
+    from db import TicketArquivadoDB, TicketDB, TicketTagDB
+except ImportError:
+    from .db import TicketArquivadoDB, TicketDB, TicketTagDB
+
+logger = logging.getLogger(__name__)
+
+TAG_MAX_LENGTH = 50
+
+MODOS_FILTRO = ("any", "all")
+
+
+def normalizar_tags(valor) -> List[str]:
+    """
+    Split, trim, lowercase and de-duplicate tags (order preserved)
+
+    Accepts a comma-separated string or a list of strings (each item may
+    itself contain commas, as repeated query parameters often do).
+    """
+    if not valor:
+        return []
+    partes = [valor] if isinstance(valor, str) else list(valor)
+
+    tags = []
+    for parte in partes:
+        for tag in str(parte).split(","):
+            tag = tag.strip().lower()[:TAG_MAX_LENGTH]
+            if tag and tag not in tags:
+                tags.append(tag)
+    return tags
+
+
+class TagsTicketsService:
+    """
+    🏷️ Ticket tag association maintenance and queries
+
+    Every write path that sets TicketDB.tags calls sincronizar() in the same
+    transaction; the backfill rebuilds the table from the strings for rows
+    written before it existed.
+    """
+
+    def sincronizar(self, db: Session, tags_por_ticket: Dict[int, Optional[str]]):
+        """Replace the tag rows of the given tickets (None/"" clears them)"""
+        if not tags_por_ticket:
+            return
+
+        db.execute(
+            delete(TicketTagDB).where(TicketTagDB.ticket_id.in_(list(tags_por_ticket)))
+        )
+        linhas = [
+            {"ticket_id": ticket_id, "tag": tag}
+            for ticket_id, tags in tags_por_ticket.items()
+            for tag in normalizar_tags(tags)
+        ]
+        if linhas:
+            db.execute(insert(TicketTagDB), linhas)
+
+    def remover(self, db: Session, ticket_ids: Iterable[int]):
+        """Drop the tag rows of deleted tickets"""
+        ticket_ids = list(ticket_ids)
+        if ticket_ids:
+            db.execute(delete(TicketTagDB).where(TicketTagDB.ticket_id.in_(ticket_ids)))
+
+    def criterio_tags(self, tags, modo: str = "any", coluna_id=None):
+        """
+        Build a ticket filter for the given tags
+
+        any: ticket has at least one of the tags
+        all: ticket has every one of the tags
+        coluna_id: id column to filter (default TicketDB.id; archived tickets keep their tags)
+        Returns None when there are no usable tags.
+        """
+        tags = normalizar_tags(tags)
+        if not tags:
+            return None
+
+        ids = select(TicketTagDB.ticket_id).where(TicketTagDB.tag.in_(tags))
+        if modo == "all" and len(tags) > 1:
+            ids = ids.group_by(TicketTagDB.ticket_id).having(
+                func.count(TicketTagDB.tag) == len(tags)
+            )
+        return (TicketDB.id if coluna_id is None else coluna_id).in_(ids)
+
+    def cardinalidade(
+        self, db: Session, prefixo: Optional[str] = None, limite: int = 100
+    ) -> List[Dict[str, Any]]:
+        """Tickets per tag, most used first"""
+        quantidade = func.count(TicketTagDB.ticket_id)
+        query = db.query(TicketTagDB.tag, quantidade).group_by(TicketTagDB.tag)
+        if prefixo:
+            prefixo = prefixo.strip().lower()
+            query = query.filter(TicketTagDB.tag.like(f"{prefixo}%"))
+
+        linhas = query.order_by(quantidade.desc(), TicketTagDB.tag).limit(limite).all()
+        return [{"tag": tag, "quantidade": int(total)} for tag, total in linhas]
+
+    def backfill(self, db: Session, tamanho_lote: int = 1000) -> Dict[str, Any]:
+        """
+        Rebuild ticket_tags from TicketDB.tags in primary-key batches
+
+        Idempotent: each batch replaces the rows of its tickets, and each
+        batch is committed on its own so the job can be re-run after a failure.
+        """
+        resultado = {"tickets_processados": 0, "tags_gravadas": 0, "lotes": 0, "orfas_removidas": 0}
+        ultimo_id = 0
+
+        while True:
+            lote = (
+                db.query(TicketDB.id, TicketDB.tags)
+                .filter(TicketDB.id > ultimo_id)
+                .order_by(TicketDB.id)
+                .limit(tamanho_lote)
+                .all()
+            )
+            if not lote:
+                break
+            ultimo_id = lote[-1].id
+
+            tags_por_ticket = {ticket_id: tags for ticket_id, tags in lote}
+            self.sincronizar(db, tags_por_ticket)
+            db.commit()
+
+            resultado["tickets_processados"] += len(lote)
+            resultado["tags_gravadas"] += sum(
+                len(normalizar_tags(tags)) for tags in tags_por_ticket.values()
+            )
+            resultado["lotes"] += 1
+
+        # Rows left behind by tickets deleted outside the API (archived tickets keep theirs)
+        orfas = db.execute(
+            delete(TicketTagDB)
+            .where(TicketTagDB.ticket_id.not_in(select(TicketDB.id)))
+            .where(TicketTagDB.ticket_id.not_in(select(TicketArquivadoDB.id)))
+        ).rowcount
+        db.commit()
+        resultado["orfas_removidas"] = orfas
+
+        logger.info(
+            f"Ticket tags backfill: {resultado['tickets_processados']} tickets, "
+            f"{resultado['tags_gravadas']} tags"
+        )
+        return resultado
+
+    def inicializar(self, db: Session):
+        """Backfill on first start after the association table is created"""
+        if db.query(TicketTagDB).first() is not None:
+            return
+        if db.query(TicketDB.id).filter(TicketDB.tags.isnot(None), TicketDB.tags != "").first():
+            self.backfill(db)
+
+
+# Global service instance
+tags_tickets_service = TagsTicketsService()
+
+__all__ = [
+    "TagsTicketsService",
+    "tags_tickets_service",
+    "normalizar_tags",
+    "MODOS_FILTRO",
+]
@@ -0,0 +1,181 @@
+"""
+TemplatesService - In-process registry of control templates per tenant
+Serves GET /v1/templates and template applications from memory
+
+A tenant's templates are loaded with one query (templates LEFT JOIN their
+tasks) and kept with the tenant's version from VersoesTabelas
+("TemplatesControle:<contabilidade_id>"). criar_template bumps that version
+in its transaction and drops the local entry after commit; other replicas
+notice the new version when they revalidate (at most every
+PORTAL_TEMPLATES_REVALIDAR seconds), so most reads never reach the database.
+
+Templates are immutable once created (no update endpoint), so a cached
+template's tasks never go stale - only the set of templates does.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+try:
+    from db import TemplateControleDB, TemplateControleTarefaDB
+except ImportError:
+    from .db import TemplateControleDB, TemplateControleTarefaDB
+
+try:
+    from models import TemplateControle
+except ImportError:
+    from .models import TemplateControle
+
+try:
+    from versoes_service import versoes_tabelas_service
+except ImportError:
+    from .versoes_service import versoes_tabelas_service
+
+logger = logging.getLogger(__name__)
+
+
+def tabela_versao_templates(contabilidade_id: int) -> str:
+    """VersoesTabelas key of a tenant's templates"""
+    return f"{TemplateControleDB.__tablename__}:{contabilidade_id}"
+
+
+class _TemplatesTenant:
+    """Loaded templates of one tenant, in id order"""
+
+    def __init__(self, versao: int, templates: Dict[int, TemplateControle]):
+        self.versao = versao
+        self.templates = templates
+        self.verificado_em = time.monotonic()
+
+
+class RegistroTemplates:
+    """
+    📋 Per-tenant template registry with version-based invalidation
+
+    Thread-safe; loads happen outside the lock (a concurrent duplicate load
+    is harmless, the newest version wins).
+    """
+
+    def __init__(self):
+        self.intervalo_revalidacao = float(os.getenv("PORTAL_TEMPLATES_REVALIDAR", "5"))
+        self._tenants: Dict[int, _TemplatesTenant] = {}
+        self._tenant_por_template: Dict[int, int] = {}
+        self._lock = threading.Lock()
+        self.metricas = {"hits": 0, "carregamentos": 0, "revalidacoes": 0}
+
+    def listar(self, db: Session, contabilidade_id: int) -> List[TemplateControle]:
+        """All templates of a tenant (with their tasks)"""
+        return list(self._tenant(db, contabilidade_id).templates.values())
+
+    def obter(
+        self, db: Session, contabilidade_id: int, template_id: int
+    ) -> Optional[TemplateControle]:
+        """One template of a tenant, or None if it doesn't exist / belongs to another tenant"""
+        tenant = self._tenant(db, contabilidade_id)
+        template = tenant.templates.get(template_id)
+        if template is None:
+            # Possibly created on another replica since the last revalidation
+            tenant = self._tenant(db, contabilidade_id, forcar_revalidacao=True)
+            template = tenant.templates.get(template_id)
+        return template
+
+    def localizar(self, db: Session, template_id: int) -> Optional[TemplateControle]:
+        """A template by id alone (the tenant is looked up once, then remembered)"""
+        with self._lock:
+            contabilidade_id = self._tenant_por_template.get(template_id)
+        if contabilidade_id is None:
+            contabilidade_id = (
+                db.query(TemplateControleDB.contabilidade_id)
+                .filter(TemplateControleDB.id == template_id)
+                .scalar()
+            )
+            if contabilidade_id is None:
+                return None
+        return self.obter(db, contabilidade_id, template_id)
+
+    def registrar_alteracao(self, db: Session, contabilidade_id: int):
+        """Bump the tenant's template version (inside the writer's transaction)"""
+        versoes_tabelas_service.incrementar(db, tabela_versao_templates(contabilidade_id))
+
+    def descartar(self, contabilidade_id: int):
+        """Drop the tenant's local entry (after the writer committed)"""
+        with self._lock:
+            self._tenants.pop(contabilidade_id, None)
+
+    def _tenant(
+        self, db: Session, contabilidade_id: int, forcar_revalidacao: bool = False
+    ) -> _TemplatesTenant:
+        with self._lock:
+            tenant = self._tenants.get(contabilidade_id)
+
+        if tenant is not None:
+            if not forcar_revalidacao and (
+                time.monotonic() - tenant.verificado_em < self.intervalo_revalidacao
+            ):
+                self.metricas["hits"] += 1
+                return tenant
+
+            self.metricas["revalidacoes"] += 1
+            versao = versoes_tabelas_service.obter(db, tabela_versao_templates(contabilidade_id))
+            if versao == tenant.versao:
+                tenant.verificado_em = time.monotonic()
+                return tenant
+
+        return self._carregar(db, contabilidade_id)
+
+    def _carregar(self, db: Session, contabilidade_id: int) -> _TemplatesTenant:
+        # Version first: a template created meanwhile only makes the entry
+        # look older than it is, never newer
+        versao = versoes_tabelas_service.obter(db, tabela_versao_templates(contabilidade_id))
+
+        linhas = (
+            db.query(TemplateControleDB, TemplateControleTarefaDB.descricao_tarefa)
+            .outerjoin(
+                TemplateControleTarefaDB,
+                TemplateControleTarefaDB.template_id == TemplateControleDB.id,
+            )
+            .filter(TemplateControleDB.contabilidade_id == contabilidade_id)
+            .order_by(TemplateControleDB.id, TemplateControleTarefaDB.id)
+            .all()
+        )
+
+        templates: Dict[int, TemplateControle] = {}
+        for template_db, descricao_tarefa in linhas:
+            template = templates.get(template_db.id)
+            if template is None:
+                template = templates[template_db.id] = TemplateControle(
+                    id=template_db.id,
+                    contabilidade_id=template_db.contabilidade_id,
+                    nome_template=template_db.nome_template,
+                    descricao=template_db.descricao,
+                    criado_em=template_db.criado_em,
+                    tarefas=[],
+                )
+            if descricao_tarefa is not None:
+                template.tarefas.append(descricao_tarefa)
+
+        tenant = _TemplatesTenant(versao, templates)
+        with self._lock:
+            atual = self._tenants.get(contabilidade_id)
+            if atual is None or atual.versao <= versao:
+                self._tenants[contabilidade_id] = tenant
+            for template_id in templates:
+                self._tenant_por_template[template_id] = contabilidade_id
+
+        self.metricas["carregamentos"] += 1
+        logger.info(
+            f"Template registry loaded for contabilidade {contabilidade_id}: "
+            f"{len(templates)} templates (versao {versao})"
+        )
+        return tenant
+
+
+# Global service instance
+registro_templates = RegistroTemplates()
+
+__all__ = ["RegistroTemplates", "registro_templates", "tabela_versao_templates"]
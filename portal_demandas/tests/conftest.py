@@ -0,0 +1,104 @@
+"""
+Fixtures for the portal_demandas API tests
+Run against the database configured in src.models.database (Postgres in CI);
+each test creates its own rows with unique names
+"""
+
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from portal_demandas import api
+from portal_demandas.db import (
+    ContabilidadeDB,
+    ControleMensalDB,
+    EmpresaDB,
+    SessionLocal,
+    TarefaControleDB,
+)
+
+
+@pytest.fixture(scope="session")
+def client():
+    # Context manager: runs the app lifespan (table/counter initialization)
+    with TestClient(api.app) as cliente:
+        yield cliente
+
+
+@pytest.fixture
+def sessao():
+    with SessionLocal() as db:
+        yield db
+
+
+@pytest.fixture
+def contabilidade(sessao):
+    """A fresh tenant, so tests never see each other's companies"""
+    sufixo = uuid.uuid4().hex[:12]
+    registro = ContabilidadeDB(nome_contabilidade=f"Contabilidade {sufixo}", cnpj=sufixo)
+    sessao.add(registro)
+    sessao.commit()
+    return registro
+
+
+@pytest.fixture
+def contabilidade_padrao(sessao):
+    """
+    Tenant 1 - the tenant endpoints still hardcode (contabilidade_id = 1)
+    """
+    registro = sessao.get(ContabilidadeDB, 1)
+    if registro is None:
+        registro = ContabilidadeDB(id=1, nome_contabilidade="Contabilidade padrão", cnpj="00000000000001")
+        sessao.add(registro)
+        sessao.commit()
+        if sessao.bind.dialect.name == "postgresql":
+            # Explicit id: move the serial past it
+            sessao.execute(
+                text(
+                    "SELECT setval(pg_get_serial_sequence('\"Contabilidades\"', 'id'), "
+                    "(SELECT MAX(id) FROM \"Contabilidades\"))"
+                )
+            )
+            sessao.commit()
+    return registro
+
+
+@pytest.fixture
+def criar_empresas(sessao, contabilidade):
+    def _criar(quantidade: int, contabilidade_id: int = None):
+        empresas = [
+            EmpresaDB(
+                nome=f"Empresa {indice:05d}",
+                contabilidade_id=contabilidade_id or contabilidade.id,
+            )
+            for indice in range(quantidade)
+        ]
+        sessao.add_all(empresas)
+        sessao.commit()
+        return empresas
+
+    return _criar
+
+
+@pytest.fixture
+def criar_controle(sessao):
+    """Monthly controls with `tarefas` open tasks each and consistent counters"""
+
+    def _criar(empresas, ano: int, mes: int, tarefas: int):
+        controles = [
+            ControleMensalDB(empresa_id=empresa.id, ano=ano, mes=mes, tarefas_total=tarefas)
+            for empresa in empresas
+        ]
+        sessao.add_all(controles)
+        sessao.flush()
+        sessao.add_all(
+            TarefaControleDB(controle_mensal_id=controle.id, descricao_tarefa=f"Tarefa {indice}")
+            for controle in controles
+            for indice in range(tarefas)
+        )
+        sessao.commit()
+        return controles
+
+    return _criar
@@ -0,0 +1,96 @@
+"""
+Optimistic concurrency: N clients sending the same `version` at once must
+produce exactly one winner and N-1 conflicts
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func
+
+from portal_demandas.db import ControleMensalDB, TarefaControleDB, TicketDB
+
+CLIENTES = 12
+
+
+def _disparar_juntos(requisicao):
+    """Run requisicao(i) for every client, released at the same instant"""
+    largada = threading.Barrier(CLIENTES)
+
+    def executar(indice):
+        largada.wait()
+        return requisicao(indice)
+
+    with ThreadPoolExecutor(CLIENTES) as executor:
+        return list(executor.map(executar, range(CLIENTES)))
+
+
+def test_patch_ticket_mesma_versao_um_vencedor(client, sessao):
+    ticket = client.post(
+        "/tickets/",
+        json={
+            "titulo": "Ticket concorrente",
+            "descricao": "Atualizado por vários clientes",
+            "etapa": "Triagem",
+            "prazo": "2030-01-01T00:00:00",
+            "responsavel": "Equipe",
+        },
+    ).json()
+    versao = ticket["version"]
+
+    respostas = _disparar_juntos(
+        lambda indice: client.patch(
+            f"/tickets/{ticket['id']}",
+            json={"responsavel": f"Cliente {indice:02d}", "version": versao},
+        )
+    )
+
+    codigos = sorted(resposta.status_code for resposta in respostas)
+    assert codigos == [200] + [409] * (CLIENTES - 1)
+
+    vencedor = next(resposta.json() for resposta in respostas if resposta.status_code == 200)
+    sessao.expire_all()
+    registro = sessao.get(TicketDB, ticket["id"])
+    assert registro.version == versao + 1
+    assert registro.responsavel == vencedor["responsavel"]
+
+
+def test_status_tarefa_mesma_versao_um_vencedor(
+    client, sessao, criar_empresas, criar_controle
+):
+    (empresa,) = criar_empresas(1)
+    (controle,) = criar_controle([empresa], 2025, 1, tarefas=3)
+    tarefa = (
+        sessao.query(TarefaControleDB)
+        .filter(TarefaControleDB.controle_mensal_id == controle.id)
+        .order_by(TarefaControleDB.id)
+        .first()
+    )
+    versao = tarefa.version
+
+    respostas = _disparar_juntos(
+        lambda indice: client.patch(
+            f"/v1/controles-mensais/tarefas/{tarefa.id}/status",
+            params={"concluido": "true", "version": versao},
+        )
+    )
+
+    codigos = sorted(resposta.status_code for resposta in respostas)
+    assert codigos == [200] + [409] * (CLIENTES - 1)
+
+    sessao.expire_all()
+    assert sessao.get(TarefaControleDB, tarefa.id).version == versao + 1
+
+    # The progress counter moved once and matches the task rows
+    concluidas = (
+        sessao.query(func.count(TarefaControleDB.id))
+        .filter(
+            TarefaControleDB.controle_mensal_id == controle.id,
+            TarefaControleDB.concluida.is_(True),
+        )
+        .scalar()
+    )
+    registro = sessao.get(ControleMensalDB, controle.id)
+    assert concluidas == 1
+    assert registro.tarefas_concluidas == concluidas
+    assert registro.tarefas_total == 3
@@ -0,0 +1,102 @@
+"""
+GET /v1/controles/{ano}/{mes} issues a constant number of SQL statements,
+whatever the number of companies (no N+1 over controls or tasks)
+"""
+
+import json
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from portal_demandas.cache_controles_service import cache_quadro_controles
+from portal_demandas.db import engine
+
+ANO, MES = 2024, 7
+
+
+@contextmanager
+def _contar_statements():
+    contagem = {"statements": 0}
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        contagem["statements"] += 1
+
+    event.listen(engine, "before_cursor_execute", contar)
+    try:
+        yield contagem
+    finally:
+        event.remove(engine, "before_cursor_execute", contar)
+
+
+def _statements_do_quadro(client) -> int:
+    # Measure the database path, not a cache hit
+    cache_quadro_controles.limpar()
+    with _contar_statements() as contagem:
+        resposta = client.get(f"/v1/controles/{ANO}/{MES}")
+    assert resposta.status_code == 200, resposta.text
+    return contagem["statements"]
+
+
+def test_quadro_controles_statements_constantes(
+    client, contabilidade_padrao, criar_empresas, criar_controle
+):
+    empresas = criar_empresas(1, contabilidade_padrao.id)
+    criar_controle(empresas, ANO, MES, tarefas=3)
+    com_uma_empresa = _statements_do_quadro(client)
+
+    empresas = criar_empresas(2000, contabilidade_padrao.id)
+    criar_controle(empresas[:1500], ANO, MES, tarefas=3)
+    com_duas_mil = _statements_do_quadro(client)
+
+    # Companies LEFT JOIN controls LEFT JOIN tasks, one statement
+    assert com_uma_empresa == com_duas_mil == 1
+
+    # Cache hit: no statement at all
+    with _contar_statements() as contagem:
+        assert client.get(f"/v1/controles/{ANO}/{MES}").status_code == 200
+    assert contagem["statements"] == 0
+
+
+def test_quadro_controles_pendentes(
+    client, sessao, contabilidade_padrao, criar_empresas, criar_controle
+):
+    empresas = criar_empresas(2, contabilidade_padrao.id)
+    concluido, pendente = criar_controle(empresas, ANO, MES + 1, tarefas=2)
+    concluido.tarefas_concluidas = 2
+    sessao.commit()
+    cache_quadro_controles.limpar()
+
+    completo = client.get(f"/v1/controles/{ANO}/{MES + 1}").json()
+    filtrado = client.get(f"/v1/controles/{ANO}/{MES + 1}", params={"pendentes": "true"}).json()
+
+    ids_completo = {controle["id_controle"] for controle in completo["controles"]}
+    ids_filtrado = {controle["id_controle"] for controle in filtrado["controles"]}
+    assert {concluido.id, pendente.id} <= ids_completo
+    assert pendente.id in ids_filtrado and concluido.id not in ids_filtrado
+    assert filtrado["sumario"] == completo["sumario"]
+
+    # The filtered copy never leaks into the cached board
+    novamente = client.get(f"/v1/controles/{ANO}/{MES + 1}").json()
+    assert {controle["id_controle"] for controle in novamente["controles"]} == ids_completo
+
+    resumo = client.get(
+        "/v1/controles/resumo",
+        params={"inicio": f"{ANO}-{MES + 1:02d}", "fim": f"{ANO}-{MES + 1:02d}", "pendentes": "true"},
+    )
+    linhas = [json.loads(linha) for linha in resumo.text.splitlines()][1:]
+    empresas_resumo = {linha["empresa_id"] for linha in linhas}
+    assert pendente.empresa_id in empresas_resumo
+    assert concluido.empresa_id not in empresas_resumo
+
+
+def test_limpar_descarta_carga_em_andamento():
+    chave = ("contabilidade", ANO, MES)
+    geracao = cache_quadro_controles.geracao(chave)
+    cache_quadro_controles.limpar()
+    cache_quadro_controles.gravar(chave, "quadro antigo", geracao)
+    assert cache_quadro_controles.obter(chave) is None
+
+    geracao = cache_quadro_controles.geracao(chave)
+    cache_quadro_controles.gravar(chave, "quadro novo", geracao)
+    assert cache_quadro_controles.obter(chave) == "quadro novo"
+    cache_quadro_controles.limpar()
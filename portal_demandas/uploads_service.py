@@ -0,0 +1,124 @@
+"""
+UploadsService - Size-limited PDF uploads without whole-file copies in memory
+Used by the PDF upload endpoints (payroll audit, legislation extraction,
+document ingestion)
+
+Starlette already spools multipart files to a SpooledTemporaryFile (memory
+up to 1MB, then disk). receber_upload() walks that file in chunks, hashing
+it incrementally (SHA-256, reused as the extraction cache key) and refusing
+it as soon as it passes the size limit. Small files are handed downstream as
+bytes; larger ones as a read-only mmap of the temp file, so a 100MB PDF
+costs page cache, not 100MB of worker heap per request.
+
+Configuration:
+    PORTAL_UPLOAD_MAX_MB    largest accepted upload in MB (default 150)
+"""
+
+import hashlib
+import io
+import logging
+import mmap
+import os
+from typing import Optional, Union
+
+from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_MAX_UPLOAD = int(float(os.getenv("PORTAL_UPLOAD_MAX_MB", "150")) * 1024 * 1024)
+
+# Files up to this size are read into bytes (they're still in Starlette's
+# in-memory spool anyway); larger ones are memory-mapped
+LIMITE_EM_MEMORIA = 1024 * 1024
+
+TAMANHO_BLOCO = 1024 * 1024
+
+
+class UploadMuitoGrandeError(Exception):
+    """The upload exceeds the configured size limit"""
+
+    def __init__(self, tamanho_max: int):
+        self.tamanho_max = tamanho_max
+        super().__init__(f"Arquivo excede o limite de {tamanho_max // (1024 * 1024)} MB")
+
+
+class UploadRecebido:
+    """
+    📥 An accepted upload: name, size, SHA-256 and a read-only view of the bytes
+
+    `conteudo` is bytes or a read-only mmap (both support len(), slicing and
+    the buffer protocol). Close it when processing ends - with the `with`
+    statement or fechar(); the mapping stays valid after the request's
+    UploadFile is closed, so it can be handed to a background job.
+    """
+
+    def __init__(self, nome: str, conteudo: Union[bytes, mmap.mmap], tamanho: int, sha256: str):
+        self.nome = nome
+        self.conteudo = conteudo
+        self.tamanho = tamanho
+        self.sha256 = sha256
+
+    def fechar(self):
+        if isinstance(self.conteudo, mmap.mmap) and not self.conteudo.closed:
+            try:
+                self.conteudo.close()
+            except BufferError:
+                # A consumer still holds a memoryview; the GC unmaps it later
+                logger.warning(f"Upload {self.nome}: mapping still in use, not closed")
+
+    def __enter__(self) -> "UploadRecebido":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.fechar()
+
+
+async def receber_upload(
+    arquivo: UploadFile, tamanho_max: Optional[int] = None
+) -> UploadRecebido:
+    """
+    Hash and size-check an upload in chunks, then expose its content
+
+    Raises:
+        UploadMuitoGrandeError: the file is larger than tamanho_max
+            (default PORTAL_UPLOAD_MAX_MB)
+    """
+    tamanho_max = TAMANHO_MAX_UPLOAD if tamanho_max is None else tamanho_max
+
+    # Starlette knows the size once the body is parsed: refuse without reading
+    if arquivo.size is not None and arquivo.size > tamanho_max:
+        raise UploadMuitoGrandeError(tamanho_max)
+
+    await arquivo.seek(0)
+    hash_sha256 = hashlib.sha256()
+    tamanho = 0
+    while True:
+        bloco = await arquivo.read(TAMANHO_BLOCO)
+        if not bloco:
+            break
+        tamanho += len(bloco)
+        if tamanho > tamanho_max:
+            raise UploadMuitoGrandeError(tamanho_max)
+        hash_sha256.update(bloco)
+
+    await arquivo.seek(0)
+    conteudo = None
+    if tamanho > LIMITE_EM_MEMORIA:
+        try:
+            arquivo.file.flush()
+            conteudo = mmap.mmap(arquivo.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, io.UnsupportedOperation, OSError, ValueError) as e:
+            # File object without a real descriptor: read it instead
+            logger.warning(f"Upload {arquivo.filename}: mmap unavailable ({e}), reading into memory")
+    if conteudo is None:
+        conteudo = await arquivo.read()
+
+    return UploadRecebido(arquivo.filename, conteudo, tamanho, hash_sha256.hexdigest())
+
+
+__all__ = [
+    "UploadRecebido",
+    "UploadMuitoGrandeError",
+    "receber_upload",
+    "TAMANHO_MAX_UPLOAD",
+]
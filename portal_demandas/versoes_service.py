@@ -0,0 +1,115 @@
+"""
+VersoesService - Table change versions and HTTP validators (ETag)
+Lets polled read endpoints answer 304 Not Modified without re-serializing
+
+- Single resources: the ETag is derived from the row id and atualizado_em
+- Listings: the ETag is derived from a per-table version counter (bumped by
+  every write path in its own transaction) plus the request's query string
+"""
+
+import hashlib
+import logging
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+try:
+    from db import VersaoTabelaDB
+except ImportError:
+    from .db import VersaoTabelaDB
+
+logger = logging.getLogger(__name__)
+
+
+def gerar_etag(*partes) -> str:
+    """Weak ETag from arbitrary parts (the JSON encoding may vary, the data doesn't)"""
+    conteudo = "|".join("" if parte is None else str(parte) for parte in partes)
+    return f'W/"{hashlib.sha1(conteudo.encode("utf-8")).hexdigest()[:32]}"'
+
+
+def etag_recurso(recurso_id: int, atualizado_em: Optional[datetime]) -> str:
+    """ETag of a single row"""
+    return gerar_etag(recurso_id, atualizado_em.isoformat() if atualizado_em else None)
+
+
+def etag_corresponde(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag (RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    alvo = etag[2:] if etag.startswith("W/") else etag
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if candidato.startswith("W/"):
+            candidato = candidato[2:]
+        if candidato == alvo:
+            return True
+    return False
+
+
+class VersoesTabelasService:
+    """
+    🔖 Monotonic change counters per table
+
+    incrementar() must run inside the writer's transaction, before commit,
+    so the new version becomes visible together with the data it describes.
+    """
+
+    def incrementar(self, db: Session, tabela: str):
+        """
+        Bump the version of a table (creates its row on first use)
+
+        A single upsert where the dialect supports it: two first writers of a
+        table would otherwise both miss the UPDATE and collide on the INSERT.
+        """
+        dialeto = db.bind.dialect.name
+        if dialeto in ("postgresql", "sqlite"):
+            if dialeto == "postgresql":
+                from sqlalchemy.dialects.postgresql import insert as insert_dialeto
+            else:
+                from sqlalchemy.dialects.sqlite import insert as insert_dialeto
+            db.execute(
+                insert_dialeto(VersaoTabelaDB)
+                .values(tabela=tabela, versao=1)
+                .on_conflict_do_update(
+                    index_elements=[VersaoTabelaDB.tabela],
+                    set_={
+                        "versao": VersaoTabelaDB.versao + 1,
+                        "atualizado_em": datetime.utcnow(),
+                    },
+                )
+            )
+            return
+
+        resultado = db.execute(
+            update(VersaoTabelaDB)
+            .where(VersaoTabelaDB.tabela == tabela)
+            .values(versao=VersaoTabelaDB.versao + 1)
+        )
+        if resultado.rowcount == 0:
+            db.execute(insert(VersaoTabelaDB).values(tabela=tabela, versao=1))
+
+    def obter(self, db: Session, tabela: str) -> int:
+        """Current version of a table (0 if never written)"""
+        versao = (
+            db.query(VersaoTabelaDB.versao)
+            .filter(VersaoTabelaDB.tabela == tabela)
+            .scalar()
+        )
+        return int(versao or 0)
+
+
+# Global service instance
+versoes_tabelas_service = VersoesTabelasService()
+
+__all__ = [
+    "VersoesTabelasService",
+    "versoes_tabelas_service",
+    "gerar_etag",
+    "etag_recurso",
+    "etag_corresponde",
+]